@@ -1,34 +1,53 @@
-import socket
-import threading
-
-# Drone connection details
-drones = [
-    ("100.85.57.104", 12345),  # Drone 1
-    ("100.85.57.104", 22222),  # Drone 2
-]
-
-message = "start mission"
-
-def send_to_drone(host, port, msg):
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((host, port))
-        sock.sendall(msg.encode())
-        print(f"✅ Sent to {host}:{port}")
-        sock.close()
-    except Exception as e:
-        print(f"❌ Error sending to {host}:{port} — {e}")
-
-# Create and start threads
-threads = []
-for host, port in drones:
-    thread = threading.Thread(target=send_to_drone, args=(host, port, message))
-    thread.start()
-    threads.append(thread)
-
-# Wait for all threads to finish
-for thread in threads:
-    thread.join()
-
-print("📡 Mission start signal sent to all drones.")
+import argparse
+import json
+import os
+import sys
+import time
 
+# Shared modules (command protocol, drone addresses) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clock_sync import START_LEAD_S, start_skew, synchronized_start
+from command_server import dispatch
+from shared_config import MAPPER_ADDRS
+
+# Drone command servers (drone1_mapper.py / drone2_mapper.py)
+drones = MAPPER_ADDRS
+
+DEADLINE = 5.0  # seconds to collect acks from every drone
+
+parser = argparse.ArgumentParser(description="Send one command to every drone in parallel and collect the acks.")
+parser.add_argument("command", nargs="?", default="start_mission",
+                    help="start_mission, abort, pause, resume, status, update_area, update_mission")
+parser.add_argument("--args", default="{}", help='command arguments as JSON, e.g. \'{"polygon": [[lon, lat], ...]}\'')
+parser.add_argument("--deadline", type=float, default=DEADLINE)
+parser.add_argument("--lead", type=float, default=START_LEAD_S,
+                    help="start_mission: seconds until the common start time")
+opts = parser.parse_args()
+
+if opts.command == "start_mission":
+    # Clock-synchronized start: every drone arms at the same instant of the controller's clock
+    start = synchronized_start(drones, opts.lead, json.loads(opts.args), opts.deadline)
+    replies = start["drones"]
+    for (host, port), d in zip(drones, replies):
+        if "offset_s" in d:
+            print(f"🕒 {host}:{port} clock offset {d['offset_s'] * 1000:+.1f} ms (round trip {d['delay_s'] * 1000:.0f} ms)")
+else:
+    replies = dispatch(drones, opts.command, json.loads(opts.args), deadline=opts.deadline)
+
+for (host, port), reply in zip(drones, replies):
+    extra = {k: v for k, v in reply.items()
+             if k not in ("id", "ok", "error", "ack_ms", "handle_ms", "addr", "offset_s", "delay_s")}
+    if reply["ok"]:
+        print(f"✅ {host}:{port} ack in {reply['ack_ms']:.1f} ms {extra or ''}")
+    else:
+        print(f"❌ {host}:{port} — {reply['error']} ({reply.get('ack_ms', 0):.0f} ms)")
+
+acked = sum(r["ok"] for r in replies)
+print(f"📡 {opts.command}: {acked}/{len(drones)} drones acknowledged")
+
+if opts.command == "start_mission" and acked:
+    print(f"⏳ Start in {start['start_at'] - time.time():.1f} s, waiting for the drones to report...")
+    report = start_skew(start)
+    print(f"🏁 {report['started']} started, skew {report['skew_ms']} ms (±{report['uncertainty_ms']} ms), "
+          f"late by {report['late_ms']}" + (f", not started: {report['missing']}" if report['missing'] else ""))
+sys.exit(0 if acked == len(drones) else 1)
@@ -1,8 +1,14 @@
+import os
 import socket
+import sys
 import threading
 import json
 import time                # ← add this import
 
+# Shared modules (framing) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from framing import RECV_SIZE, FrameDecoder
+
 HOST = '0.0.0.0'
 PORT = 12345
 
@@ -16,18 +22,16 @@ conn.settimeout(10.0)      # detect broken connections
 print(f"Connected: {addr}")
 
 def receiver():
-    buffer = b""
+    decoder = FrameDecoder()   # newline-delimited JSON
     while True:
         try:
-            chunk = conn.recv(1024)
+            chunk = conn.recv(RECV_SIZE)
             if not chunk:
                 print("⚠️ Drone disconnected")
                 break
-            buffer += chunk
-            while b'\n' in buffer:
-                line, buffer = buffer.split(b'\n', 1)
+            for line in decoder.feed(chunk):
                 try:
-                    msg = json.loads(line.decode())
+                    msg = json.loads(line)
                     # differentiate commands vs GPS
                     if 'command' in msg:
                         print("📩 Command received:", msg)
@@ -8,5 +8,8 @@ CONTROLLER_PORT = 6000
 # This drone's ID (set this per drone)
 DRONE_ID = 1  # Change to 1, 2, ... for each drone
 DRONE_IP = "100.85.57.104"  # Change to the actual IP of the drone
-# How often to send status updates (seconds)
-STATUS_UPDATE_INTERVAL = 1
\ No newline at end of file
+# How often the status is sampled (seconds); it is only sent when the receivers'
+# dead-reckoned position drifts or goes stale (dead_reckoning.py)
+STATUS_UPDATE_INTERVAL = 0.2
+# Prometheus scrape endpoint of this drone's sender/receiver
+METRICS_PORT = 9102
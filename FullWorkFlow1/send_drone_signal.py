@@ -3,11 +3,48 @@ import json
 from typing import Dict, Any
 import threading
 import os
+import sys
 import time
 from dronekit import connect, VehicleMode, LocationGlobal
-from config import CONTROLLER_IP, CONTROLLER_PORT, STATUS_UPDATE_INTERVAL, DRONE_ID, DRONE_IP
+from config import CONTROLLER_IP, CONTROLLER_PORT, STATUS_UPDATE_INTERVAL, DRONE_ID, DRONE_IP, METRICS_PORT
+# Shared modules (metrics, logging, framing, state sync) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from async_log import fields, get_logger
+from dead_reckoning import AdaptiveSender, POSITION_ERROR_M
+from framing import encode, iter_frames
+from metrics import counter, histogram, start_http_server
+from state_sync import StateReplica
+
+log = get_logger(f"drone{DRONE_ID}")
+
+# --- Metrics ---
+SENDS = counter("drone_status_sends_total", "Status messages sent, by destination", ("dest",))
+SEND_FAILURES = counter("drone_send_failures_total", "Failed status sends, by destination", ("dest",))
+SEND_SECONDS = histogram("drone_send_seconds", "Connect + send latency of one status message", ("dest",))
+ENCODE_SECONDS = histogram("drone_json_encode_seconds", "JSON encode time of the status message")
+ROUND_SECONDS = histogram("drone_share_round_seconds", "Time to send one status round to every peer")
+RECEIVED = counter("drone_messages_received_total", "Messages received, by kind", ("kind",))
+DECODE_SECONDS = histogram("drone_json_decode_seconds", "JSON decode time of incoming messages")
+
+def message_kind(msg) -> str:
+    if isinstance(msg, list):
+        return "peers"
+    if not isinstance(msg, dict):
+        return "other"
+    if "sync" in msg:
+        return "full_sync" if msg["sync"].get("full") else "delta_sync"
+    if "peers" in msg and "drones" in msg:
+        return "update"
+    if "gps" in msg:
+        return "status"
+    return str(msg.get("command", "other"))
+
 
 PEERS_FILE = "peers.json"  # File to store all known drone IPs and ports
+# Shared state from the controller (peers and drone statuses), kept up to date by deltas
+replica = StateReplica()
+# Decides which status samples are sent; the receiver asks it to confirm controller updates
+sender = AdaptiveSender()
 
 # --- Registration Function ---
 def register_with_controller():
@@ -16,7 +53,7 @@ def register_with_controller():
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         s.connect((CONTROLLER_IP, CONTROLLER_PORT))
-        s.sendall(json.dumps(registration).encode())
+        s.sendall(encode(json.dumps(registration).encode()))
         s.close()
         print(f"Registered with controller: {registration}")
     except Exception as e:
@@ -34,13 +71,37 @@ def get_status():
         "id": DRONE_ID,
         "gps": {"lat": latitude, "lon": longitude},
         "baro": altitude,
-        "velocity": [DRONE_ID, DRONE_ID, DRONE_ID],
-        "heartbeat": time.time()
+        # NED m/s from the autopilot; receivers extrapolate the position with it
+        "velocity": list(vehicle.velocity or (0.0, 0.0, 0.0)),
+        "heartbeat": time.time(),
+        "dr_error_m": POSITION_ERROR_M,
+        # tells the controller which version of the shared state this drone holds
+        **replica.ack_fields(),
     }
 
+def send_status(host, port, data: bytes, dest: str):
+    t0 = time.perf_counter()
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.settimeout(1)
+        s.connect((host, port))
+        s.sendall(data)
+        s.close()
+        SENDS.inc(dest=dest)
+        SEND_SECONDS.observe(time.perf_counter() - t0, dest=dest)
+    except Exception as e:
+        SEND_FAILURES.inc(dest=dest)
+        log.warning("Failed to send status", extra=fields(dest=dest, host=host, error=e))
+
 # --- Continuous Info Sharing Function ---
 def share_info_continuously():
     while True:
+        t0 = time.perf_counter()
+        status = get_status()
+        # skip this sample if the receivers' prediction from the last sent one still holds
+        if sender.check(status) is None:
+            time.sleep(STATUS_UPDATE_INTERVAL)
+            continue
         # Load latest peers.json each time (it may change)
         if os.path.exists(PEERS_FILE):
             with open(PEERS_FILE, "r") as f:
@@ -50,27 +111,16 @@ def share_info_continuously():
                     peers = []
         else:
             peers = []
-        status = get_status()
+        # encode once per round, every destination gets the same bytes
+        with ENCODE_SECONDS.time():
+            data = encode(json.dumps(status).encode())
         for peer in peers:
             if peer.get("id") == DRONE_ID:
                 continue  # Don't send to self
-            try:
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                s.settimeout(1)
-                s.connect((peer["ip"], peer.get("port", 5000)))
-                s.sendall(json.dumps(status).encode())
-                s.close()
-            except Exception as e:
-                print(f"Failed to send status to {peer.get('ip', 'unknown')}: {e}")
+            send_status(peer["ip"], peer.get("port", 5000), data, "peer")
         # Also send to controller
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(1)
-            s.connect((CONTROLLER_IP, CONTROLLER_PORT))
-            s.sendall(json.dumps(status).encode())
-            s.close()
-        except Exception as e:
-            print(f"Failed to send status to controller: {e}")
+        send_status(CONTROLLER_IP, CONTROLLER_PORT, data, "controller")
+        ROUND_SECONDS.observe(time.perf_counter() - t0)
         time.sleep(STATUS_UPDATE_INTERVAL)
 
 # --- Receiver Function ---
@@ -85,21 +135,45 @@ def start_receiver():
     try:
         while True:
             conn, addr = server.accept()
-            data = conn.recv(4096)
-            if data:
+            # one connection may carry several newline-framed messages (framing.py)
+            conn.settimeout(2)  # a stalled sender must not hold up the others
+            try:
+                frames = list(iter_frames(conn))
+            except Exception as e:
+                log.warning("Receive failed", extra=fields(peer=addr[0], error=e))
+                frames = []
+            for data in frames:
                 try:
-                    msg = json.loads(data.decode())
+                    with DECODE_SECONDS.time():
+                        msg = json.loads(data)
+                    RECEIVED.inc(kind=message_kind(msg))
+                    # Versioned update from the controller: only the changed peers and statuses
+                    if isinstance(msg, dict) and "sync" in msg:
+                        changed = replica.apply(msg["sync"])
+                        if changed & {"peers", "alerts"}:
+                            sender.confirm()
+                        if "peers" in changed:
+                            with open(PEERS_FILE, "w") as f:
+                                json.dump(replica.values("peers"), f, indent=2)
+                        if "alerts" in changed:
+                            for alert in replica.values("alerts"):
+                                if DRONE_ID in alert["drones"]:
+                                    log.warning("Separation conflict", extra=fields(drones=alert["drones"],
+                                                                                    distance_m=alert["distance_m"],
+                                                                                    vertical_m=alert["vertical_m"],
+                                                                                    lost_contact=alert.get("lost_contact") or "-"))
+                        log.info("Received state update", extra=fields(version=replica.version, full=msg["sync"]["full"],
+                                                                       changed=",".join(sorted(changed)) or "-"))
                     # If we receive a dict with 'peers' and 'drones', update peers.json and print all drone statuses
-                    if isinstance(msg, dict) and "peers" in msg and "drones" in msg:
-                        print(f"Received full peers and drones update: {msg}")
+                    elif isinstance(msg, dict) and "peers" in msg and "drones" in msg:
+                        log.info("Received peers and drones update", extra=fields(peers=len(msg["peers"]), drones=len(msg["drones"])))
                         with open(PEERS_FILE, "w") as f:
                             json.dump(msg["peers"], f, indent=2)
-                        print("All drone statuses:")
                         for drone_id, status in msg["drones"].items():
-                            print(f"  Drone {drone_id}: {status}")
+                            log.debug("Drone status", extra=fields(drone=drone_id, gps=status.get("gps")))
                     # If we receive a list, it's a new peers list, save it
                     elif isinstance(msg, list):
-                        print(f"Received full peers list update: {msg}")
+                        log.info("Received peers list update", extra=fields(peers=len(msg)))
                         with open(PEERS_FILE, "w") as f:
                             json.dump(msg, f, indent=2)
                     elif isinstance(msg, dict) and "command" in msg and msg["command"] == "delete_peers_file":
@@ -110,11 +184,11 @@ def start_receiver():
                         except Exception as e:
                             print(f"Failed to delete peers.json: {e}")
                     elif isinstance(msg, dict) and "gps" in msg:
-                        print(f"Received status from drone {msg.get('id', 'unknown')}: {msg}")
+                        log.info("Received status", extra=fields(drone=msg.get('id', 'unknown'), gps=msg.get('gps')))
                     else:
-                        print(f"Received: {msg}")
+                        log.info("Received", extra=fields(msg=msg))
                 except Exception as e:
-                    print(f"Invalid data received: {e}")
+                    log.warning("Invalid data received", extra=fields(error=e))
             conn.close()
     except KeyboardInterrupt:
         print("\nReceiver shutting down...")
@@ -122,6 +196,7 @@ def start_receiver():
         server.close()
 
 if __name__ == "__main__":
+    start_http_server(METRICS_PORT)
     # Register with controller at startup
     register_with_controller()
     # Start receiver in a separate thread
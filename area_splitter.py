@@ -1,31 +1,34 @@
 from shapely.geometry import Polygon, LineString
 from shapely.ops import split
-from xml.etree import ElementTree as ET
+from geo_projection import frame_for_polygon
+from kml_reader import iter_fields
 
 KML_PATH = 'kml_files/30ha.kml'
 
 def read_polygon_from_kml(kml_path=KML_PATH) -> Polygon:
-    """Parses the KML file and returns a Shapely Polygon."""
-    tree = ET.parse(kml_path)
-    coord_text = tree.find('.//{*}coordinates').text.strip()
-    coords = [tuple(map(float, p.split(',')[:2])) for p in coord_text.split()]
-    if not coords:
-        raise RuntimeError("KML contains no coordinates")
-    return Polygon(coords)
+    """
+    Returns the first Placemark polygon of a KML/KMZ file as a Shapely Polygon.
+    Inner boundaries become holes (no-fly areas); see kml_reader for all fields.
+    """
+    for _, poly in iter_fields(kml_path):
+        return poly
+    raise RuntimeError("KML contains no coordinates")
 
 def split_polygon_vertically(polygon: Polygon):
-    """Splits the polygon into two halves vertically and returns them."""
-    minx, miny, maxx, maxy = polygon.bounds
+    """Splits the polygon into two halves vertically (in local metres) and returns them."""
+    frame = frame_for_polygon(polygon)
+    local = frame.polygon_to_local(polygon)
+    minx, miny, maxx, maxy = local.bounds
     midx = (minx + maxx) / 2
     split_line = LineString([(midx, miny), (midx, maxy)])
     
-    result = split(polygon, split_line)
+    result = split(local, split_line)
     parts = [geom for geom in result.geoms if isinstance(geom, Polygon)]
 
     if len(parts) != 2:
         raise RuntimeError(f"Expected 2 parts after split, got {len(parts)}")
 
-    return parts
+    return [frame.polygon_to_lonlat(part) for part in parts]
 
 def get_area_coordinates(area_number: int, kml_path=KML_PATH):
     """
@@ -0,0 +1,191 @@
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+# === Pipeline settings ===
+QUEUE_SIZE = 10_000          # records buffered for the writer thread; beyond this they are dropped
+RATE_PER_SITE = 5.0          # records per second allowed from one call site (file:line)
+BURST_PER_SITE = 10          # records a call site may emit at once before the rate applies
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+_setup_lock = threading.Lock()
+_listener = None
+_handler = None
+
+
+def fields(**kv) -> dict:
+    """Structured fields for a log call: log.info("sent", extra=fields(peer=ip, ms=3.2))."""
+    return {"fields": kv}
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per call site. Suppressed records are counted and the count
+    is attached to the next record that gets through from the same site.
+    Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rate: float = RATE_PER_SITE, burst: int = BURST_PER_SITE):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.sites = {}   # (pathname, lineno) -> [tokens, last refill, suppressed]
+        self.suppressed_total = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None:
+                site = self.sites[key] = [float(self.burst), now, 0]
+            site[0] = min(self.burst, site[0] + (now - site[1]) * self.rate)
+            site[1] = now
+            if site[0] < 1.0 and record.levelno < logging.WARNING:
+                site[2] += 1
+                self.suppressed_total += 1
+                return False
+            site[0] -= 1.0
+            record.suppressed = site[2]
+            site[2] = 0
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: records are queued as-is and dropped when the queue is full."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # formatting happens on the writer thread; the record is not shared with another process
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # the queue may be full of records; wait for room rather than lose the stop signal
+        self.queue.put(self._sentinel)
+
+
+class StructuredFormatter(logging.Formatter):
+    """Appends structured fields as key=value and the per-site suppressed count."""
+
+    def format(self, record):
+        line = super().format(record)
+        extra = getattr(record, 'fields', None)
+        if extra:
+            line += ' ' + ' '.join(f"{k}={v}" for k, v in extra.items())
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            line += f" (+{suppressed} suppressed)"
+        return line
+
+
+def setup(level: int = logging.INFO, stream=None, filename: str = None,
+          rate: float = RATE_PER_SITE, burst: int = BURST_PER_SITE):
+    """
+    Route the root logger through a bounded queue to a single writer thread.
+    Safe to call more than once; only the first call configures the pipeline.
+    """
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+        formatter = StructuredFormatter(LOG_FORMAT)
+        handlers = [logging.StreamHandler(stream or sys.stderr)]
+        if filename:
+            handlers.append(logging.FileHandler(filename))
+        for h in handlers:
+            h.setFormatter(formatter)
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        qh = DroppingQueueHandler(q)
+        qh.addFilter(RateLimitFilter(rate, burst))
+        root = logging.getLogger()
+        root.addHandler(qh)
+        _handler = qh
+        root.setLevel(level)
+        _listener = _Listener(q, *handlers, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def shutdown():
+    """Flush everything still queued (the listener drains the queue before stopping)."""
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            logging.getLogger().removeHandler(_handler)
+            _listener.stop()
+            _listener = _handler = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup()
+    return logging.getLogger(name)
+
+
+# If run directly, compare the receiver's message loop with print() against this
+# pipeline on a console that writes at 115200 baud
+if __name__ == '__main__':
+    import io
+    import json
+
+    class SerialConsole(io.TextIOBase):
+        """stdout stand-in that blocks like a 115200 baud serial console."""
+        def __init__(self, baud=115200):
+            self.byte_s = 10.0 / baud
+            self.written = 0
+
+        def write(self, s):
+            time.sleep(len(s) * self.byte_s)
+            self.written += len(s)
+            return len(s)
+
+    status = {"id": 3, "gps": {"lat": -35.363261, "lon": 149.165230}, "baro": 584.1,
+              "velocity": [1.2, -0.4, 0.0], "heartbeat": time.time()}
+    payload = json.dumps(status).encode()
+
+    def handle_print(out, n):
+        for _ in range(n):
+            msg = json.loads(payload.decode())
+            print(f"Received signal from drone: {msg}", file=out)
+            print("Sending peers and status to 100.85.57.104...", file=out)
+
+    def handle_log(log, n):
+        for _ in range(n):
+            msg = json.loads(payload.decode())
+            log.info("Received signal", extra=fields(drone=msg["id"], lat=msg["gps"]["lat"], lon=msg["gps"]["lon"]))
+            log.debug("Sending peers and status", extra=fields(peer="100.85.57.104"))
+
+    console = SerialConsole()
+    n_print = 200
+    t0 = time.perf_counter()
+    handle_print(console, n_print)
+    t_print = time.perf_counter() - t0
+
+    print(f"print():                {n_print / t_print:10.0f} msgs/s, {console.written} bytes to the console")
+
+    n_log = 50_000
+    for label, rate in (("queue only", float('inf')), ("queue + rate limit", RATE_PER_SITE)):
+        out = SerialConsole()
+        setup(stream=out, rate=rate)
+        log = get_logger("receiver")
+        t0 = time.perf_counter()
+        handle_log(log, n_log)
+        t_log = time.perf_counter() - t0
+        dropped = _handler.dropped
+        shutdown()
+        print(f"async_log {label + ':':<19} {n_log / t_log:10.0f} msgs/s, {out.written} bytes to the console, "
+              f"{dropped} dropped ({(n_log / t_log) / (n_print / t_print):.0f}x)")
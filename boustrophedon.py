@@ -0,0 +1,311 @@
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+# === Decomposition / ordering settings ===
+TRANSIT_MARGIN_M = 5.0     # clearance kept from no-fly holes and the field edge on transits
+VISIBILITY_EPS_M = 0.05    # tolerance for transit lines running along the boundary
+ORDER_MAX_EVALS = 20_000   # candidate orders tried by 2-opt; a count, not a time, so plans are reproducible
+
+
+def lane_segments(field, lines) -> list:
+    """
+    Intersect horizontal sweep lines with a field (local metres, holes allowed).
+    Returns, per lane, a list of (y, x_min, x_max) segments sorted west to east.
+    """
+    lanes = []
+    for line, inter in zip(lines, shapely.intersection(lines, field)):
+        y = shapely.get_coordinates(line)[0, 1]
+        segs = []
+        for part in shapely.get_parts(inter):
+            if part.geom_type == 'LineString' and part.length > 0:
+                x0, _, x1, _ = part.bounds
+                segs.append((y, x0, x1))
+        lanes.append(sorted(segs, key=lambda s: s[1]))
+    return lanes
+
+
+def decompose(lanes: list) -> list:
+    """
+    Boustrophedon cell decomposition over lane segments.
+
+    A cell grows lane by lane while exactly one segment on the previous lane
+    overlaps exactly one segment on the next one. Any split or merge (a hole
+    starting or ending, a concave notch) closes the cells involved and opens
+    new ones. Returns a list of cells, each a list of (y, x_min, x_max) lanes.
+    """
+    cells = []
+    open_segs = []  # [(x_min, x_max, cell index)] on the previous lane
+    for segs in lanes:
+        hits = [[j for j, (_, b0, b1) in enumerate(segs) if a0 < b1 and b0 < a1]
+                for a0, a1, _ in open_segs]
+        hit_count = [0] * len(segs)
+        for h in hits:
+            for j in h:
+                hit_count[j] += 1
+        continued = {}
+        for (_, _, ci), h in zip(open_segs, hits):
+            if len(h) == 1 and hit_count[h[0]] == 1:
+                continued[h[0]] = ci
+        open_segs = []
+        for j, seg in enumerate(segs):
+            ci = continued.get(j)
+            if ci is None:
+                ci = len(cells)
+                cells.append([])
+            cells[ci].append(seg)
+            open_segs.append((seg[1], seg[2], ci))
+    return cells
+
+
+def _corners(cell) -> np.ndarray:
+    """Cell corners: first lane west/east, last lane west/east."""
+    (y0, a0, a1), (y1, b0, b1) = cell[0], cell[-1]
+    return np.array([(a0, y0), (a1, y0), (b0, y1), (b1, y1)])
+
+
+def _exit_corner(entry: int, n_lanes: int) -> int:
+    """Corner where a cell is left when entered at `entry` and swept lane by lane."""
+    from_first = entry < 2
+    west = entry % 2 == 0
+    if n_lanes % 2 == 1:
+        west = not west
+    return (2 if from_first else 0) + (0 if west else 1)
+
+
+def sweep_cell(cell, entry: int) -> list:
+    """Points of a boustrophedon sweep of one cell, entered at corner `entry`."""
+    lanes = cell if entry < 2 else cell[::-1]
+    west = entry % 2 == 0
+    pts = []
+    for y, x0, x1 in lanes:
+        pts.extend([(x0, y), (x1, y)] if west else [(x1, y), (x0, y)])
+        west = not west
+    return pts
+
+
+class TransitRouter:
+    """
+    Shortest transit paths that stay inside the field and clear of holes,
+    over a visibility graph of the field's (inset) boundary vertices.
+    """
+
+    def __init__(self, field, margin: float = TRANSIT_MARGIN_M):
+        self._free = field.buffer(VISIBILITY_EPS_M)
+        shapely.prepare(self._free)
+        inset = field.buffer(-margin, join_style='mitre')
+        if inset.is_empty:
+            inset = field
+        rings = []
+        for poly in getattr(inset, 'geoms', [inset]):
+            rings.append(np.asarray(poly.exterior.coords)[:-1])
+            rings.extend(np.asarray(r.coords)[:-1] for r in poly.interiors)
+        self.nodes = np.vstack(rings) if rings else np.empty((0, 2))
+        n = len(self.nodes)
+        ii, jj = np.triu_indices(n, k=1)
+        vis = self._visible_pairs(self.nodes[ii], self.nodes[jj])
+        self.weights = np.full((n, n), np.inf)
+        d = np.hypot(*(self.nodes[ii] - self.nodes[jj]).T)
+        self.weights[ii[vis], jj[vis]] = d[vis]
+        self.weights[jj[vis], ii[vis]] = d[vis]
+        self._searches = {}
+
+    def _visible_pairs(self, a, b) -> np.ndarray:
+        if len(a) == 0:
+            return np.zeros(0, dtype=bool)
+        same = np.all(np.isclose(a, b), axis=1)
+        lines = shapely.linestrings(np.stack((a, b), axis=1))
+        return same | shapely.covers(self._free, lines)
+
+    def _search(self, src):
+        """Dijkstra from an arbitrary point to every node (dense O(N²) variant)."""
+        key = tuple(src)
+        if key in self._searches:
+            return self._searches[key]
+        n = len(self.nodes)
+        src = np.asarray(src, dtype=float)
+        vis = self._visible_pairs(np.broadcast_to(src, (n, 2)), self.nodes)
+        dist = np.where(vis, np.hypot(*(self.nodes - src).T), np.inf)
+        prev = np.full(n, -1)
+        done = np.zeros(n, dtype=bool)
+        for _ in range(n):
+            u = int(np.argmin(np.where(done, np.inf, dist)))
+            if done[u] or not np.isfinite(dist[u]):
+                break
+            done[u] = True
+            alt = dist[u] + self.weights[u]
+            better = alt < dist
+            dist[better] = alt[better]
+            prev[better] = u
+        self._searches[key] = (dist, prev)
+        return dist, prev
+
+    def lengths(self, src, dsts) -> np.ndarray:
+        """Transit length from `src` to each of `dsts`; straight lines when no route exists."""
+        src = np.asarray(src, dtype=float)
+        dsts = np.asarray(dsts, dtype=float).reshape(-1, 2)
+        straight = np.hypot(*(dsts - src).T)
+        direct = self._visible_pairs(np.broadcast_to(src, dsts.shape), dsts)
+        out = straight.copy()
+        if direct.all() or len(self.nodes) == 0:
+            return out
+        dist, _ = self._search(src)
+        for k in np.flatnonzero(~direct):
+            vis = self._visible_pairs(np.broadcast_to(dsts[k], self.nodes.shape), self.nodes)
+            via = dist + np.hypot(*(self.nodes - dsts[k]).T)
+            via[~vis] = np.inf
+            if np.isfinite(via.min()):
+                out[k] = via.min()
+        return out
+
+    def path(self, src, dst) -> list:
+        """Transit points after `src` up to and including `dst`."""
+        src = np.asarray(src, dtype=float)
+        dst = np.asarray(dst, dtype=float)
+        if len(self.nodes) == 0 or self._visible_pairs(src[None], dst[None])[0]:
+            return [tuple(dst)]
+        dist, prev = self._search(src)
+        vis = self._visible_pairs(np.broadcast_to(dst, self.nodes.shape), self.nodes)
+        via = dist + np.hypot(*(self.nodes - dst).T)
+        via[~vis] = np.inf
+        u = int(np.argmin(via))
+        if not np.isfinite(via[u]):
+            return [tuple(dst)]
+        chain = []
+        while u != -1:
+            chain.append(tuple(self.nodes[u]))
+            u = prev[u]
+        return chain[::-1] + [tuple(dst)]
+
+
+def _order_cost(order, entries_cost, start_cost, n_lanes):
+    """
+    Best entry corners for a fixed cell order (Viterbi over 4 corners per cell).
+    Returns (cost, entries).
+    """
+    cost = start_cost[order[0]].copy()
+    back = []
+    for prev, cur in zip(order[:-1], order[1:]):
+        exits = [_exit_corner(e, n_lanes[prev]) for e in range(4)]
+        # trans[e_prev, e_cur]
+        trans = entries_cost[prev * 4 + np.array(exits)][:, cur * 4:cur * 4 + 4]
+        total = cost[:, None] + trans
+        back.append(np.argmin(total, axis=0))
+        cost = total.min(axis=0)
+    e = int(np.argmin(cost))
+    best = float(cost[e])
+    entries = [e]
+    for b in reversed(back):
+        e = int(b[e])
+        entries.append(e)
+    return best, entries[::-1]
+
+
+def order_cells(cells, start, router: TransitRouter, max_evals: int = ORDER_MAX_EVALS):
+    """
+    Order cells and pick each cell's entry corner to minimise transit distance:
+    greedy nearest-corner tour, then 2-opt on the order for at most `max_evals`
+    candidate orders.
+    Returns [(cell index, entry corner), ...].
+    """
+    if not cells:
+        return []
+    corners = np.vstack([_corners(c) for c in cells])
+    n_lanes = [len(c) for c in cells]
+    start_cost = router.lengths(start, corners).reshape(-1, 4)
+    entries_cost = np.vstack([router.lengths(p, corners) for p in corners])
+
+    # greedy: always fly to the nearest corner of an unvisited cell
+    order, pos_cost = [], start_cost.ravel()
+    todo = set(range(len(cells)))
+    while todo:
+        cand = [(pos_cost[c * 4 + e], c, e) for c in todo for e in range(4)]
+        _, c, e = min(cand)
+        order.append(c)
+        todo.discard(c)
+        pos_cost = entries_cost[c * 4 + _exit_corner(e, n_lanes[c])]
+
+    best, entries = _order_cost(order, entries_cost, start_cost, n_lanes)
+    evals = 0
+    improved = True
+    while improved and evals < max_evals:
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                cand = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                cost, cand_entries = _order_cost(cand, entries_cost, start_cost, n_lanes)
+                evals += 1
+                if cost < best - 1e-6:
+                    best, order, entries, improved = cost, cand, cand_entries, True
+            if evals >= max_evals:
+                break
+    return list(zip(order, entries))
+
+
+def plan_path(field, lines, start):
+    """
+    Full survey path over a field in local metres: decompose, order the cells,
+    and join them with obstacle-free transits.
+    Returns (points, lane_index_pairs) where lane_index_pairs gives the
+    start/end point index of every surveyed lane.
+    """
+    cells = decompose(lane_segments(field, lines))
+    router = TransitRouter(field)
+    pts = [tuple(start)]
+    lanes = []
+    for ci, entry in order_cells(cells, start, router):
+        sweep = sweep_cell(cells[ci], entry)
+        pts.extend(router.path(pts[-1], sweep[0])[:-1])
+        for k in range(0, len(sweep), 2):
+            lanes.append((len(pts), len(pts) + 1))
+            pts.extend(sweep[k:k + 2])
+    return pts, lanes
+
+
+# If run directly, compare with the old flip-order sweep on synthetic concave fields
+if __name__ == '__main__':
+    import time
+    from shapely.geometry import box
+
+    def naive_path(field, lines, start):
+        pts, flip = [tuple(start)], False
+        for segs in lane_segments(field, lines):
+            for y, x0, x1 in segs:
+                pts.extend([(x1, y), (x0, y)] if flip else [(x0, y), (x1, y)])
+                flip = not flip
+        return pts
+
+    def length(pts):
+        p = np.asarray(pts)
+        return float(np.hypot(*np.diff(p, axis=0).T).sum())
+
+    def sweep(field, spacing=20.0):
+        minx, miny, maxx, maxy = field.bounds
+        ys = np.arange(miny + spacing / 2, maxy, spacing)
+        return shapely.linestrings(np.stack((np.column_stack((np.full(len(ys), minx), ys)),
+                                             np.column_stack((np.full(len(ys), maxx), ys))), axis=1))
+
+    comb = box(0, 0, 1200, 200)
+    for x in range(0, 1200, 300):
+        comb = comb.union(box(x, 200, x + 150, 900))
+    fields = {
+        'U-shape': box(0, 0, 1000, 800).difference(box(300, 200, 700, 800)),
+        'comb': comb,
+        'holes': Polygon(box(0, 0, 1200, 800).exterior.coords,
+                         [box(200, 200, 400, 500).exterior.coords,
+                          box(700, 100, 900, 300).exterior.coords,
+                          box(650, 450, 1000, 650).exterior.coords]),
+        'concave+hole': Polygon([(0, 0), (1000, 0), (1000, 900), (600, 900), (500, 300),
+                                 (400, 900), (0, 900)], [box(150, 300, 300, 600).exterior.coords]),
+    }
+    print(f"{'field':>13} {'cells':>5} {'naive m':>9} {'cells m':>9} {'saved':>6} {'plan ms':>8}")
+    for name, field in fields.items():
+        lines = sweep(field)
+        start = (field.centroid.x, field.centroid.y)
+        naive = length(naive_path(field, lines, start))
+        t0 = time.perf_counter()
+        pts, _ = plan_path(field, lines, start)
+        ms = (time.perf_counter() - t0) * 1000
+        n_cells = len(decompose(lane_segments(field, lines)))
+        planned = length(pts)
+        print(f"{name:>13} {n_cells:>5} {naive:>9.0f} {planned:>9.0f} {1 - planned / naive:>6.1%} {ms:>8.1f}")
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import time
+import uuid
+
+from command_server import CALL_TIMEOUT, call, encode_frame, read_frame
+
+# === Sync settings ===
+PING_SAMPLES = 8         # clock pings per drone; the one with the lowest round trip is used
+START_LEAD_S = 15.0      # start time is this far ahead (covers plan fetch and vehicle connect)
+STATUS_POLL_S = 0.5      # how often the drones are asked whether they have started
+SPIN_S = 0.02            # last part of the wait is polled instead of slept
+
+
+def clock() -> dict:
+    """Command handler on the drone: its wall clock, for the controller's offset estimate."""
+    return {"time": time.time()}
+
+
+def wait_until(ts: float, cancel: threading.Event = None) -> bool:
+    """
+    Block until the local wall clock reaches ts (a few ms late at most).
+    Returns False as soon as `cancel` is set instead.
+    """
+    cancel = cancel or threading.Event()
+    while True:
+        left = ts - time.time()
+        if left <= 0:
+            return True
+        if cancel.wait(left - SPIN_S if left > SPIN_S else 0.001):
+            return False
+
+
+async def measure_offset(addr: tuple, samples: int = PING_SAMPLES, timeout: float = CALL_TIMEOUT) -> dict:
+    """
+    NTP-style offset of a drone's clock (drone minus controller) from repeated
+    pings over one connection. The sample with the smallest round trip has the
+    least queueing in it, so its offset is taken; the error is at most half its
+    round trip.
+    """
+    async def ping():
+        reader, writer = await asyncio.open_connection(*addr)
+        best = None
+        try:
+            for _ in range(samples):
+                t0 = time.time()
+                writer.write(encode_frame({"id": uuid.uuid4().hex, "command": "clock"}))
+                await writer.drain()
+                reply = await read_frame(reader)
+                t3 = time.time()
+                if reply is None or not reply.get("ok"):
+                    raise ConnectionError(f"clock ping failed: {reply}")
+                # the drone stamps the reply at once, so NTP's t2 - t1 is ~0
+                delay = t3 - t0
+                offset = reply["time"] - (t0 + t3) / 2
+                if best is None or delay < best[0]:
+                    best = (delay, offset)
+        finally:
+            writer.close()
+        return {"offset_s": best[1], "delay_s": best[0]}
+
+    return await asyncio.wait_for(ping(), timeout)
+
+
+async def synchronized_start_async(addrs: list, lead_s: float = START_LEAD_S, args: dict = None,
+                                   timeout: float = CALL_TIMEOUT) -> dict:
+    """
+    Measure every drone's clock offset, then send start_mission with one absolute
+    start time, translated into each drone's own clock. Drones whose offset could
+    not be measured are not started.
+    """
+    results = await asyncio.gather(*(measure_offset(tuple(a), timeout=timeout) for a in addrs),
+                                   return_exceptions=True)
+    start_at = time.time() + lead_s
+    drones = []
+    calls = []
+    for addr, sync in zip(addrs, results):
+        if isinstance(sync, Exception):
+            drones.append({"addr": tuple(addr), "ok": False, "error": f"clock sync failed: {sync}"})
+            continue
+        drones.append({"addr": tuple(addr), **sync})
+        calls.append((drones[-1], call(tuple(addr), "start_mission",
+                                       {**(args or {}), "start_at": start_at + sync["offset_s"]}, timeout)))
+    replies = await asyncio.gather(*(c for _, c in calls))
+    for (drone, _), reply in zip(calls, replies):
+        drone.update(reply)
+    return {"start_at": start_at, "drones": drones}
+
+
+async def start_skew_async(start: dict, timeout: float = 60.0) -> dict:
+    """
+    Poll the started drones until each reports when it actually started, and
+    return the achieved spread of start times on the controller's clock.
+    """
+    pending = [d for d in start["drones"] if d.get("ok")]
+    started = {}
+    deadline = start["start_at"] + timeout
+    while pending and time.time() < deadline:
+        await asyncio.sleep(max(min(start["start_at"] - time.time(), STATUS_POLL_S), STATUS_POLL_S / 5))
+        replies = await asyncio.gather(*(call(d["addr"], "status", timeout=STATUS_POLL_S * 2) for d in pending))
+        for d, reply in zip(list(pending), replies):
+            if reply.get("started_at") is not None:
+                started[d["addr"]] = reply["started_at"] - d["offset_s"]
+                pending.remove(d)
+    late_ms = {f"{a[0]}:{a[1]}": round((t - start["start_at"]) * 1000, 1) for a, t in started.items()}
+    return {
+        "started": len(started),
+        "missing": [f"{d['addr'][0]}:{d['addr'][1]}" for d in pending],
+        "skew_ms": round((max(started.values()) - min(started.values())) * 1000, 1) if started else None,
+        "late_ms": late_ms,
+        # start times are only known to within half the round trip of the offset estimate
+        "uncertainty_ms": round(max(d["delay_s"] for d in start["drones"] if d.get("ok")) / 2 * 1000, 1)
+        if started else None,
+    }
+
+
+def synchronized_start(addrs: list, lead_s: float = START_LEAD_S, args: dict = None,
+                       timeout: float = CALL_TIMEOUT) -> dict:
+    return asyncio.run(synchronized_start_async(addrs, lead_s, args, timeout))
+
+
+def start_skew(start: dict, timeout: float = 60.0) -> dict:
+    return asyncio.run(start_skew_async(start, timeout))
+
+
+# If run directly, compare immediate starts with clock-synchronized starts on stand-in
+# drones whose clocks are off by up to ±2 s, behind a cellular-like link
+if __name__ == '__main__':
+    import random
+    import socket
+    import threading
+    from command_server import CommandServer, dispatch
+
+    rng = random.Random(1)
+
+    def link_delay():
+        # one-way cellular delay: 40 ms floor plus a heavy tail of queueing
+        return 0.04 + rng.lognormvariate(-3.0, 0.9)
+
+    class StandIn:
+        """Drone whose wall clock is off by `offset` and whose messages take link_delay()."""
+
+        def __init__(self, offset):
+            self.offset = offset
+            self.started_true = None
+            self.started_at = None
+            self.lock = threading.Lock()
+            with socket.socket() as s:
+                s.bind(('127.0.0.1', 0))
+                self.port = s.getsockname()[1]
+            handlers = {"clock": self.clock, "start_mission": self.start_mission, "status": self.status}
+            threading.Thread(target=CommandServer(handlers, '127.0.0.1', self.port).serve_forever,
+                             daemon=True).start()
+
+        def now(self):
+            return time.time() + self.offset
+
+        def clock(self):
+            time.sleep(link_delay())                     # request on its way
+            reply = {"time": self.now()}
+            time.sleep(link_delay())                     # reply on its way
+            return reply
+
+        def start_mission(self, start_at=None):
+            time.sleep(link_delay())
+            if start_at is not None:
+                while self.now() < start_at:
+                    time.sleep(0.001)
+            with self.lock:
+                self.started_true = time.time()
+                self.started_at = self.now()
+            return {"state": "flying"}
+
+        def status(self):
+            return {"started_at": self.started_at}
+
+    for n_drones in (4, 16):
+        fleet = [StandIn(rng.uniform(-2, 2)) for _ in range(n_drones)]
+        time.sleep(0.3)
+        addrs = [('127.0.0.1', d.port) for d in fleet]
+
+        dispatch(addrs, "start_mission", deadline=5.0)
+        true = [d.started_true for d in fleet]
+        naive_ms = (max(true) - min(true)) * 1000
+
+        for d in fleet:
+            d.started_true = d.started_at = None
+        start = synchronized_start(addrs, lead_s=2.0)
+        report = start_skew(start, timeout=10.0)
+        true = [d.started_true for d in fleet]
+        err = max(abs(s["offset_s"] - d.offset) for s, d in zip(start["drones"], fleet)) * 1000
+        print(f"{n_drones:2d} drones: immediate start skew {naive_ms:6.1f} ms | synchronized: true skew "
+              f"{(max(true) - min(true)) * 1000:5.1f} ms, reported {report['skew_ms']} ms "
+              f"(±{report['uncertainty_ms']} ms), worst offset error {err:.1f} ms")
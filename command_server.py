@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+
+from framing import HEADER, LENGTH, MAX_FRAME, FrameTooLarge, encode
+from metrics import histogram
+
+# === Protocol ===
+# Every message is a 4-byte big-endian length followed by that many bytes of JSON
+# (framing.LENGTH, read here with asyncio streams).
+#   request:  {"id": "<unique>", "command": "start_mission", "args": {...}}
+#   response: {"id": "<same>", "ok": true, ...result} or {"id": ..., "ok": false, "error": "..."}
+# Requests on one connection are handled concurrently and answered as they finish.
+# A request id seen before gets the first answer again without running the command twice,
+# so a client can safely resend after a timeout.
+RESULT_CACHE = 1024             # answered request ids remembered for de-duplication
+CALL_TIMEOUT = 5.0              # default deadline of one command (seconds)
+RETRY_DELAY = 0.2               # wait before reconnecting after a refused connection
+
+COMMAND_SECONDS = histogram("command_handle_seconds", "Time to run one drone command", ("command",))
+ACK_SECONDS = histogram("command_ack_seconds", "Send to ack latency seen by the client", ("command",))
+
+logger = logging.getLogger("CommandServer")
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    """Next message of the stream, or None at end of stream."""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise FrameTooLarge(f"frame of {size} bytes exceeds {MAX_FRAME}")
+    return json.loads(await reader.readexactly(size))
+
+
+def encode_frame(msg: dict) -> bytes:
+    return encode(json.dumps(msg, separators=(',', ':')).encode(), LENGTH)
+
+
+class CommandServer:
+    """
+    Asyncio command server of one drone.
+
+    `handlers` maps command names to plain functions taking the request's
+    args as keyword arguments and returning a dict merged into the reply.
+    Handlers run in worker threads (DroneKit calls block), raise to refuse
+    a command, and are run at most once per request id.
+    """
+
+    def __init__(self, handlers: dict, host: str = '0.0.0.0', port: int = 12345):
+        self.handlers = handlers
+        self.host = host
+        self.port = port
+        self.results = OrderedDict()   # request id -> Future of its reply
+
+    async def _run(self, request: dict) -> dict:
+        command = request.get("command")
+        handler = self.handlers.get(command)
+        if handler is None:
+            return {"ok": False, "error": f"unknown command {command}"}
+        t0 = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: handler(**request.get("args", {})))
+            reply = {"ok": True, **(result or {})}
+        except Exception as e:
+            logger.warning(f"{command} failed: {e}")
+            reply = {"ok": False, "error": str(e)}
+        elapsed = time.perf_counter() - t0
+        COMMAND_SECONDS.observe(elapsed, command=command)
+        reply["handle_ms"] = round(elapsed * 1000, 2)
+        return reply
+
+    async def handle(self, request: dict) -> dict:
+        """Reply to one request, de-duplicated by its id."""
+        cmd_id = request.get("id") or uuid.uuid4().hex
+        fut = self.results.get(cmd_id)
+        if fut is not None:
+            reply = await asyncio.shield(fut)
+            return {**reply, "duplicate": True}
+        fut = self.results[cmd_id] = asyncio.get_running_loop().create_future()
+        while len(self.results) > RESULT_CACHE:
+            oldest = next(iter(self.results))
+            if not self.results[oldest].done():
+                break
+            del self.results[oldest]
+        fut.set_result({"id": cmd_id, **await self._run(request)})
+        return fut.result()
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info('peername')
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def answer(request):
+            reply = await self.handle(request)
+            async with write_lock:
+                writer.write(encode_frame(reply))
+                await writer.drain()
+
+        try:
+            while True:
+                request = await read_frame(reader)
+                if request is None:
+                    break
+                task = asyncio.ensure_future(answer(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except Exception as e:
+            logger.warning(f"Connection from {peer} dropped: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self._connection, self.host, self.port)
+        logger.info(f"Command server listening on {self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    def serve_forever(self):
+        asyncio.run(self.serve())
+
+
+# === Client ===
+async def call(addr: tuple, command: str, args: dict = None, timeout: float = CALL_TIMEOUT,
+               cmd_id: str = None) -> dict:
+    """
+    Send one command and wait for its reply. Refused or dropped connections are
+    retried with the same id until the deadline, so the drone runs the command at most once.
+    Adds ack_ms (send to reply, including retries) to the reply.
+    """
+    request = {"id": cmd_id or uuid.uuid4().hex, "command": command, "args": args or {}}
+    t0 = time.perf_counter()
+    deadline = t0 + timeout
+
+    async def attempt():
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(*addr)
+                try:
+                    writer.write(encode_frame(request))
+                    await writer.drain()
+                    reply = await read_frame(reader)
+                finally:
+                    writer.close()
+                if reply is None:
+                    raise ConnectionError("connection closed before the reply")
+                return reply
+            except OSError:
+                if time.perf_counter() + RETRY_DELAY >= deadline:
+                    raise
+                await asyncio.sleep(RETRY_DELAY)
+
+    try:
+        reply = await asyncio.wait_for(attempt(), max(deadline - time.perf_counter(), 0))
+    except asyncio.TimeoutError:
+        reply = {"id": request["id"], "ok": False, "error": "no ack before deadline"}
+    except Exception as e:
+        reply = {"id": request["id"], "ok": False, "error": str(e)}
+    elapsed = time.perf_counter() - t0
+    ACK_SECONDS.observe(elapsed, command=command)
+    reply["ack_ms"] = round(elapsed * 1000, 2)
+    return reply
+
+
+async def dispatch_async(addrs: list, command: str, args: dict = None,
+                         deadline: float = CALL_TIMEOUT) -> list:
+    """
+    Send a command to every drone at once; one reply per address, in order.
+    `args` is shared by all of them, or a list with each address's own args.
+    """
+    per_addr = args if isinstance(args, list) else [args] * len(addrs)
+    return await asyncio.gather(*(call(tuple(a), command, x, deadline) for a, x in zip(addrs, per_addr)))
+
+
+def dispatch(addrs: list, command: str, args: dict = None, deadline: float = CALL_TIMEOUT) -> list:
+    """Blocking form of dispatch_async() for scripts and worker threads."""
+    return asyncio.run(dispatch_async(addrs, command, args, deadline))
+
+
+def send_command(addr: tuple, command: str, args: dict = None, timeout: float = CALL_TIMEOUT) -> dict:
+    """Blocking single command (for callers outside an event loop)."""
+    return asyncio.run(call(tuple(addr), command, args, timeout))
+
+
+# If run directly, compare the old sequential one-shot sends with a parallel dispatch
+# against local stand-in drones whose commands take 150 ms
+if __name__ == '__main__':
+    import socket
+    import statistics
+    import threading
+
+    HANDLE_S = 0.15
+    runs = {"start_mission": 0}
+
+    def start_mission():
+        time.sleep(HANDLE_S)
+        runs["start_mission"] += 1
+        return {"state": "starting"}
+
+    n_drones = 10
+    ports = []
+    for _ in range(n_drones):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            ports.append(s.getsockname()[1])
+    for port in ports:
+        server = CommandServer({"start_mission": start_mission}, '127.0.0.1', port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    addrs = [('127.0.0.1', p) for p in ports]
+    time.sleep(0.3)
+
+    t0 = time.perf_counter()
+    for a in addrs:
+        send_command(a, "start_mission")
+    t_seq = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    replies = dispatch(addrs, "start_mission", deadline=2.0)
+    t_par = (time.perf_counter() - t0) * 1000
+    acks = [r["ack_ms"] for r in replies]
+    print(f"{n_drones} drones: sequential {t_seq:.0f} ms, parallel dispatch {t_par:.0f} ms, "
+          f"ack p50 {statistics.median(acks):.1f} ms, max {max(acks):.1f} ms, "
+          f"all ok: {all(r['ok'] for r in replies)}")
+
+    # the same id sent twice (a retry after a lost ack) runs the command once
+    before = runs["start_mission"]
+
+    async def resend():
+        return await asyncio.gather(call(addrs[0], "start_mission", cmd_id="retry-1"),
+                                    call(addrs[0], "start_mission", cmd_id="retry-1"))
+    first, second = asyncio.run(resend())
+    print(f"Duplicate id: handler ran {runs['start_mission'] - before} time(s), "
+          f"second reply duplicate={second.get('duplicate', first.get('duplicate', False))}")
+
+    # a drone that is down is reported at the deadline instead of hanging the dispatch
+    t0 = time.perf_counter()
+    replies = dispatch(addrs[:2] + [('127.0.0.1', 1)], "start_mission", deadline=1.0)
+    print(f"With one drone down: {[r['ok'] for r in replies]} after "
+          f"{(time.perf_counter() - t0) * 1000:.0f} ms ({replies[-1]['error']})")
@@ -0,0 +1,157 @@
+import math
+import threading
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+from mapping_params import calculate_mapping_params
+from geo_projection import frame_for_polygon
+
+# === Grid settings ===
+CELL_SIZE_M = 1.0        # preferred grid resolution (m)
+MAX_CELLS = 4_000_000    # the cell size grows for fields that would exceed this
+BLOCK_CELLS = 16         # uncovered regions are reported in blocks of BLOCK_CELLS² cells
+MIN_UNCOVERED_FRAC = 0.05  # ignore blocks with less than this fraction left uncovered
+MAX_SWEEP_M = 50.0       # longer moves between two positions (a telemetry gap) are not swept
+
+
+class CoverageTracker:
+    """
+    Bitmap of surveyed ground over a field polygon (lon/lat), built from telemetry.
+
+    Every position stamps the camera footprint (ground_width_m east-west by
+    ground_height_m north-south) onto a boolean grid in the field's local ENU
+    frame; sweep() stamps it along the path between two positions. Updates
+    take arrays of positions and are fully vectorized, and the covered-cell
+    count is maintained incrementally so reading the percentage is O(1).
+    """
+
+    def __init__(self, polygon: Polygon, alt_m: float, overlap: float = 15.0,
+                 sidelap: float = 15.0, cell_m: float = CELL_SIZE_M):
+        self.polygon = polygon
+        self.frame = frame_for_polygon(polygon)
+        local = self.frame.polygon_to_local(polygon)
+        minx, miny, maxx, maxy = local.bounds
+        self.origin_e, self.origin_n = minx, miny
+
+        width_m = maxx - minx
+        height_m = maxy - miny
+        cell_m = max(cell_m, math.sqrt(width_m * height_m / MAX_CELLS))
+        self.cell_m = cell_m
+        self.nx = max(1, math.ceil(width_m / cell_m))
+        self.ny = max(1, math.ceil(height_m / cell_m))
+
+        # cells whose centre lies inside the field (holes excluded)
+        cx = minx + (np.arange(self.nx) + 0.5) * cell_m
+        cy = miny + (np.arange(self.ny) + 0.5) * cell_m
+        gx, gy = np.meshgrid(cx, cy)
+        self.mask = shapely.contains_xy(local, gx, gy).ravel()
+        self.total_cells = int(self.mask.sum())
+        self.covered = np.zeros(self.nx * self.ny, dtype=bool)
+        self.covered_cells = 0
+
+        # footprint as row/col offsets around the camera centre
+        mp = calculate_mapping_params(alt_m, overlap, sidelap)
+        half_c = max(0, round(mp['ground_width_m'] / cell_m / 2))
+        half_r = max(0, round(mp['ground_height_m'] / cell_m / 2))
+        dr, dc = np.mgrid[-half_r:half_r + 1, -half_c:half_c + 1]
+        self._dr = dr.ravel()
+        self._dc = dc.ravel()
+        # swept paths are stamped at this spacing, so consecutive footprints overlap
+        self.step_m = max(cell_m, min(mp['ground_width_m'], mp['ground_height_m']) / 2)
+        self.lock = threading.Lock()
+
+    def update(self, lats, lons) -> int:
+        """Stamp the footprint at each (lat, lon); returns the number of newly covered field cells."""
+        east, north = self.frame.forward(np.atleast_1d(lats), np.atleast_1d(lons))
+        return self._stamp(east, north)
+
+    def sweep(self, lats0, lons0, lats1, lons1) -> int:
+        """
+        Stamp the footprint along each straight move from (lat0, lon0) to
+        (lat1, lon1); moves longer than MAX_SWEEP_M only stamp their ends.
+        Returns the number of newly covered field cells.
+        """
+        e0, n0 = self.frame.forward(np.atleast_1d(lats0), np.atleast_1d(lons0))
+        e1, n1 = self.frame.forward(np.atleast_1d(lats1), np.atleast_1d(lons1))
+        dist = np.hypot(e1 - e0, n1 - n0)
+        steps = np.where(dist <= MAX_SWEEP_M, np.ceil(dist / self.step_m), 1).astype(np.intp)
+        steps = np.maximum(steps, 1)
+        seg = np.repeat(np.arange(len(steps)), steps + 1)
+        frac = np.arange(len(seg)) - np.repeat(np.cumsum(steps + 1) - (steps + 1), steps + 1)
+        frac = frac / steps[seg]
+        return self._stamp(e0[seg] + (e1 - e0)[seg] * frac, n0[seg] + (n1 - n0)[seg] * frac)
+
+    def _stamp(self, east, north) -> int:
+        rows = np.floor((north - self.origin_n) / self.cell_m).astype(np.intp)
+        cols = np.floor((east - self.origin_e) / self.cell_m).astype(np.intp)
+        rr = (rows[:, None] + self._dr).ravel()
+        cc = (cols[:, None] + self._dc).ravel()
+        valid = (rr >= 0) & (rr < self.ny) & (cc >= 0) & (cc < self.nx)
+        idx = rr[valid] * self.nx + cc[valid]
+        with self.lock:
+            fresh = np.unique(idx[~self.covered[idx]])
+            self.covered[fresh] = True
+            added = int(self.mask[fresh].sum())
+            self.covered_cells += added
+        return added
+
+    @property
+    def percent(self) -> float:
+        if self.total_cells == 0:
+            return 0.0
+        return 100.0 * self.covered_cells / self.total_cells
+
+    def uncovered_regions(self, block: int = BLOCK_CELLS) -> list:
+        """
+        Blocks of the field that still have uncovered cells, as
+        [south, west, north, east, uncovered_fraction] in degrees.
+        """
+        by = -(-self.ny // block)
+        bx = -(-self.nx // block)
+        with self.lock:
+            todo = (self.mask & ~self.covered).reshape(self.ny, self.nx)
+        padded = np.zeros((by * block, bx * block), dtype=bool)
+        padded[:self.ny, :self.nx] = todo
+        inside = np.zeros_like(padded)
+        inside[:self.ny, :self.nx] = self.mask.reshape(self.ny, self.nx)
+        todo_count = padded.reshape(by, block, bx, block).sum(axis=(1, 3))
+        inside_count = inside.reshape(by, block, bx, block).sum(axis=(1, 3))
+        frac = np.divide(todo_count, inside_count, out=np.zeros(todo_count.shape),
+                         where=inside_count > 0)
+        r, c = np.nonzero(frac >= MIN_UNCOVERED_FRAC)
+        block_m = block * self.cell_m
+        south, west = self.frame.inverse(self.origin_e + c * block_m, self.origin_n + r * block_m)
+        north, east = self.frame.inverse(self.origin_e + (c + 1) * block_m, self.origin_n + (r + 1) * block_m)
+        return np.column_stack((south, west, north, east, np.round(frac[r, c], 3))).tolist()
+
+    def summary(self) -> dict:
+        return {
+            "percent": round(self.percent, 2),
+            "covered_m2": round(self.covered_cells * self.cell_m ** 2, 1),
+            "field_m2": round(self.total_cells * self.cell_m ** 2, 1),
+            "cell_m": self.cell_m,
+            "uncovered": self.uncovered_regions(),
+        }
+
+
+# If run directly, fly a synthetic lawnmower over the shared field and time the updates
+if __name__ == '__main__':
+    import time
+    from area_splitter import read_polygon_from_kml
+    from shared_config import KML_PATH, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT
+
+    poly = read_polygon_from_kml(KML_PATH)
+    tracker = CoverageTracker(poly, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT)
+    print(f"Grid {tracker.nx}x{tracker.ny} @ {tracker.cell_m:.2f} m, field cells {tracker.total_cells}")
+
+    n_drones = 500
+    minx, miny, maxx, maxy = poly.bounds
+    rng = np.random.default_rng(0)
+    t0 = time.perf_counter()
+    ticks = 60
+    for _ in range(ticks):
+        tracker.update(rng.uniform(miny, maxy, n_drones), rng.uniform(minx, maxx, n_drones))
+    per_tick = (time.perf_counter() - t0) / ticks
+    print(f"{n_drones} drones: {per_tick * 1000:.2f} ms per 1 Hz tick, coverage {tracker.percent:.1f}%")
+    print(f"Uncovered blocks: {len(tracker.uncovered_regions())}")
@@ -0,0 +1,225 @@
+import math
+import time
+
+from metrics import counter
+
+# === Dead-reckoning settings ===
+# A drone samples its state every STATUS_UPDATE_INTERVAL but only sends it when the
+# position predicted from its last sent status is off by POSITION_ERROR_M, the altitude
+# by ALTITUDE_ERROR_M, or MAX_SILENCE_S have passed. Receivers extrapolate the same
+# prediction, so what they show stays within those errors of the drone's own fix.
+POSITION_ERROR_M = 2.0
+ALTITUDE_ERROR_M = 1.0
+MAX_SILENCE_S = 2.0       # well under the controller's 5 s heartbeat timeouts
+MAX_EXTRAPOLATE_S = 5.0   # receivers stop extrapolating a status this old
+EARTH_RADIUS_M = 6_371_000.0
+
+SENT = counter("drone_status_sent_total", "Status messages sent by the adaptive sender, by reason", ("reason",))
+SUPPRESSED = counter("drone_status_suppressed_total", "Status samples not sent because the prediction held")
+
+
+def predict(status: dict, t: float) -> tuple:
+    """(lat, lon, alt) of a status extrapolated to time t along its NED velocity (m/s)."""
+    lat, lon, alt = status["gps"]["lat"], status["gps"]["lon"], status.get("baro") or 0.0
+    dt = t - status["heartbeat"]
+    velocity = status.get("velocity") or (0.0, 0.0, 0.0)
+    vn, ve, vd = (float(v or 0.0) for v in velocity[:3])
+    lat2 = lat + math.degrees(vn * dt / EARTH_RADIUS_M)
+    lon2 = lon + math.degrees(ve * dt / (EARTH_RADIUS_M * math.cos(math.radians(lat))))
+    return lat2, lon2, alt - vd * dt
+
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Horizontal distance over a few hundred metres (equirectangular)."""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+
+class AdaptiveSender:
+    """
+    Drone-side send decision. check() is called with every sampled status
+    and returns why it must be sent (first, silence, state, position, altitude),
+    or None if the receivers' prediction from the last sent status still
+    holds; a returned status is assumed sent. confirm() asks for the next
+    sample to go out, so a controller update of the peers or alerts is acked
+    promptly; statuses of other drones are left to the silence heartbeat,
+    which already beats the controller's resend timeout.
+    """
+
+    def __init__(self, position_m: float = POSITION_ERROR_M, altitude_m: float = ALTITUDE_ERROR_M,
+                 max_silence_s: float = MAX_SILENCE_S):
+        self.position_m = position_m
+        self.altitude_m = altitude_m
+        self.max_silence_s = max_silence_s
+        self.last = None
+        self.pending = False   # set from the receive thread by confirm()
+
+    def confirm(self):
+        self.pending = True
+
+    def check(self, status: dict):
+        if status["gps"].get("lat") is None:
+            silent = self.last is None or status["heartbeat"] - self.last["heartbeat"] >= self.max_silence_s
+            reason = "no_fix" if silent else None
+        elif self.last is None or self.last["gps"].get("lat") is None:
+            reason = "first"
+        elif status["heartbeat"] - self.last["heartbeat"] >= self.max_silence_s:
+            reason = "silence"
+        elif self.pending:
+            reason = "state"
+        else:
+            lat, lon, alt = predict(self.last, status["heartbeat"])
+            if distance_m(lat, lon, status["gps"]["lat"], status["gps"]["lon"]) > self.position_m:
+                reason = "position"
+            elif abs(alt - (status.get("baro") or 0.0)) > self.altitude_m:
+                reason = "altitude"
+            else:
+                reason = None
+        if reason is None:
+            SUPPRESSED.inc()
+            return None
+        self.last = status
+        self.pending = False
+        SENT.inc(reason=reason)
+        return reason
+
+
+def extrapolate(status: dict, now: float = None) -> dict:
+    """
+    Receiver side: a copy of the last status with its position moved to `now`.
+    Adds "predicted" (seconds extrapolated) and "error_m", the bound the sender
+    keeps between this prediction and its own fix.
+
+    The age is taken on the receiving host's clock, from the "received" stamp
+    the status table adds; the drone's heartbeat comes from its own clock,
+    which may be seconds off.
+    """
+    now = time.time() if now is None else now
+    if status.get("gps", {}).get("lat") is None or "heartbeat" not in status or "received" not in status:
+        return status
+    age = now - status["received"]
+    if age <= 0 or age > MAX_EXTRAPOLATE_S:
+        return status
+    lat, lon, alt = predict(status, status["heartbeat"] + age)
+    return {**status, "gps": {**status["gps"], "lat": lat, "lon": lon}, "baro": alt,
+            "predicted": round(age, 2), "error_m": status.get("dr_error_m", POSITION_ERROR_M)}
+
+
+# If run directly, replay simulated survey flights and compare fixed-rate status
+# with the adaptive sender: bytes sent and error of the position a receiver shows
+if __name__ == '__main__':
+    import json
+    import random
+    from collections import Counter
+    import numpy as np
+    from area_splitter import read_polygon_from_kml
+    from geo_projection import frame_for_polygon
+    from shared_config import KML_PATH, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT
+    from state_sync import StateReplica, StateStore
+    from survey_planner import plan_lawnmower, split_into_strips
+
+    SAMPLE_S = 0.2      # drone samples its state at 5 Hz
+    SPEED = 8.0         # m/s on the lanes
+    GPS_NOISE_M = 0.3
+    CLOCK_OFFSET_S = 3.0
+    UNSHARED = ("heartbeat", "received", "state_epoch", "state_version")   # receiver.UNSHARED_FIELDS
+    rng = random.Random(0)
+
+    field = read_polygon_from_kml(KML_PATH)
+    frame = frame_for_polygon(field)
+
+    def flight(part):
+        # 30 s on the ground, 10 s climb, the survey at SPEED, 30 s hover at the end
+        wps = np.array([frame.forward(lat, lon) for lat, lon, _ in
+                        plan_lawnmower(part, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT)['waypoints']])
+        track = [(wps[0][0], wps[0][1], 0.0)] * int(30 / SAMPLE_S)
+        track += [(wps[0][0], wps[0][1], ALTITUDE_M * k * SAMPLE_S / 10) for k in range(int(10 / SAMPLE_S))]
+        for a, b in zip(wps[:-1], wps[1:]):
+            steps = max(1, int(np.hypot(*(b - a)) / (SPEED * SAMPLE_S)))
+            track += [(*(a + (b - a) * (k / steps)), ALTITUDE_M) for k in range(steps)]
+        track += [(wps[-1][0], wps[-1][1], ALTITUDE_M)] * int(30 / SAMPLE_S)
+        return [(i * SAMPLE_S, x, y, z) for i, (x, y, z) in enumerate(track)]
+
+    def samples(track, drone):
+        # what get_status() reports: a noisy fix and the autopilot's NED velocity,
+        # timed by a drone clock up to CLOCK_OFFSET_S off the controller's
+        clock_offset = rng.uniform(-CLOCK_OFFSET_S, CLOCK_OFFSET_S)
+        out = []
+        for (t, x, y, z), (_, x1, y1, z1) in zip(track, track[1:] + track[-1:]):
+            lat, lon = frame.inverse(x + rng.gauss(0, GPS_NOISE_M), y + rng.gauss(0, GPS_NOISE_M))
+            out.append({"id": drone, "gps": {"lat": float(lat), "lon": float(lon)}, "baro": z + rng.gauss(0, 0.1),
+                        "velocity": [(y1 - y) / SAMPLE_S, (x1 - x) / SAMPLE_S, -(z1 - z) / SAMPLE_S],
+                        "heartbeat": t + clock_offset, "dr_error_m": POSITION_ERROR_M})
+        return out
+
+    def replay(tracks, policy, alerts=()):
+        # the drones in lockstep through the controller's shared state, as receiver.py runs it:
+        # every sent status updates the "drones" section and acks, then every drone is sent
+        # what changed. alerts: (start, end) times of a separation alert between drones 0 and 1.
+        # Returns bytes sent, sends by reason, samples taken and the error of the position a
+        # receiver shows at each sample time.
+        store = StateStore()
+        for i in range(len(tracks)):
+            store.put("peers", str(i), {"id": i})
+        replicas = [StateReplica() for _ in tracks]
+        senders = [AdaptiveSender() for _ in tracks]
+        streams = [samples(track, i) for i, track in enumerate(tracks)]
+        sent, next_send = [None] * len(tracks), [0.0] * len(tracks)
+        sent_bytes, reasons, taken, errors = 0, Counter(), 0, []
+        for k in range(max(len(track) for track in tracks)):
+            t = k * SAMPLE_S
+            for start, end in alerts:
+                if abs(t - start) < 1e-9:
+                    store.put("alerts", "0-1", {"drones": [0, 1], "distance_m": 12.0, "vertical_m": 0.0})
+                elif abs(t - end) < 1e-9:
+                    store.remove("alerts", "0-1")
+            for i, track in enumerate(tracks):
+                if k >= len(track):
+                    continue      # landed
+                _, x, y, _ = track[k]
+                status = {**streams[i][k], **replicas[i].ack_fields()}
+                taken += 1
+                if policy == "adaptive":
+                    reason = senders[i].check(status)
+                else:
+                    reason = "fixed" if t >= next_send[i] - 1e-9 else None
+                    next_send[i] = t + policy if reason else next_send[i]
+                if reason is not None:
+                    sent[i] = {**status, "received": t}
+                    sent_bytes += len(json.dumps(status)) + 1
+                    reasons[reason] += 1
+                    store.put("drones", str(i), {f: v for f, v in status.items() if f not in UNSHARED})
+                    store.ack(str(i), status["state_epoch"], status["state_version"], now=t)
+                shown = extrapolate(sent[i], t) if policy == "adaptive" else sent[i]
+                sx, sy = frame.forward(shown["gps"]["lat"], shown["gps"]["lon"])
+                errors.append(float(np.hypot(sx - x, sy - y)))
+            # the controller broadcasts after taking in a round of statuses
+            for i, replica in enumerate(replicas):
+                msg = store.message_for(str(i), now=t)
+                if msg is not None:
+                    if replica.apply(json.loads(json.dumps(msg))) & {"peers", "alerts"}:
+                        senders[i].confirm()
+                    store.sent(str(i), msg, ok=True)
+        return sent_bytes, reasons, taken, np.array(errors)
+
+    tracks = [flight(part) for part in split_into_strips(field, 4)]
+    seconds = sum(len(t) for t in tracks) * SAMPLE_S
+    alerts = [(120.0, 150.0), (300.0, 310.0)]
+    print(f"Replay: {len(tracks)} drones, {seconds / 60:.0f} min of flight sampled at {1 / SAMPLE_S:.0f} Hz, "
+          f"{SPEED:.0f} m/s lanes, {GPS_NOISE_M} m GPS noise, drone clocks up to {CLOCK_OFFSET_S:.0f} s off, "
+          f"{len(alerts)} separation alerts")
+    print(f"{'policy':>18} {'bytes/s/drone':>14} {'saving':>7} {'err p50':>8} {'p99':>6} {'max':>6}")
+    base = None
+    for label, policy in (("fixed 1 Hz (now)", 1.0), ("fixed 5 Hz", SAMPLE_S), ("adaptive", "adaptive")):
+        total, reasons, _, errs = replay(tracks, policy, alerts)
+        rate = total / seconds
+        base = base or rate
+        print(f"{label:>18} {rate:>14.0f} {base / rate:>6.1f}x {np.median(errs):>6.2f} m "
+              f"{np.percentile(errs, 99):>4.1f} m {errs.max():>4.1f} m")
+    print(f"adaptive sends by reason: {dict(reasons)}")
+    # drones waiting on the ground: only the silence heartbeat should go out
+    x, y = frame.forward(*field.representative_point().coords[0][::-1])
+    parked = [[(i * SAMPLE_S, x + 30 * d, y, 0.0) for i in range(int(180 / SAMPLE_S))] for d in range(3)]
+    _, reasons, taken, _ = replay(parked, "adaptive")
+    print(f"3 drones parked for 180 s: sent {sum(reasons.values())} of {taken} samples {dict(reasons)}")
@@ -1,13 +1,15 @@
-import socket
 import threading
 import logging
 
 # Drone imports
-from dronekit import connect, VehicleMode, Command
+from dronekit import connect, VehicleMode, Command, LocationGlobalRelative
 from pymavlink import mavutil
-from shapely.ops import split
-from shapely.geometry import Polygon, LineString
-from test_workflow import QuadplaneSurvey
+from shapely.geometry import Polygon
+from clock_sync import clock, wait_until
+from command_server import CommandServer
+from plan_service import load_plan
+from survey_planner import plan_lawnmower
+import tracing
 from shared_config import *
 import time
 
@@ -19,21 +21,27 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("DroneMission")
 
 def arm_and_takeoff(vehicle, target_altitude):
+    # Abort is checked at every step; a pause holds the climb and resume picks it up again
     vehicle.mode = VehicleMode("GUIDED")
     time.sleep(2)
+    hold_while_paused()
     vehicle.armed = True
     while not vehicle.armed:
+        check_abort()
         time.sleep(1)
     vehicle.simple_takeoff(target_altitude)
+    climbing = True
     while True:
-        if vehicle.location.global_relative_frame.alt >= target_altitude * 0.95:
+        check_abort()
+        if mission_state == "paused":
+            climbing = False
+        elif not climbing:
+            here = vehicle.location.global_relative_frame
+            vehicle.simple_goto(LocationGlobalRelative(here.lat, here.lon, target_altitude))
+            climbing = True
+        if climbing and vehicle.location.global_relative_frame.alt >= target_altitude * 0.95:
             break
-        time.sleep(1)
-
-def split_polygon(poly: Polygon):
-    minx, miny, maxx, maxy = poly.bounds
-    midx = (minx + maxx) / 2
-    return split(poly, LineString([(midx, miny), (midx, maxy)]))
+        abort_event.wait(1)
 
 def upload_and_execute(vehicle, wps):
     cmds = vehicle.commands
@@ -55,40 +63,189 @@ def upload_and_execute(vehicle, wps):
     cmds.upload()
     vehicle.mode = VehicleMode("AUTO")
 
-def start_mission():
-    vehicle = connect('udp:127.0.0.1:14551', wait_ready=True)
-    arm_and_takeoff(vehicle, ALTITUDE_M)
-
-    survey = QuadplaneSurvey()
-    survey.KML_PATH = KML_PATH
-    poly = survey.read_polygon()
-    parts = [p for p in split_polygon(poly).geoms if isinstance(p, Polygon)]
-    wps, _ = survey.generate_lawnmower(parts[1])
-    upload_and_execute(vehicle, wps)
-
-    vehicle.close()
-    logger.info("Mission complete.")
+def upload_mission_update(vehicle, wps):
+    # In-flight replacement: no home/takeoff, continue in AUTO from the first new waypoint
+    cmds = vehicle.commands
+    cmds.clear()
+    for lat, lon, alt in wps[1:]:
+        cmds.add(Command(0,0,0,mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT,
+                         mavutil.mavlink.MAV_CMD_NAV_WAYPOINT, 0,0,0,0,0,0,
+                         lat, lon, alt))
+    cmds.add(Command(0,0,0,mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT,
+                     mavutil.mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH, 0,0,0,0,0,0,
+                     0,0,0))
+    cmds.upload()
+    cmds.next = 1
+
+# Vehicle link, published as soon as it connects so abort/pause work during the start;
+# it stays open after the upload so the controller can re-assign lanes
+vehicle = None
+# Mission state: idle -> starting -> flying (paused / aborted) -> idle once landed and disarmed
+mission_state = "idle"
+resume_state = "flying"   # what resume returns to: "starting" while still climbing
+started_at = None   # local wall-clock time the vehicle was armed (for the controller's skew report)
+state_lock = threading.Lock()
+abort_event = threading.Event()   # set by abort; stops a pending start at its next step
+
+class MissionAborted(Exception):
+    pass
+
+def check_abort():
+    if abort_event.is_set():
+        raise MissionAborted()
+
+def hold_while_paused():
+    while mission_state == "paused":
+        check_abort()
+        abort_event.wait(0.5)
+    check_abort()
+
+def require_vehicle():
+    if vehicle is None:
+        raise RuntimeError(f"no mission running (state {mission_state})")
+    return vehicle
+
+def update_mission(waypoints, lanes=(), replan_ms=0):
+    link = require_vehicle()
+    t0 = time.perf_counter()
+    wps = [tuple(wp) for wp in waypoints]
+    with tracing.span("update_mission", waypoints=len(wps)):
+        upload_mission_update(link, wps)
+    upload_ms = (time.perf_counter() - t0) * 1000
+    tracing.save()
+    logger.info(f"Mission updated: {len(lanes)} lanes, {len(wps)} waypoints "
+                f"(re-plan {replan_ms:.1f} ms, upload {upload_ms:.0f} ms)")
+    return {"upload_ms": upload_ms}
+
+def update_area(polygon):
+    # New area as [[lon, lat], ...]: plan it here and continue the mission over it
+    require_vehicle()
+    t0 = time.perf_counter()
+    plan = plan_lawnmower(Polygon(polygon), ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT)
+    plan_ms = (time.perf_counter() - t0) * 1000
+    return update_mission(plan["waypoints"], plan["lines"], plan_ms)
+
+def pause():
+    global mission_state, resume_state
+    link = require_vehicle()
+    with state_lock:
+        if mission_state not in ("starting", "flying"):
+            raise RuntimeError(f"cannot pause while {mission_state}")
+        resume_state, mission_state = mission_state, "paused"
+        link.mode = VehicleMode("LOITER")
+    logger.info(f"Mode LOITER (paused while {resume_state})")
+    return {"state": "paused"}
+
+def resume():
+    global mission_state
+    link = require_vehicle()
+    with state_lock:
+        if mission_state != "paused":
+            raise RuntimeError(f"cannot resume while {mission_state}")
+        mission_state = resume_state
+        # before the upload there is no mission to continue: back to the guided climb
+        mode = "AUTO" if resume_state == "flying" else "GUIDED"
+        link.mode = VehicleMode(mode)
+    logger.info(f"Mode {mode} ({mission_state})")
+    return {"state": mission_state}
+
+def abort():
+    global mission_state
+    with state_lock:
+        if mission_state == "idle":
+            raise RuntimeError("no mission running (state idle)")
+        mission_state = "aborted"
+        abort_event.set()
+        link = vehicle
+    if link is not None and link.armed:
+        link.mode = VehicleMode("RTL")
+    logger.info("Mode RTL (aborted)")
+    return {"state": "aborted"}
+
+def status():
+    return {"state": mission_state, "started_at": started_at,
+            "mode": vehicle.mode.name if vehicle is not None else None}
+
+def run_mission(start_at=None):
+    global vehicle, mission_state, resume_state, started_at
+    link = None
+    try:
+        with tracing.span("start_mission"):
+            # Plan is precomputed by the controller; fetch it before taking off
+            with tracing.span("load_plan"):
+                plan = load_plan(1)
+            wps = [tuple(wp) for wp in plan["waypoints"]]
+
+            with tracing.span("connect"):
+                link = connect('udp:127.0.0.1:14551', wait_ready=True)
+            vehicle = link
+            # Swarm start: everything slow is done, now wait for the common start time
+            if start_at is not None:
+                with tracing.span("wait_start"):
+                    wait_until(start_at, abort_event)
+            check_abort()
+            started_at = time.time()
+            with tracing.span("arm_and_takeoff"):
+                arm_and_takeoff(link, ALTITUDE_M)
+            with tracing.span("upload_and_execute", waypoints=len(wps)):
+                upload_and_execute(link, wps)
+            tracing.instant("auto")
+        with state_lock:
+            check_abort()
+            if mission_state == "paused":
+                # paused between the climb and the upload: stay in LOITER, resume into AUTO
+                resume_state = "flying"
+                link.mode = VehicleMode("LOITER")
+            else:
+                mission_state = "flying"
+        logger.info("Mission uploaded.")
+    except MissionAborted:
+        logger.warning("Mission start aborted")
+        if link is not None and link.armed:
+            link.mode = VehicleMode("RTL")
+    finally:
+        tracing.save()
+    # The mission ends in RTL (last item or abort); once landed and disarmed a new one may start
+    while link is not None and link.armed:
+        time.sleep(1)
 
-# Server socket setup
+def start_mission(start_at=None):
+    # Refuse a second mission instead of starting another thread on the same vehicle
+    global mission_state, started_at
+    with state_lock:
+        if mission_state != "idle":
+            raise RuntimeError(f"mission already {mission_state}")
+        mission_state = "starting"
+        started_at = None   # the previous mission's arm time must not answer this one's status polls
+        abort_event.clear()
+    logger.info("🚀 Starting mission thread...")
+
+    def run():
+        global vehicle, mission_state
+        try:
+            run_mission(start_at)
+        except Exception as e:
+            logger.error(f"Mission failed: {e}")
+        finally:
+            with state_lock:
+                link, vehicle = vehicle, None
+                mission_state = "idle"
+            if link is not None:
+                link.close()
+            logger.info("Mission over, ready for the next one")
+    threading.Thread(target=run, daemon=True).start()
+    return {"state": "starting"}
+
+# Command server: framed JSON requests from Comm/client.py and the controller
 HOST = '0.0.0.0'
 
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-server_socket.bind((HOST, PORT))
-server_socket.listen(1)
-
-print(f"Drone server listening on {HOST}:{PORT}")
-
-while True:
-    conn, addr = server_socket.accept()
-    print(f"Connection from {addr}")
-    data = conn.recv(1024)
-    message = data.decode().strip().lower()
-    print("Received:", message)
-
-    if message == "start mission":
-        print("🚀 Starting mission thread...")
-        mission_thread = threading.Thread(target=start_mission)
-        mission_thread.start()
-
-    conn.close()
-
+CommandServer({
+    "clock": clock,
+    "start_mission": start_mission,
+    "abort": abort,
+    "pause": pause,
+    "resume": resume,
+    "update_mission": update_mission,
+    "update_area": update_area,
+    "status": status,
+}, HOST, PORT).serve_forever()
@@ -1,5 +1,4 @@
 import sys
-import json
 import threading
 import time
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget
@@ -10,7 +9,9 @@ import folium
 import os
 from PyQt5.QtWidgets import QPushButton, QHBoxLayout
 
-DATA_FILE = "drone_status.json"
+from dead_reckoning import extrapolate
+from status_table import TableReader
+
 HOME_LOCATION = [12.34, 56.78]
 
 class DroneMapWindow(QMainWindow):
@@ -22,6 +23,7 @@ class DroneMapWindow(QMainWindow):
         self.last_bounds = None
         self.last_center = HOME_LOCATION
         self.last_zoom = 15
+        self.status_table = TableReader()
         # Buttons
         self.btn_home = QPushButton("Zoom to Home")
         self.btn_fit = QPushButton("Fit All Drones")
@@ -43,21 +45,18 @@ class DroneMapWindow(QMainWindow):
         self.update_map()
 
     def update_map(self):
-        # Load drone data
-        if not os.path.exists(DATA_FILE):
+        # Latest drone statuses, read straight from the receiver's shared memory
+        try:
+            drones = self.status_table.snapshot()
+        except Exception:
             drones = {}
-        else:
-            with open(DATA_FILE, "r") as f:
-                try:
-                    drones = json.load(f)
-                except Exception:
-                    drones = {}
         # Use last center/zoom unless user pressed a button
         center = self.last_center
         zoom = self.last_zoom
         m = folium.Map(location=center, zoom_start=zoom)
         bounds = []
         for drone_id, status in drones.items():
+            status = extrapolate(status)
             latlon = [status["gps"]["lat"], status["gps"]["lon"]]
             folium.Marker(
                 latlon,
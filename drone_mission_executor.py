@@ -1,31 +1,44 @@
 from dronekit import connect, VehicleMode, LocationGlobalRelative
+import json
+import socket
 import time
 import threading
-from shapely.geometry import Polygon, Point
+import numpy as np
+from shapely.geometry import Polygon
 from area_splitter import get_area_coordinates
-from random_target_generator import RandomTargetGenerator
-
-import math
+from async_log import fields, get_logger
+from framing import encode, iter_frames
+from geo_projection import frame_for_polygon
+from mapping_params import haversine_distance
+from shared_config import EXECUTOR_ADDRS, CONTROLLER_IP, CONTROLLER_PORT
+import tracing
 
 # === SETTINGS ===
 DRONE_CONNECTION = 'udp:127.0.0.1:14550'
 TARGET_ALTITUDE = 10
 AREA_NUMBER = 1  # This drone is assigned to area 1
+DRONE_ID = 0     # index into shared_config.EXECUTOR_ADDRS
+TARGET_PORT = EXECUTOR_ADDRS[DRONE_ID][1]  # the controller's dispatcher pushes targets here
+TARGET_TIMEOUT = 5  # seconds a dispatcher connection may stay idle
+
+log = get_logger("executor")
 
 # === INIT ===
 print("Connecting to drone...")
-vehicle = connect(DRONE_CONNECTION, wait_ready=True)
+with tracing.span("connect"):
+    vehicle = connect(DRONE_CONNECTION, wait_ready=True)
 print("Drone connected.")
 
 # === Load assigned area as Polygon ===
 area_coords = get_area_coordinates(AREA_NUMBER)
 area_poly = Polygon([(lon, lat) for lat, lon in area_coords])  # lon, lat order for Shapely
-
-# === Setup random target generator ===
-generator = RandomTargetGenerator()
+# Plan in local metres: every target is kept as (east, north)
+frame = frame_for_polygon(area_poly)
 
 # === Coordinate Queue ===
-target_queue = []
+target_queue = []     # (lat, lon) for export to the autopilot
+target_local = []     # matching (east, north) in metres
+target_ids = []       # dispatcher ids, reported back on completion
 queue_lock = threading.Lock()
 
 # === Arm and Takeoff ===
@@ -47,26 +60,45 @@ def arm_and_takeoff(alt):
             break
         time.sleep(1)
 
-# === Distance Calculator ===
-def get_distance_meters(lat1, lon1, lat2, lon2):
-    R = 6371000  # Radius of Earth in meters
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    d_phi = math.radians(lat2 - lat1)
-    d_lambda = math.radians(lon2 - lon1)
-    a = math.sin(d_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(d_lambda/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-# === Background Thread to Fetch Random Targets ===
-def fetch_targets():
+# === Background Thread Receiving Targets from the Controller ===
+def listen_for_targets():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("0.0.0.0", TARGET_PORT))
+    server.listen()
+    print(f"Waiting for targets on port {TARGET_PORT}...")
     while True:
-        lat, lon = generator.get_random_target()
-        point = Point(lon, lat)
-        if area_poly.contains(point):
-            with queue_lock:
-                print(f"[+] New target in area: {lat:.6f}, {lon:.6f}")
-                target_queue.append((lat, lon))
-        else:
-            print(f"[-] Ignored target outside area: {lat:.6f}, {lon:.6f}")
+        conn, _ = server.accept()
+        with conn:
+            conn.settimeout(TARGET_TIMEOUT)
+            try:
+                for data in iter_frames(conn):
+                    conn.sendall(encode(json.dumps(accept_target(data)).encode()))
+            except Exception as e:
+                log.warning("Target connection failed", extra=fields(error=e))
+
+def accept_target(data):
+    try:
+        msg = json.loads(data)
+        if msg.get("command") != "target":
+            raise ValueError(f"unknown command {msg.get('command')}")
+        lat, lon = msg["lat"], msg["lon"]
+        east, north = frame.forward(lat, lon)
+        with queue_lock:
+            target_queue.append((lat, lon))
+            target_local.append((float(east), float(north)))
+            target_ids.append(msg["id"])
+        log.info("New target", extra=fields(id=msg['id'], lat=f"{lat:.6f}", lon=f"{lon:.6f}"))
+        return {"ok": True}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+def report_done(target_id):
+    try:
+        with socket.create_connection((CONTROLLER_IP, CONTROLLER_PORT), timeout=2) as s:
+            s.sendall(encode(json.dumps({"command": "target_done", "drone": DRONE_ID, "id": target_id}).encode()))
+    except Exception as e:
+        log.warning("Failed to report target", extra=fields(id=target_id, error=e))
 
 # === Mission Execution ===
 def fly_to_targets():
@@ -77,37 +109,46 @@ def fly_to_targets():
             # Current location
             curr_lat = vehicle.location.global_relative_frame.lat
             curr_lon = vehicle.location.global_relative_frame.lon
+            curr_e, curr_n = frame.forward(curr_lat, curr_lon)
 
-            # Sort by nearest target
-            target_queue.sort(key=lambda t: get_distance_meters(curr_lat, curr_lon, t[0], t[1]))
-            lat, lon = target_queue.pop(0)
+            # Pick the nearest target (all queued targets in one vectorized pass)
+            queued = np.asarray(target_local)
+            nearest = int(np.argmin(np.hypot(queued[:, 0] - curr_e, queued[:, 1] - curr_n)))
+            lat, lon = target_queue.pop(nearest)
+            target_local.pop(nearest)
+            target_id = target_ids.pop(nearest)
 
             remaining = len(target_queue)
 
         print(f"\n➡️  Flying to target: {lat:.6f}, {lon:.6f}")
         print(f"🧭 Remaining targets after this: {remaining}")
-        vehicle.mode = VehicleMode("GUIDED")
-        vehicle.simple_goto(LocationGlobalRelative(lat, lon, TARGET_ALTITUDE))
-        
-        # Wait to reach
-        while True:
-            current = vehicle.location.global_relative_frame
-            dist = get_distance_meters(current.lat, current.lon, lat, lon)
-            print(f"   ↪ Distance to target: {dist:.2f} m", end="\r")
-            if dist < 2.0:
-                print("\n✅ Reached target. Hovering...")
-                break
-            time.sleep(1)
-
-        time.sleep(5)  # Hover at the location
+        with tracing.span("goto", target=target_id):
+            vehicle.mode = VehicleMode("GUIDED")
+            vehicle.simple_goto(LocationGlobalRelative(lat, lon, TARGET_ALTITUDE))
+
+            # Wait to reach
+            while True:
+                current = vehicle.location.global_relative_frame
+                dist = haversine_distance(current.lat, current.lon, lat, lon)
+                log.debug("Distance to target", extra=fields(id=target_id, m=f"{dist:.2f}"))
+                if dist < 2.0:
+                    print("✅ Reached target. Hovering...")
+                    break
+                time.sleep(1)
+
+        with tracing.span("hover", target=target_id):
+            time.sleep(5)  # Hover at the location
+        report_done(target_id)
+        tracing.save()
         print("🕔 Hover complete. Moving to next...\n")
 
 # === RUN ===
-arm_and_takeoff(TARGET_ALTITUDE)
+with tracing.span("arm_and_takeoff"):
+    arm_and_takeoff(TARGET_ALTITUDE)
 
-# Start target generator in the background
-fetch_thread = threading.Thread(target=fetch_targets, daemon=True)
-fetch_thread.start()
+# Receive targets from the controller's dispatcher in the background
+listen_thread = threading.Thread(target=listen_for_targets, daemon=True)
+listen_thread.start()
 
 # Start drone navigation loop
 fly_to_targets()
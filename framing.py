@@ -0,0 +1,180 @@
+import struct
+
+# === Framing ===
+# NEWLINE: every message ends with b"\n" (JSON never contains a raw newline).
+# LENGTH:  every message starts with its length as a 4-byte big-endian integer.
+NEWLINE = 'newline'
+LENGTH = 'length'
+HEADER = struct.Struct('>I')
+MAX_FRAME = 4 * 1024 * 1024     # largest accepted message (a full mission is well under this)
+RECV_SIZE = 65536               # bytes read per recv_into()
+
+
+class FrameTooLarge(ValueError):
+    """A peer announced or sent a message above the frame limit."""
+
+
+def encode(payload: bytes, mode: str = NEWLINE) -> bytes:
+    if mode == NEWLINE:
+        return payload + b'\n'
+    return HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder:
+    """
+    Incremental splitter for a byte stream. Bytes are appended to one
+    bytearray and scanned from where the last scan stopped; consumed bytes
+    are dropped once per feed(), so a burst of many frames costs linear time
+    however it is chunked.
+    """
+
+    def __init__(self, mode: str = NEWLINE, max_frame: int = MAX_FRAME):
+        if mode not in (NEWLINE, LENGTH):
+            raise ValueError(f"unknown framing mode {mode}")
+        self.mode = mode
+        self.max_frame = max_frame
+        self.buf = bytearray()
+        self.scanned = 0      # newline mode: bytes of the pending frame already searched
+
+    def feed(self, data) -> list:
+        """Add received bytes; returns the complete frames (without delimiter or header)."""
+        self.buf += data
+        frames = []
+        view = memoryview(self.buf)
+        try:
+            pos = self._newline(view, frames) if self.mode == NEWLINE else self._length(view, frames)
+        finally:
+            view.release()
+        if pos:
+            del self.buf[:pos]
+        return frames
+
+    def _newline(self, view, frames) -> int:
+        pos = 0
+        start = self.scanned
+        while True:
+            end = self.buf.find(b'\n', start)
+            if end < 0:
+                break
+            if end - pos > self.max_frame:
+                raise FrameTooLarge(f"frame of {end - pos} bytes exceeds {self.max_frame}")
+            frames.append(bytes(view[pos:end]))
+            pos = start = end + 1
+        self.scanned = len(self.buf) - pos
+        if self.scanned > self.max_frame:
+            raise FrameTooLarge(f"unterminated frame of {self.scanned} bytes exceeds {self.max_frame}")
+        return pos
+
+    def _length(self, view, frames) -> int:
+        pos = 0
+        size = len(self.buf)
+        while size - pos >= HEADER.size:
+            (n,) = HEADER.unpack_from(self.buf, pos)
+            if n > self.max_frame:
+                raise FrameTooLarge(f"frame of {n} bytes exceeds {self.max_frame}")
+            if size - pos - HEADER.size < n:
+                break
+            start = pos + HEADER.size
+            frames.append(bytes(view[start:start + n]))
+            pos = start + n
+        return pos
+
+    def flush(self):
+        """
+        At end of stream: the unterminated tail as a last frame in newline mode
+        (senders that close instead of ending the line), None if nothing is left.
+        """
+        tail, self.buf, self.scanned = bytes(self.buf), bytearray(), 0
+        if not tail.strip():
+            return None
+        if self.mode == LENGTH:
+            raise ConnectionError(f"stream ended inside a frame ({len(tail)} bytes pending)")
+        return tail
+
+
+def iter_frames(sock, mode: str = NEWLINE, max_frame: int = MAX_FRAME):
+    """Yield the messages of a socket until the peer closes it."""
+    decoder = FrameDecoder(mode, max_frame)
+    chunk = bytearray(RECV_SIZE)
+    view = memoryview(chunk)
+    while True:
+        n = sock.recv_into(chunk)
+        if not n:
+            break
+        yield from decoder.feed(view[:n])
+    tail = decoder.flush()
+    if tail is not None:
+        yield tail
+
+
+# If run directly, benchmark against the buffer += chunk / split() loop it replaces
+# and fuzz the decoder with random splits and coalesced frames
+if __name__ == '__main__':
+    import json
+    import random
+    import time
+
+    def split_loop(chunks):
+        buffer = b""
+        out = []
+        for chunk in chunks:
+            buffer += chunk
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                out.append(line)
+        return out
+
+    def decode_all(chunks, mode):
+        dec = FrameDecoder(mode)
+        out = []
+        for chunk in chunks:
+            out.extend(dec.feed(chunk))
+        return out
+
+    def chunked(stream, size):
+        return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+    status = json.dumps({"id": 3, "gps": {"lat": -35.363261, "lon": 149.165230}, "baro": 584.1,
+                         "velocity": [1.2, -0.4, 0.0], "heartbeat": 1700000000.0}).encode()
+    print(f"{'frames':>7} {'chunk':>7} {'split loop':>14} {'newline':>14} {'length':>14}")
+    for n, size in ((1_000, 1460), (20_000, 65536), (20_000, 1 << 30)):
+        line_stream = b''.join(encode(status) for _ in range(n))
+        len_stream = b''.join(encode(status, LENGTH) for _ in range(n))
+        rates = []
+        for fn, stream in ((split_loop, line_stream), (lambda c: decode_all(c, NEWLINE), line_stream),
+                           (lambda c: decode_all(c, LENGTH), len_stream)):
+            chunks = chunked(stream, size)
+            t0 = time.perf_counter()
+            frames = fn(chunks)
+            dt = time.perf_counter() - t0
+            assert len(frames) == n
+            rates.append(len(stream) / dt / 1e6)
+        label = "burst" if size > len(line_stream) else str(size)
+        print(f"{n:>7} {label:>7} " + ' '.join(f"{r:>9.1f} MB/s" for r in rates))
+
+    # fuzz: random payloads, random chunk boundaries (down to single bytes), both modes
+    rng = random.Random(0)
+    cases = 0
+    for _ in range(2000):
+        payloads = [bytes(rng.choice(b'{}"abc:,0123 ') for _ in range(rng.choice((0, 1, 5, 40, 300, 5000))))
+                    for _ in range(rng.randint(1, 30))]
+        for mode in (NEWLINE, LENGTH):
+            stream = b''.join(encode(p, mode) for p in payloads)
+            cuts = sorted(rng.sample(range(1, len(stream)), min(len(stream) - 1, rng.randint(0, 40))))
+            chunks = [stream[a:b] for a, b in zip([0] + cuts, cuts + [len(stream)])]
+            dec = FrameDecoder(mode)
+            got = [f for c in chunks for f in dec.feed(c)]
+            assert got == payloads, (mode, payloads, chunks)
+            assert dec.flush() is None
+            cases += 1
+    # limits: an oversized frame is refused whether announced, delimited or still open
+    for mode, data in ((LENGTH, HEADER.pack(101)), (NEWLINE, b'x' * 101 + b'\n'), (NEWLINE, b'x' * 101)):
+        try:
+            FrameDecoder(mode, max_frame=100).feed(data)
+            raise AssertionError(f"{mode}: oversized frame accepted")
+        except FrameTooLarge:
+            pass
+    # a sender that closes without a final newline still delivers its message
+    dec = FrameDecoder()
+    assert dec.feed(b'{"a": 1}\n{"b"') == [b'{"a": 1}'] and dec.feed(b': 2}') == [] and dec.flush() == b'{"b": 2}'
+    print(f"Fuzz: {cases} random split/coalesced streams decoded exactly; limits enforced")
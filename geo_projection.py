@@ -0,0 +1,137 @@
+import math
+from functools import lru_cache
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+# === WGS84 ellipsoid ===
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+WGS84_B = WGS84_A * (1 - WGS84_F)
+WGS84_EP2 = (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+
+ORIGIN_DECIMALS = 7  # frames are cached per origin rounded to ~1 cm
+
+
+def _geodetic_to_ecef(lat, lon, alt):
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    sin_lat = np.sin(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    x = (n + alt) * np.cos(lat) * np.cos(lon)
+    y = (n + alt) * np.cos(lat) * np.sin(lon)
+    z = (n * (1 - WGS84_E2) + alt) * sin_lat
+    return x, y, z
+
+
+def _ecef_to_geodetic(x, y, z):
+    """Bowring's closed-form inverse, sub-millimetre for near-surface points."""
+    p = np.hypot(x, y)
+    theta = np.arctan2(z * WGS84_A, p * WGS84_B)
+    lat = np.arctan2(z + WGS84_EP2 * WGS84_B * np.sin(theta) ** 3,
+                     p - WGS84_E2 * WGS84_A * np.cos(theta) ** 3)
+    lon = np.arctan2(y, x)
+    sin_lat = np.sin(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    alt = p / np.cos(lat) - n
+    return np.degrees(lat), np.degrees(lon), alt
+
+
+class LocalFrame:
+    """
+    Local East-North-Up tangent frame anchored at (lat0, lon0, alt0).
+
+    All transforms take scalars or arrays of any shape and work on the whole
+    array in one call. Planning is done in (east, north) metres and converted
+    back to lat/lon only for export.
+    """
+
+    def __init__(self, lat0: float, lon0: float, alt0: float = 0.0):
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self.alt0 = alt0
+        self._x0, self._y0, self._z0 = _geodetic_to_ecef(lat0, lon0, alt0)
+        sl, cl = math.sin(math.radians(lat0)), math.cos(math.radians(lat0))
+        so, co = math.sin(math.radians(lon0)), math.cos(math.radians(lon0))
+        # rows: east, north, up unit vectors in ECEF
+        self._rot = np.array([[-so, co, 0.0],
+                              [-sl * co, -sl * so, cl],
+                              [cl * co, cl * so, sl]])
+
+    def to_enu(self, lat, lon, alt=None):
+        """Geodetic degrees (and metres) → (east, north, up) metres."""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        alt = np.zeros_like(lat) if alt is None else np.asarray(alt, dtype=float)
+        x, y, z = _geodetic_to_ecef(lat, lon, alt)
+        d = np.stack((x - self._x0, y - self._y0, z - self._z0))
+        e, n, u = np.tensordot(self._rot, d, axes=1)
+        return e, n, u
+
+    def to_geodetic(self, east, north, up=None):
+        """(east, north, up) metres → (lat, lon, alt)."""
+        east = np.asarray(east, dtype=float)
+        north = np.asarray(north, dtype=float)
+        up = np.zeros_like(east) if up is None else np.asarray(up, dtype=float)
+        dx, dy, dz = np.tensordot(self._rot.T, np.stack((east, north, up)), axes=1)
+        return _ecef_to_geodetic(dx + self._x0, dy + self._y0, dz + self._z0)
+
+    def forward(self, lat, lon):
+        """Horizontal projection: (lat, lon) → (east, north) metres."""
+        e, n, _ = self.to_enu(lat, lon)
+        return e, n
+
+    def inverse(self, east, north):
+        """Horizontal inverse: (east, north) metres → (lat, lon) on the ellipsoid surface."""
+        east = np.asarray(east, dtype=float)
+        north = np.asarray(north, dtype=float)
+        # drop back down by the curvature of the earth so the point is at alt0
+        up = -(east ** 2 + north ** 2) / (2 * WGS84_A)
+        lat, lon, _ = self.to_geodetic(east, north, up)
+        return lat, lon
+
+    def polygon_to_local(self, poly):
+        """Shapely geometry in (lon, lat) → same geometry in (east, north) metres."""
+        return shapely.transform(poly, lambda xy: np.column_stack(self.forward(xy[:, 1], xy[:, 0])))
+
+    def polygon_to_lonlat(self, poly):
+        """Shapely geometry in (east, north) metres → same geometry in (lon, lat)."""
+        def _inv(xy):
+            lat, lon = self.inverse(xy[:, 0], xy[:, 1])
+            return np.column_stack((lon, lat))
+        return shapely.transform(poly, _inv)
+
+
+@lru_cache(maxsize=64)
+def _cached_frame(lat0: float, lon0: float) -> LocalFrame:
+    return LocalFrame(lat0, lon0)
+
+
+def get_frame(lat0: float, lon0: float) -> LocalFrame:
+    """Shared LocalFrame for an origin; repeated calls reuse the same frame."""
+    return _cached_frame(round(lat0, ORIGIN_DECIMALS), round(lon0, ORIGIN_DECIMALS))
+
+
+def frame_for_polygon(poly: Polygon) -> LocalFrame:
+    """Frame anchored at the centre of a field's bounding box (lon/lat geometry)."""
+    minx, miny, maxx, maxy = poly.bounds
+    return get_frame((miny + maxy) / 2, (minx + maxx) / 2)
+
+
+# If run directly, check round-trip accuracy and batch transform speed
+if __name__ == '__main__':
+    import time
+
+    frame = get_frame(-35.36, 149.165)
+    rng = np.random.default_rng(0)
+    lat = -35.36 + rng.uniform(-0.05, 0.05, 1_000_000)
+    lon = 149.165 + rng.uniform(-0.05, 0.05, 1_000_000)
+    t0 = time.perf_counter()
+    e, n = frame.forward(lat, lon)
+    t1 = time.perf_counter()
+    lat2, lon2 = frame.inverse(e, n)
+    t2 = time.perf_counter()
+    err_m = np.hypot((lat2 - lat) * 111320.0, (lon2 - lon) * 111320.0 * math.cos(math.radians(-35.36)))
+    print(f"1M points: forward {(t1 - t0) * 1000:.0f} ms, inverse {(t2 - t1) * 1000:.0f} ms")
+    print(f"max horizontal round-trip error {err_m.max() * 1000:.3f} mm")
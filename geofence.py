@@ -0,0 +1,273 @@
+import math
+import threading
+import time
+import numpy as np
+import shapely
+from shapely.geometry import LineString, Polygon
+
+from geo_projection import frame_for_polygon
+from metrics import counter, histogram
+
+# === Geofence settings ===
+CELL_M = 10.0           # pre-index cell size (m); only cells crossed by a boundary need an exact test
+MAX_CELLS = 1_000_000   # the cell size grows for fields that would exceed this
+AREA_MARGIN_M = 5.0     # a drone may stray this far out of its partition (turns, GPS noise)
+TICK_S = 0.2            # the controller checks the latest fixes this often
+
+OUTSIDE_FIELD = "outside_field"
+NO_FLY = "no_fly"
+OUTSIDE_AREA = "outside_area"
+
+BREACHES = counter("geofence_breaches_total", "Drones entering a breach, by kind", ("kind",))
+TICK_SECONDS = histogram("geofence_tick_seconds", "Time to check one tick of fixes")
+
+# cell classes of the pre-index
+_OUT, _IN, _EDGE = 0, 1, 2
+
+
+class FenceIndex:
+    """
+    Point-in-polygon test for one polygon in local metres.
+
+    A grid over the polygon's bounds records which cells are fully inside,
+    fully outside, or crossed by the boundary. Points in the first two are
+    answered by a table lookup; only points in boundary cells go to
+    shapely.contains_xy on the prepared polygon, all in one batch.
+    """
+
+    def __init__(self, poly: Polygon, cell_m: float = CELL_M):
+        self.poly = poly
+        shapely.prepare(poly)
+        minx, miny, maxx, maxy = poly.bounds
+        cell_m = max(cell_m, math.sqrt((maxx - minx) * (maxy - miny) / MAX_CELLS))
+        self.cell_m = cell_m
+        self.minx, self.miny = minx, miny
+        self.nx = max(1, math.ceil((maxx - minx) / cell_m))
+        self.ny = max(1, math.ceil((maxy - miny) / cell_m))
+        x0 = minx + np.arange(self.nx) * cell_m
+        y0 = miny + np.arange(self.ny) * cell_m
+        gx, gy = np.meshgrid(x0, y0)
+        cells = shapely.box(gx, gy, gx + cell_m, gy + cell_m)
+        self.grid = np.full(cells.shape, _EDGE, dtype=np.uint8)
+        self.grid[shapely.contains_properly(poly, cells)] = _IN
+        self.grid[shapely.disjoint(poly, cells)] = _OUT
+
+    def contains(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        ix = np.floor((x - self.minx) / self.cell_m).astype(np.int64)
+        iy = np.floor((y - self.miny) / self.cell_m).astype(np.int64)
+        inside_grid = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)
+        cls = np.full(x.shape, _OUT, dtype=np.uint8)
+        cls[inside_grid] = self.grid[iy[inside_grid], ix[inside_grid]]
+        result = cls == _IN
+        edge = cls == _EDGE
+        if edge.any():
+            result[edge] = shapely.contains_xy(self.poly, x[edge], y[edge])
+        return result
+
+
+class AreaIndex:
+    """
+    FenceIndex for many polygons at once (one per drone): the grids are
+    concatenated so a batch of (polygon, point) pairs is classified with
+    array arithmetic, and the boundary cases go to one contains_xy call
+    over the matching prepared polygons.
+    """
+
+    def __init__(self, polys: list, cell_m: float = CELL_M):
+        indexes = [FenceIndex(p, cell_m) for p in polys]
+        self.polys = np.array([i.poly for i in indexes], dtype=object)
+        self.minx = np.array([i.minx for i in indexes])
+        self.miny = np.array([i.miny for i in indexes])
+        self.cell_m = np.array([i.cell_m for i in indexes])
+        self.nx = np.array([i.nx for i in indexes], dtype=np.int64)
+        self.ny = np.array([i.ny for i in indexes], dtype=np.int64)
+        sizes = self.nx * self.ny
+        self.offset = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+        self.grid = np.concatenate([i.grid.ravel() for i in indexes]) if indexes else np.zeros(0, np.uint8)
+
+    def __len__(self):
+        return len(self.polys)
+
+    def contains(self, which: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Whether point i lies in polygon which[i]."""
+        ix = np.floor((x - self.minx[which]) / self.cell_m[which]).astype(np.int64)
+        iy = np.floor((y - self.miny[which]) / self.cell_m[which]).astype(np.int64)
+        inside_grid = (ix >= 0) & (ix < self.nx[which]) & (iy >= 0) & (iy < self.ny[which])
+        cls = np.full(x.shape, _OUT, dtype=np.uint8)
+        w = which[inside_grid]
+        cls[inside_grid] = self.grid[self.offset[w] + iy[inside_grid] * self.nx[w] + ix[inside_grid]]
+        result = cls == _IN
+        edge = cls == _EDGE
+        if edge.any():
+            result[edge] = shapely.contains_xy(self.polys[which[edge]], x[edge], y[edge])
+        return result
+
+
+class Geofence:
+    """
+    Field fence, no-fly holes and per-drone partitions (lon/lat polygons).
+
+    Holes of the field polygon and any extra no-fly polygons are excluded
+    from the flyable area. Drone ids index the partitions, as elsewhere on
+    the controller; extend_area() lets a drone into the lanes the rebalancer
+    hands it.
+    """
+
+    def __init__(self, field: Polygon, partitions: list = (), no_fly: list = (), cell_m: float = CELL_M):
+        self.frame = frame_for_polygon(field)
+        local = self.frame.polygon_to_local(field)
+        outer = Polygon(local.exterior)
+        allowed = local
+        for zone in no_fly:
+            allowed = allowed.difference(self.frame.polygon_to_local(zone))
+        self.outer = FenceIndex(outer, cell_m)
+        self.allowed = FenceIndex(allowed, cell_m)
+        self.cell_m = cell_m
+        self.area_polys = [self.frame.polygon_to_local(p).buffer(AREA_MARGIN_M) for p in partitions]
+        self.areas = AreaIndex(self.area_polys, cell_m)
+
+    def extend_area(self, drone: int, partition: int, path=()):
+        """
+        Add another partition to a drone's area, together with its new mission
+        path ((lat, lon, ...) waypoints), which may cross other strips in
+        transit. The index is rebuilt and swapped in whole.
+        """
+        if not 0 <= drone < len(self.area_polys):
+            return
+        area = self.area_polys[drone]
+        if 0 <= partition < len(self.area_polys):
+            area = area.union(self.area_polys[partition])
+        if len(path) >= 2:
+            wps = np.asarray([wp[:2] for wp in path], dtype=float)
+            x, y = self.frame.forward(wps[:, 0], wps[:, 1])
+            area = area.union(LineString(np.column_stack((x, y))).buffer(AREA_MARGIN_M))
+        polys = list(self.area_polys)
+        polys[drone] = area
+        self.areas = AreaIndex(polys, self.cell_m)
+        self.area_polys = polys
+
+    def check(self, drones, lats, lons) -> list:
+        """Breach kind (or None) for each fix, in input order."""
+        drones = np.asarray(drones, dtype=np.int64)
+        x, y = self.frame.forward(np.asarray(lats, dtype=float), np.asarray(lons, dtype=float))
+        x, y = np.atleast_1d(x), np.atleast_1d(y)
+        kinds = np.full(x.shape, None, dtype=object)
+        in_outer = self.outer.contains(x, y)
+        kinds[~in_outer] = OUTSIDE_FIELD
+        flyable = self.allowed.contains(x, y)
+        kinds[in_outer & ~flyable] = NO_FLY
+        # drones without a partition (spares, ids beyond the split) are only held to the field
+        areas = self.areas
+        idx = np.flatnonzero(flyable & (drones >= 0) & (drones < len(areas)))
+        if len(idx):
+            kinds[idx[~areas.contains(drones[idx], x[idx], y[idx])]] = OUTSIDE_AREA
+        return kinds.tolist()
+
+
+class GeofenceMonitor:
+    """
+    Controller-side breach detection. update() only stores each drone's
+    latest fix; tick() checks all fixes received since the last tick in
+    one batch and reports drones entering or leaving a breach.
+    """
+
+    def __init__(self, fence: Geofence, tick_s: float = TICK_S):
+        self.fence = fence
+        self.tick_s = tick_s
+        self.pending = {}     # drone -> (lat, lon, time) since the last tick
+        self.breached = {}    # drone -> breach kind
+        self.lock = threading.Lock()
+
+    def update(self, drone: int, lat: float, lon: float, now: float = None):
+        with self.lock:
+            self.pending[drone] = (lat, lon, time.time() if now is None else now)
+
+    def tick(self) -> list:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return []
+        t0 = time.perf_counter()
+        drones = list(pending)
+        fixes = np.array([pending[d][:2] for d in drones])
+        kinds = self.fence.check(drones, fixes[:, 0], fixes[:, 1])
+        events = []
+        for d, kind, (lat, lon, seen) in zip(drones, kinds, (pending[d] for d in drones)):
+            if kind == self.breached.get(d):
+                continue
+            if kind is None:
+                del self.breached[d]
+            else:
+                self.breached[d] = kind
+                BREACHES.inc(kind=kind)
+            events.append({"drone": d, "kind": kind, "lat": lat, "lon": lon, "time": seen})
+        TICK_SECONDS.observe(time.perf_counter() - t0)
+        return events
+
+
+# If run directly, compare one tick of checks at swarm scale against per-message Shapely calls
+if __name__ == '__main__':
+    from shapely.geometry import Point
+    from area_splitter import read_polygon_from_kml
+    from shared_config import KML_PATH
+    from survey_planner import split_into_strips
+
+    field = read_polygon_from_kml(KML_PATH)
+    # a no-fly zone in the middle of the field, 40 m across
+    frame = frame_for_polygon(field)
+    c = frame.polygon_to_local(field).centroid
+    no_fly = frame.polygon_to_lonlat(Point(c.x, c.y).buffer(20))
+    strips = split_into_strips(field, 4)
+    fence = Geofence(field, strips, [no_fly])
+    edge_frac = [float((g == _EDGE).mean()) for g in (fence.outer.grid, fence.allowed.grid, fence.areas.grid)]
+    print(f"Pre-index: {fence.allowed.nx}x{fence.allowed.ny} cells of {fence.allowed.cell_m:.0f} m, "
+          f"{min(edge_frac):.0%}-{max(edge_frac):.0%} of cells need an exact test")
+
+    rng = np.random.default_rng(0)
+    minx, miny, maxx, maxy = field.buffer(0.001).bounds
+    allowed_ll = field.difference(no_fly)
+    strips_b = [frame.polygon_to_lonlat(frame.polygon_to_local(s).buffer(AREA_MARGIN_M)) for s in strips]
+
+    def naive(drones, lats, lons):
+        # what a per-message handler would do: Point + contains for field, no-fly and partition
+        out = []
+        for d, lat, lon in zip(drones, lats, lons):
+            p = Point(lon, lat)
+            if not Polygon(field.exterior).contains(p):
+                out.append(OUTSIDE_FIELD)
+            elif not allowed_ll.contains(p):
+                out.append(NO_FLY)
+            elif not strips_b[d].contains(p):
+                out.append(OUTSIDE_AREA)
+            else:
+                out.append(None)
+        return out
+
+    print(f"{'fixes':>6} {'per-message':>14} {'engine':>10} {'speed-up':>9} {'agree':>7}")
+    for n in (100, 500, 1000, 10_000):
+        drones = rng.integers(0, 4, n)
+        lats = rng.uniform(miny, maxy, n)
+        lons = rng.uniform(minx, maxx, n)
+        t0 = time.perf_counter()
+        ref = naive(drones, lats, lons)
+        t_naive = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        got = fence.check(drones, lats, lons)
+        t_fast = time.perf_counter() - t0
+        agree = np.mean([a == b for a, b in zip(ref, got)])
+        print(f"{n:>6} {t_naive * 1000:>11.1f} ms {t_fast * 1000:>7.2f} ms {t_naive / t_fast:>8.0f}x {agree:>7.1%}")
+
+    # one controller tick at 500 drones, each in its own strip, one breaching
+    strips = split_into_strips(field, 500)
+    t0 = time.perf_counter()
+    fence = Geofence(field, strips, [no_fly])
+    print(f"500 partitions indexed in {(time.perf_counter() - t0) * 1000:.0f} ms")
+    mon = GeofenceMonitor(fence)
+    for d, strip in enumerate(strips):
+        pt = strip.difference(no_fly).representative_point()
+        mon.update(d, pt.y, pt.x)
+    mon.update(7, maxy + 0.01, maxx + 0.01)
+    t0 = time.perf_counter()
+    events = mon.tick()
+    print(f"500 drones, one tick: {(time.perf_counter() - t0) * 1000:.2f} ms (tick every {TICK_S * 1000:.0f} ms), "
+          f"breaches: {[(e['drone'], e['kind']) for e in events]}")
@@ -0,0 +1,171 @@
+import os
+import zipfile
+from xml.etree import ElementTree as ET
+from shapely.geometry import Polygon
+
+# === KML reading ===
+# Fields are read one Placemark at a time with iterparse: every finished element
+# is detached from its parent right away, so memory stays at one Placemark however
+# many the document holds. KMZ archives are read from their first .kml entry
+# (doc.kml by convention) without extracting it.
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_ring(coord_text: str) -> list:
+    return [tuple(map(float, p.split(',')[:2])) for p in coord_text.split()]
+
+
+def _open(source):
+    """Binary stream of the KML document in a .kml/.kmz path or file object."""
+    if hasattr(source, 'read'):
+        pos = source.tell()
+        head = source.read(4)
+        source.seek(pos)
+        if head != b'PK\x03\x04':
+            return source
+        archive = zipfile.ZipFile(source)
+    elif os.path.splitext(str(source))[1].lower() == '.kmz':
+        archive = zipfile.ZipFile(source)
+    else:
+        return open(source, 'rb')
+    names = [n for n in archive.namelist() if n.lower().endswith('.kml')]
+    if not names:
+        raise RuntimeError("KMZ contains no .kml document")
+    return archive.open('doc.kml' if 'doc.kml' in names else names[0])
+
+
+def _placemark_polygons(placemark) -> list:
+    polys = []
+    for kml_poly in placemark.findall('.//{*}Polygon'):
+        outer = kml_poly.find('{*}outerBoundaryIs//{*}coordinates')
+        coords = _parse_ring(outer.text) if outer is not None and outer.text else []
+        holes = [_parse_ring(c.text) for c in kml_poly.findall('{*}innerBoundaryIs//{*}coordinates')
+                 if c.text and c.text.strip()]
+        if len(coords) >= 3:
+            polys.append(Polygon(coords, [h for h in holes if len(h) >= 3]))
+    if not polys:
+        # an outline drawn as a ring or path instead of a polygon
+        node = placemark.find('.//{*}coordinates')
+        coords = _parse_ring(node.text) if node is not None and node.text else []
+        if len(coords) >= 3:
+            polys.append(Polygon(coords))
+    return polys
+
+
+def iter_fields(source):
+    """
+    Yield (name, Polygon) for every Placemark polygon in a KML/KMZ file,
+    holes included, in document order. A MultiGeometry placemark yields one
+    polygon per part, named "<name> #<n>".
+    """
+    stream = _open(source)
+    try:
+        stack = []        # open elements, to detach each finished one from its parent
+        in_placemark = 0
+        count = 0
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                stack.append(elem)
+                if _local(elem.tag) == 'Placemark':
+                    in_placemark += 1
+                continue
+            stack.pop()
+            if _local(elem.tag) == 'Placemark':
+                in_placemark -= 1
+                polys = _placemark_polygons(elem)
+                name = (elem.findtext('{*}name') or '').strip() or f"field {count + 1}"
+                for n, poly in enumerate(polys):
+                    count += 1
+                    yield (f"{name} #{n + 1}" if len(polys) > 1 else name), poly
+            if not in_placemark and stack:
+                stack[-1].remove(elem)
+                elem.clear()
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+def read_fields(source) -> list:
+    return list(iter_fields(source))
+
+
+# If run directly, compare against ET.parse on a generated multi-field document
+# and plan every field in a process pool
+if __name__ == '__main__':
+    import io
+    import time
+    import tracemalloc
+    from shapely.geometry import Point
+    from area_splitter import read_polygon_from_kml
+    from geo_projection import frame_for_polygon
+    from plan_service import compute_field_plan, plan_fields
+    from shared_config import KML_PATH, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT
+
+    def make_kml(n: int) -> bytes:
+        # n copies of the sample field spread over a grid, every fifth with a 40 m no-fly hole
+        base = read_polygon_from_kml(KML_PATH)
+        frame = frame_for_polygon(base)
+        local = frame.polygon_to_local(base)
+        minx, miny, maxx, maxy = local.bounds
+        step = max(maxx - minx, maxy - miny) * 1.2
+        cols = int(n ** 0.5) + 1
+        parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2"><Document>']
+        for i in range(n):
+            dx, dy = (i % cols) * step, (i // cols) * step
+            ring = ' '.join(f"{lon:.8f},{lat:.8f},0" for lon, lat in
+                            frame.polygon_to_lonlat(Polygon([(x + dx, y + dy) for x, y in local.exterior.coords])).exterior.coords)
+            hole = ''
+            if i % 5 == 0:
+                c = local.centroid
+                h = frame.polygon_to_lonlat(Point(c.x + dx, c.y + dy).buffer(20))
+                hole = ('<innerBoundaryIs><LinearRing><coordinates>' +
+                        ' '.join(f"{lon:.8f},{lat:.8f},0" for lon, lat in h.exterior.coords) +
+                        '</coordinates></LinearRing></innerBoundaryIs>')
+            parts.append(f'<Placemark><name>field {i}</name><description>{"survey notes " * 200}</description>'
+                         f'<Polygon><outerBoundaryIs><LinearRing><coordinates>{ring}</coordinates>'
+                         f'</LinearRing></outerBoundaryIs>{hole}</Polygon></Placemark>')
+        parts.append('</Document></kml>')
+        return '\n'.join(parts).encode()
+
+    def whole_tree(data: bytes) -> list:
+        # the old reader's approach: parse everything, then search the tree
+        root = ET.parse(io.BytesIO(data)).getroot()
+        return [(pm.findtext('{*}name'), p) for pm in root.findall('.//{*}Placemark') for p in _placemark_polygons(pm)]
+
+    print(f"{'fields':>6} {'size':>8} {'ET.parse':>20} {'iterparse':>20}")
+    for n in (100, 1000, 5000):
+        data = make_kml(n)
+        row = []
+        for fn in (whole_tree, lambda d: read_fields(io.BytesIO(d))):
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            fields = fn(data)
+            dt = time.perf_counter() - t0
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            row.append((len(fields), dt, peak))
+        assert row[0][0] == row[1][0] == n
+        print(f"{n:>6} {len(data) / 1e6:>6.1f}MB " +
+              ' '.join(f"{dt * 1000:>7.0f} ms {peak / 1e6:>6.1f} MB" for _, dt, peak in row))
+
+    # KMZ round trip, and holes kept
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('doc.kml', make_kml(10))
+    buf.seek(0)
+    fields = read_fields(buf)
+    assert len(fields) == 10 and len(fields[0][1].interiors) == 1 and not fields[1][1].interiors
+    print(f"KMZ: {len(fields)} fields, holes kept")
+
+    # batch planning of every field: one after another in this process, then in the pool
+    data = make_kml(200)
+    t0 = time.perf_counter()
+    done = sum(1 for name, poly in iter_fields(io.BytesIO(data))
+               if compute_field_plan(name, poly, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT))
+    print(f"Planned {done} fields serially: {done / (time.perf_counter() - t0):.1f} fields/s")
+    t0 = time.perf_counter()
+    done = sum(1 for _ in plan_fields(io.BytesIO(data)))
+    print(f"Planned {done} fields in a pool of {os.cpu_count()}: {done / (time.perf_counter() - t0):.1f} fields/s")
@@ -0,0 +1,293 @@
+import json
+import threading
+import time
+import numpy as np
+from shapely.geometry import Polygon
+
+from boustrophedon import TransitRouter
+from command_server import dispatch
+from geo_projection import frame_for_polygon
+from shared_config import MAPPER_ADDRS
+
+# === Rebalancing settings ===
+HEARTBEAT_TIMEOUT_S = 5.0   # a drone with no status for this long is considered lost
+LANE_DONE_SLACK_M = 40.0    # unflown metres tolerated per lane (about two 1 Hz status intervals at cruise)
+MONITOR_INTERVAL = 1.0      # seconds between liveness checks on the controller
+SEND_TIMEOUT = 10.0         # seconds to wait for a mapper to acknowledge a mission update
+
+
+class LaneRebalancer:
+    """
+    Controller-side lane bookkeeping for a swarm survey.
+
+    Lanes of every partition plan are tracked in the field's local frame.
+    Telemetry marks the along-track extent flown on the reporting drone's own
+    lanes; when a drone's heartbeat goes stale, its unfinished lanes are split
+    into contiguous chunks and handed to the surviving drones, whose missions
+    are rebuilt from their remaining lanes and re-uploaded in flight.
+
+    Drone ids are partition indices (drone 0 flies plan 0, and so on); only
+    drones with a plan take over lanes. A lost drone that comes back is sent
+    the lanes it still owns, so it does not fly the reassigned ones again.
+    """
+
+    def __init__(self, plans: list, field: Polygon, mappers: list = MAPPER_ADDRS,
+                 send: bool = True):
+        self.frame = frame_for_polygon(field)
+        self.router = TransitRouter(self.frame.polygon_to_local(field))
+        # a position counts towards a lane within half a lane spacing of it
+        self.tolerance = min(p['lane_spacing_m'] for p in plans) / 2
+        self.mappers = mappers
+        self.send = send
+        self.altitude = {}
+
+        a, b, owner = [], [], []
+        for plan in plans:
+            wps = np.asarray(plan['waypoints'], dtype=float)
+            e, n = self.frame.forward(wps[:, 0], wps[:, 1])
+            en = np.column_stack((e, n))
+            for s, t in plan['lanes']:
+                a.append(en[s])
+                b.append(en[t])
+                owner.append(plan['partition'])
+            self.altitude[plan['partition']] = plan['altitude_m']
+        self.a = np.array(a).reshape(-1, 2)
+        self.b = np.array(b).reshape(-1, 2)
+        d = self.b - self.a
+        self.length = np.hypot(d[:, 0], d[:, 1])
+        self.unit = d / np.maximum(self.length, 1e-9)[:, None]
+        self.owner = np.array(owner, dtype=int)
+        self.lo = np.full(len(self.a), np.inf)    # flown along-track extent per lane
+        self.hi = np.full(len(self.a), -np.inf)
+        self.done = self.length <= LANE_DONE_SLACK_M
+
+        self.last_seen = {}     # drone -> controller time of the last status
+        self.position = {}      # drone -> last (east, north)
+        self.lost = set()
+        self.reassigned = set() # lost drones whose lanes went to others
+        self.returned = set()   # of those, drones heard again, waiting for their reduced mission
+        self.events = []        # one dict per rebalance
+        self.lock = threading.Lock()
+
+    def heartbeat(self, drone: int, lat: float, lon: float, now: float = None):
+        """Record a status message and mark progress on the drone's own lanes."""
+        now = time.time() if now is None else now
+        e, n = self.frame.forward(lat, lon)
+        p = np.array([float(e), float(n)])
+        with self.lock:
+            self.last_seen[drone] = now
+            self.position[drone] = p
+            if drone in self.lost:
+                self.lost.discard(drone)
+                if drone in self.reassigned:
+                    self.reassigned.discard(drone)
+                    self.returned.add(drone)   # its mission goes out from check(), not the status path
+            idx = np.flatnonzero((self.owner == drone) & ~self.done)
+            if len(idx) == 0:
+                return
+            rel = p - self.a[idx]
+            along = np.einsum('ij,ij->i', rel, self.unit[idx])
+            cross = np.abs(rel[:, 0] * self.unit[idx, 1] - rel[:, 1] * self.unit[idx, 0])
+            on = (cross < self.tolerance) & (along > -self.tolerance) & \
+                 (along < self.length[idx] + self.tolerance)
+            hit = idx[on]
+            along = np.clip(along[on], 0.0, self.length[hit])
+            self.lo[hit] = np.minimum(self.lo[hit], along)
+            self.hi[hit] = np.maximum(self.hi[hit], along)
+            self.done[hit] |= self.length[hit] - (self.hi[hit] - self.lo[hit]) <= LANE_DONE_SLACK_M
+
+    def _remaining(self, i: int) -> tuple:
+        """
+        Unflown part of lane i as (start, end) local points. Only progress made
+        from one end counts; stray hits (e.g. crossing the lane in transit)
+        leave the whole lane to be flown.
+        """
+        head, tail = self.lo[i], self.length[i] - self.hi[i]
+        if head <= LANE_DONE_SLACK_M and tail > LANE_DONE_SLACK_M:
+            return self.a[i] + self.unit[i] * self.hi[i], self.b[i]
+        if tail <= LANE_DONE_SLACK_M and head > LANE_DONE_SLACK_M:
+            return self.a[i] + self.unit[i] * self.lo[i], self.a[i]
+        return self.a[i], self.b[i]
+
+    def _remaining_length(self, lanes) -> float:
+        return float(sum(np.hypot(*np.subtract(*self._remaining(i))) for i in lanes))
+
+    def _mission(self, drone: int) -> dict:
+        """
+        Waypoints from the drone's position over all its unfinished lanes:
+        nearest lane end first, each lane flown towards its far end.
+        """
+        todo = {int(i): self._remaining(i) for i in np.flatnonzero((self.owner == drone) & ~self.done)}
+        pts = [tuple(self.position[drone])]
+        lanes = []
+        while todo:
+            cur = np.asarray(pts[-1])
+            i, flip = min(((i, f) for i in todo for f in (False, True)),
+                          key=lambda k: np.hypot(*(todo[k[0]][k[1]] - cur)))
+            s, e = todo.pop(i)
+            if flip:
+                s, e = e, s
+            pts.extend(self.router.path(cur, s))
+            lanes.append([len(pts) - 1, len(pts)])
+            pts.append(tuple(e))
+        en = np.asarray(pts)
+        lats, lons = self.frame.inverse(en[:, 0], en[:, 1])
+        # every planned drone has its own; anything else flies at the highest planned altitude
+        alt = self.altitude.get(drone, max(self.altitude.values()))
+        return {
+            'waypoints': [(lat, lon, alt) for lat, lon in zip(lats.tolist(), lons.tolist())],
+            'lanes': lanes,
+        }
+
+    def check(self, now: float = None) -> list:
+        """
+        Detect newly lost drones and rebalance their lanes; returns the rebalance
+        events, with the survivors' new missions under 'missions'.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            stale = [d for d, t in self.last_seen.items()
+                     if d not in self.lost and now - t > HEARTBEAT_TIMEOUT_S]
+            events = []
+            for drone in stale:
+                self.lost.add(drone)
+                event = self._rebalance(drone, now)
+                if event:
+                    events.append(event)
+            back = []
+            for drone in sorted(self.returned):
+                t0 = time.perf_counter()
+                mission = self._mission(drone)
+                back.append((drone, mission, (time.perf_counter() - t0) * 1000))
+            self.returned.clear()
+        for event in events:
+            print(f"[Rebalance] drone {event['lost']} lost: {event['lanes']} lanes "
+                  f"({event['length_m']:.0f} m) -> {event['assigned']}, re-plan {event['replan_ms']:.1f} ms")
+        for drone, mission, _ in back:
+            print(f"[Rebalance] drone {drone} is back: {len(mission['lanes'])} lanes left to fly")
+        # every update goes out at once, so one unreachable mapper
+        # costs SEND_TIMEOUT in total rather than per drone
+        self._push([(drone, mission, event['replan_ms']) for event in events
+                    for drone, mission in event['missions'].items()] + back)
+        return events
+
+    def _rebalance(self, lost: int, now: float):
+        t0 = time.perf_counter()
+        orphans = [int(i) for i in np.flatnonzero((self.owner == lost) & ~self.done)]
+        # drones without a plan (or, when sending, a mapper) cannot take lanes over
+        survivors = [d for d, t in self.last_seen.items()
+                     if d not in self.lost and now - t <= HEARTBEAT_TIMEOUT_S and d in self.altitude
+                     and (not self.send or d < len(self.mappers))]
+        if not orphans or not survivors:
+            if orphans:
+                print(f"[Rebalance] drone {lost} lost with {len(orphans)} lanes left and no survivors")
+            return None
+
+        # equalise remaining work: each survivor's share tops it up towards the mean
+        load = {d: self._remaining_length(np.flatnonzero((self.owner == d) & ~self.done))
+                for d in survivors}
+        orphan_len = [self._remaining_length([i]) for i in orphans]
+        target = (sum(load.values()) + sum(orphan_len)) / len(survivors)
+        quota = {d: max(0.0, target - load[d]) for d in survivors}
+
+        # contiguous chunks in plan order, each taken by the nearest survivor left
+        assigned = {}
+        free = set(survivors)
+        k = 0
+        while k < len(orphans) and free:
+            mid = (self.a[orphans[k]] + self.b[orphans[k]]) / 2
+            d = min(free, key=lambda s: np.hypot(*(self.position[s] - mid)))
+            free.discard(d)
+            taken = 0.0
+            while k < len(orphans) and (not free or taken == 0.0 or taken + orphan_len[k] / 2 <= quota[d]):
+                self.owner[orphans[k]] = d
+                assigned[d] = assigned.get(d, 0) + 1
+                taken += orphan_len[k]
+                k += 1
+        missions = {d: self._mission(d) for d in assigned}
+        self.reassigned.add(lost)
+        event = {
+            'lost': lost,
+            'time': now,
+            'lanes': len(orphans),
+            'length_m': sum(orphan_len),
+            'assigned': assigned,
+            'replan_ms': (time.perf_counter() - t0) * 1000,
+            'missions': missions,
+        }
+        self.events.append({k: v for k, v in event.items() if k != 'missions'})
+        return event
+
+    def _push(self, updates: list):
+        """Send update_mission to each (drone, mission, replan_ms)'s mapper in parallel and wait for the acks."""
+        updates = [u for u in updates if self.send and u[0] < len(self.mappers)]
+        if not updates:
+            return
+        args = [{"waypoints": mission['waypoints'], "lanes": mission['lanes'], "replan_ms": replan_ms}
+                for _, mission, replan_ms in updates]
+        replies = dispatch([self.mappers[drone] for drone, _, _ in updates], "update_mission", args,
+                           deadline=SEND_TIMEOUT)
+        for (drone, mission, _), reply in zip(updates, replies):
+            if reply["ok"]:
+                print(f"[Rebalance] drone {drone}: {len(mission['waypoints'])} waypoints uploaded "
+                      f"in {reply['ack_ms']:.0f} ms (upload {reply['upload_ms']:.0f} ms)")
+            else:
+                print(f"[Rebalance] mission update to drone {drone} failed: {reply['error']}")
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                "lanes": int(len(self.done)),
+                "lanes_done": int(self.done.sum()),
+                "owners": {int(d): int(np.count_nonzero((self.owner == d) & ~self.done))
+                           for d in np.unique(self.owner)},
+                "lost": sorted(self.lost),
+                "rebalances": list(self.events),
+            }
+
+
+# If run directly, fly both partitions in simulation, drop drone 1 a third of the way in
+if __name__ == '__main__':
+    import io
+    from area_splitter import read_polygon_from_kml
+    from plan_service import compute_partition_plan
+    from shared_config import KML_PATH, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT, PARTITIONS
+
+    with open(KML_PATH, 'rb') as f:
+        kml_bytes = f.read()
+    field = read_polygon_from_kml(io.BytesIO(kml_bytes))
+    plans = [json.loads(compute_partition_plan(kml_bytes, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT,
+                                               PARTITIONS, i)) for i in range(PARTITIONS)]
+    reb = LaneRebalancer(plans, field, send=False)
+
+    def track(wps, speed=18.0):
+        """1 Hz positions along a waypoint list."""
+        e, n = reb.frame.forward(np.asarray(wps)[:, 0], np.asarray(wps)[:, 1])
+        en = np.column_stack((e, n))
+        seg = np.hypot(*np.diff(en, axis=0).T)
+        s = np.concatenate(([0.0], np.cumsum(seg)))
+        at = np.arange(0.0, s[-1], speed)
+        pts = np.column_stack((np.interp(at, s, en[:, 0]), np.interp(at, s, en[:, 1])))
+        lat, lon = reb.frame.inverse(pts[:, 0], pts[:, 1])
+        return list(zip(lat.tolist(), lon.tolist()))
+
+    tracks = {p['partition']: track(p['waypoints']) for p in plans}
+    drop_at = len(tracks[1]) // 3
+    t, cursor = 0.0, {d: 0 for d in tracks}
+    flying = lambda d: cursor[d] < len(tracks[d]) and not (d == 1 and t >= drop_at)
+    while any(flying(d) for d in tracks):
+        for d in tracks:
+            if flying(d):
+                reb.heartbeat(d, *tracks[d][cursor[d]], now=t)
+                cursor[d] += 1
+        if t == drop_at + 30:
+            # drone 1's link comes back once, and a status from an unplanned drone id arrives
+            reb.heartbeat(1, *tracks[1][drop_at], now=t)
+            reb.heartbeat(len(plans), *tracks[0][0], now=t)
+        for event in reb.check(now=t):
+            # survivors switch to their rebuilt missions
+            for d in event['assigned']:
+                tracks[d] = track(reb._mission(d)['waypoints'])
+                cursor[d] = 0
+        t += 1.0
+    print(reb.summary())
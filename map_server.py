@@ -1,17 +1,156 @@
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, Response, jsonify, send_from_directory, request, g
 import os
 import json
+import threading
+import time
+
+from track_simplifier import TrackStore
+from status_table import TableReader
+from tile_cache import MAX_AGE_S, TILE_HITS, TileCache
+from coverage_tracker import CoverageTracker
+from area_splitter import read_polygon_from_kml
+from dead_reckoning import extrapolate
+from metrics import REGISTRY, CONTENT_TYPE, counter, gauge, histogram
+from shared_config import KML_PATH, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT
+
+ALERTS_FILE = 'separation_alerts.json'  # written by receiver.py
+TRACK_POLL_INTERVAL = 1.0  # seconds between status table samples for the tracks
+
+# === Metrics ===
+REQUESTS = counter("map_requests_total", "HTTP requests, by endpoint and status", ("endpoint", "status"))
+REQUEST_SECONDS = histogram("map_request_seconds", "HTTP request latency", ("endpoint",))
+STATUS_READ_SECONDS = histogram("map_status_read_seconds", "Time to read the shared status table")
+TRACK_TICK_SECONDS = histogram("map_track_tick_seconds", "Time of one track/coverage update pass")
+COVERAGE_PERCENT = gauge("map_coverage_percent", "Surveyed share of the field")
+TRACKED_DRONES = gauge("map_tracked_drones", "Drones in the latest status file")
 
 app = Flask(__name__)
+tracks = TrackStore()
+# Offline map tiles (tiles.mbtiles, seeded with `python tile_cache.py prefetch`), opened read-only
+tile_cache = TileCache(read_only=True)
+try:
+    coverage = CoverageTracker(read_polygon_from_kml(KML_PATH), ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT)
+except Exception as e:
+    print(f"Coverage tracking disabled: {e}")
+    coverage = None
+
+# Latest drone statuses, read straight from the receiver's shared memory
+status_table = TableReader()
+
+def load_drone_status():
+    with STATUS_READ_SECONDS.time():
+        try:
+            return status_table.snapshot()
+        except Exception:
+            return {}
+
+def record_tracks():
+    """
+    Append every drone's position, dead-reckoned to the tick time, to its track
+    and stamp the footprint swept since its last position onto the coverage
+    grid (runs in the background). Drones only report when they drift, every
+    2 s on a straight lane, so the raw fixes alone would leave gaps.
+    """
+    last = {}   # drone -> (lat, lon) last added to its track
+    while True:
+        t0 = time.perf_counter()
+        now = time.time()
+        lats0, lons0, lats, lons = [], [], [], []
+        statuses = load_drone_status()
+        TRACKED_DRONES.set(len(statuses))
+        for drone_id, status in statuses.items():
+            try:
+                status = extrapolate(status, now)
+                lat, lon = status["gps"]["lat"], status["gps"]["lon"]
+                t = status.get("heartbeat")
+                if t is not None:
+                    t += status.get("predicted", 0.0)   # on the drone's clock, like the raw fixes
+                if tracks.add(drone_id, lat, lon, t):
+                    lat0, lon0 = last.get(drone_id, (lat, lon))
+                    last[drone_id] = (lat, lon)
+                    lats0.append(lat0)
+                    lons0.append(lon0)
+                    lats.append(lat)
+                    lons.append(lon)
+            except (KeyError, TypeError):
+                continue
+        if coverage is not None and lats:
+            coverage.sweep(lats0, lons0, lats, lons)
+            COVERAGE_PERCENT.set(coverage.percent)
+        TRACK_TICK_SECONDS.observe(time.perf_counter() - t0)
+        time.sleep(TRACK_POLL_INTERVAL)
+
+@app.before_request
+def start_timer():
+    g.t0 = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_SECONDS.observe(time.perf_counter() - g.t0, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype=None, content_type=CONTENT_TYPE)
 
 @app.route('/drones')
 def drones():
+    """Latest status per drone, positions extrapolated to now (drones send only on drift)."""
+    now = time.time()
+    return jsonify({d: extrapolate(status, now) for d, status in load_drone_status().items()})
+
+@app.route('/tracks')
+def drone_tracks():
+    """
+    Simplified per-drone tracks for the client's view.
+    Query args: zoom (int) and optional bbox=west,south,east,north.
+    """
+    zoom = request.args.get('zoom', default=15, type=int)
+    bbox = request.args.get('bbox')
+    if bbox:
+        try:
+            bbox = tuple(float(v) for v in bbox.split(','))
+            if len(bbox) != 4:
+                raise ValueError
+        except ValueError:
+            return jsonify({"error": "bbox must be west,south,east,north"}), 400
+    return jsonify(tracks.query(zoom, bbox or None))
+
+@app.route('/coverage')
+def survey_coverage():
+    """Live survey coverage: percent covered and blocks still left to fly."""
+    if coverage is None:
+        return jsonify({"error": "coverage tracking disabled"}), 503
+    return jsonify(coverage.summary())
+
+@app.route('/alerts')
+def separation_alerts():
+    """Drone pairs currently closer than the minimum separation."""
     try:
-        with open('drone_status.json', 'r') as f:
-            data = json.load(f)
+        with open(ALERTS_FILE, 'r') as f:
+            return jsonify(json.load(f))
     except Exception:
-        data = {}
-    return jsonify(data)
+        return jsonify([])
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.png')
+def map_tile(z, x, y):
+    """Raster tile from the local MBTiles store, cacheable by the browser."""
+    hit = tile_cache.get(z, x, y)
+    if hit is None:
+        TILE_HITS.inc(result="missing")
+        return Response(status=404)
+    data, etag = hit
+    if request.if_none_match.contains(etag):
+        TILE_HITS.inc(result="not_modified")
+        resp = Response(status=304)
+    else:
+        TILE_HITS.inc(result="hit")
+        resp = Response(data, mimetype='image/png')
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = f'public, max-age={MAX_AGE_S}'
+    return resp
 
 @app.route('/')
 def serve_map():
@@ -22,4 +161,5 @@ def static_proxy(path):
     return send_from_directory('.', path)
 
 if __name__ == '__main__':
+    threading.Thread(target=record_tracks, daemon=True).start()
     app.run(host='0.0.0.0', port=8080, debug=True)
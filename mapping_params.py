@@ -1,5 +1,6 @@
 import math
 from math import cos, radians
+import numpy as np
 
 # === Default Camera Parameters ===
 CAMERA_SPECS = {
@@ -50,4 +51,71 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     a = math.sin(dlat / 2)**2 + math.cos(radians(lat1)) * math.cos(radians(lat2)) * math.sin(dlon / 2)**2
     return R * 2 * math.asin(math.sqrt(a))
 
+# === Vectorized distance kernels (all inputs in degrees, results in meters) ===
+EARTH_RADIUS_M = 6371000.0
 
+def haversine_np(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Element-wise haversine distance; inputs broadcast against each other."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return EARTH_RADIUS_M * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def distances_from(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """Distance from one point to each of many points."""
+    return haversine_np(lat, lon, lats, lons)
+
+def polyline_length(lats, lons) -> float:
+    """Total length of a path given as arrays of vertex coordinates."""
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    if lats.size < 2:
+        return 0.0
+    return float(haversine_np(lats[:-1], lons[:-1], lats[1:], lons[1:]).sum())
+
+def distance_matrix(lats_a, lons_a, lats_b=None, lons_b=None) -> np.ndarray:
+    """(len(a), len(b)) matrix of distances; b defaults to a."""
+    if lats_b is None:
+        lats_b, lons_b = lats_a, lons_a
+    lats_a = np.asarray(lats_a, dtype=float)[:, None]
+    lons_a = np.asarray(lons_a, dtype=float)[:, None]
+    return haversine_np(lats_a, lons_a, np.asarray(lats_b, dtype=float)[None, :],
+                        np.asarray(lons_b, dtype=float)[None, :])
+
+
+# If run directly, benchmark the vectorized kernels against the scalar function
+if __name__ == '__main__':
+    import time
+
+    def timed(fn):
+        t0 = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - t0
+
+    rng = np.random.default_rng(0)
+    print(f"{'points':>9} {'kernel':>14} {'scalar (s)':>11} {'numpy (s)':>10} {'speedup':>8}")
+    for n in (1_000, 100_000, 1_000_000):
+        lat = -35.36 + rng.uniform(-0.05, 0.05, n)
+        lon = 149.16 + rng.uniform(-0.05, 0.05, n)
+        lat_l, lon_l = lat.tolist(), lon.tolist()
+        side = int(math.isqrt(n))
+
+        cases = {
+            'pairwise': (
+                lambda: [haversine_distance(a, b, c, d) for a, b, c, d in zip(lat_l, lon_l, lat_l[::-1], lon_l[::-1])],
+                lambda: haversine_np(lat, lon, lat[::-1], lon[::-1])),
+            'one-to-many': (
+                lambda: [haversine_distance(lat_l[0], lon_l[0], a, b) for a, b in zip(lat_l, lon_l)],
+                lambda: distances_from(lat[0], lon[0], lat, lon)),
+            'polyline': (
+                lambda: sum(haversine_distance(lat_l[i-1], lon_l[i-1], lat_l[i], lon_l[i]) for i in range(1, n)),
+                lambda: polyline_length(lat, lon)),
+            'matrix': (
+                lambda: [[haversine_distance(a, b, c, d) for c, d in zip(lat_l[:side], lon_l[:side])]
+                         for a, b in zip(lat_l[:side], lon_l[:side])],
+                lambda: distance_matrix(lat[:side], lon[:side])),
+        }
+        for name, (scalar, vector) in cases.items():
+            ref, t_scalar = timed(scalar)
+            out, t_numpy = timed(vector)
+            assert np.allclose(np.asarray(ref, dtype=float), out, rtol=1e-9, atol=1e-6)
+            print(f"{n:>9} {name:>14} {t_scalar:>11.4f} {t_numpy:>10.4f} {t_scalar / t_numpy:>7.1f}x")
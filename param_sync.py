@@ -0,0 +1,343 @@
+import json
+import math
+import os
+import threading
+import time
+
+from metrics import counter, histogram
+
+# === Parameter sync settings ===
+# All PARAM_SETs go out at once (up to MAX_IN_FLIGHT unanswered) and each is
+# resolved by the PARAM_VALUE the autopilot answers with. A set whose echo does
+# not arrive within ACK_TIMEOUT_S is sent again, RETRIES times in all.
+# Every PARAM_VALUE seen is kept in CACHE_PATH per vehicle, identified by the
+# uid in its AUTOPILOT_VERSION. A cached value is never taken as is: it is read
+# back on the current connection (PARAM_REQUEST_READ, or the PARAM_VALUE of
+# dronekit's own download), and only the parameters that differ are set.
+CACHE_PATH = 'param_cache.json'
+CACHE_MAX_AGE_S = 24 * 3600   # older cache entries are sent again rather than trusted
+ACK_TIMEOUT_S = 1.0
+RETRIES = 3
+MAX_IN_FLIGHT = 16            # keeps a 57600 baud radio link and the autopilot's queue from overflowing
+TOLERANCE = 1e-3              # PARAM_VALUE carries a float32
+IDENTITY_TIMEOUT_S = 2.0      # wait for AUTOPILOT_VERSION; without a uid the cache is not used
+
+PARAM_SETS = counter("param_set_sent_total", "PARAM_SET messages sent, by attempt", ("attempt",))
+PARAM_READS = counter("param_request_read_sent_total", "PARAM_REQUEST_READ messages sent, by attempt", ("attempt",))
+PARAM_RESULTS = counter("param_sync_results_total", "Parameters handled by a sync, by outcome", ("result",))
+SYNC_SECONDS = histogram("param_sync_seconds", "Time to bring a vehicle's parameters to the desired values")
+
+
+def _same(a, b) -> bool:
+    return a is not None and b is not None and math.isclose(float(a), float(b), abs_tol=TOLERANCE)
+
+
+def vehicle_id(uid, uid2=None):
+    """Cache key from AUTOPILOT_VERSION's uid2 (18 bytes) or uid; None if the board reports neither."""
+    uid2 = bytes(uid2 or b'')
+    if any(uid2):
+        return "uid2:" + uid2.hex()
+    return f"uid:{uid:016x}" if uid else None
+
+
+class ParamCache:
+    """Last known parameter values of every vehicle, keyed by vehicle_id()."""
+
+    def __init__(self, path: str = CACHE_PATH, max_age_s: float = CACHE_MAX_AGE_S):
+        self.path = path
+        self.max_age_s = max_age_s
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.vehicles = json.load(f)
+        except (OSError, ValueError):
+            self.vehicles = {}
+
+    def known(self, key: str) -> dict:
+        """name -> value for a vehicle, empty if never seen or too old to trust."""
+        with self.lock:
+            entry = self.vehicles.get(key)
+            if not entry or time.time() - entry["updated"] > self.max_age_s:
+                return {}
+            return dict(entry["params"])
+
+    def update(self, key: str, values: dict):
+        with self.lock:
+            entry = self.vehicles.setdefault(key, {"updated": 0.0, "params": {}})
+            entry["params"].update(values)
+            entry["updated"] = time.time()
+
+    def forget(self, key: str, names):
+        with self.lock:
+            entry = self.vehicles.get(key)
+            for name in names if entry else ():
+                entry["params"].pop(name, None)
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.vehicles, indent=2)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+
+class ParamSync:
+    """
+    Brings one vehicle's parameters to the desired values over one connection.
+    `send(name, value)` emits a PARAM_SET, `request(name)` a PARAM_REQUEST_READ
+    and `identify()` asks for AUTOPILOT_VERSION; the link's receive side passes
+    every PARAM_VALUE to on_param_value() and AUTOPILOT_VERSION to
+    on_autopilot_version(). sync() returns name -> value echoed on this
+    connection, None for parameters that never answered (not supported by the
+    firmware).
+    """
+
+    def __init__(self, send, request, identify, cache: ParamCache = None, timeout_s: float = ACK_TIMEOUT_S,
+                 retries: int = RETRIES, max_in_flight: int = MAX_IN_FLIGHT,
+                 identity_timeout_s: float = IDENTITY_TIMEOUT_S):
+        self.send = send
+        self.request = request
+        self.identify = identify
+        self.cache = cache if cache is not None else ParamCache()
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.max_in_flight = max_in_flight
+        self.identity_timeout_s = identity_timeout_s
+        self.cond = threading.Condition()
+        self.key = None
+        self.identified = False
+        self.values = {}      # latest PARAM_VALUE per name on this connection
+        self.wanted = set()   # names a running sync waits for
+
+    def on_param_value(self, name, value):
+        if isinstance(name, bytes):
+            name = name.decode('ascii', 'replace')
+        name = name.rstrip('\x00')
+        with self.cond:
+            self.values[name] = float(value)
+            if name in self.wanted:
+                self.cond.notify()
+
+    def on_autopilot_version(self, uid, uid2=None):
+        with self.cond:
+            self.key = vehicle_id(uid, uid2)
+            self.identified = True
+            self.cond.notify()
+
+    def _vehicle(self):
+        with self.cond:
+            if not self.identified:
+                self.identify()
+                self.cond.wait_for(lambda: self.identified, self.identity_timeout_s)
+            return self.key
+
+    def sync(self, desired: dict) -> dict:
+        t0 = time.perf_counter()
+        key = self._vehicle()
+        known = self.cache.known(key) if key else {}
+        result = {}
+        todo = []             # (name, "read" or "set") waiting to be sent
+        attempts = {}         # name -> sends of its current kind so far
+        deadline = {}         # name -> (kind, when the current send times out)
+        with self.cond:
+            for p, v in desired.items():
+                if p in self.values:
+                    todo.append((p, "set"))          # already reported here; set only if it differs
+                elif p in known and (known[p] is None or _same(known[p], v)):
+                    todo.insert(0, (p, "read"))      # cached as wanted (or unsupported): read it back first
+                else:
+                    todo.append((p, "set"))
+            self.wanted = set(desired)
+            try:
+                while todo or deadline:
+                    now = time.monotonic()
+                    for i, (p, kind) in reversed(list(enumerate(todo))):
+                        # nothing to send for a value this connection already reports as wanted
+                        if _same(self.values.get(p), desired[p]):
+                            del todo[i]
+                            result[p] = self.values[p]
+                            PARAM_RESULTS.inc(result="unchanged")
+                        elif kind == "read" and p in self.values:
+                            todo[i] = (p, "set")
+                    for p, (kind, _) in list(deadline.items()):
+                        if _same(self.values.get(p), desired[p]):
+                            del deadline[p]
+                            result[p] = self.values[p]
+                            PARAM_RESULTS.inc(result="set" if kind == "set" else "unchanged")
+                        elif kind == "read" and p in self.values:
+                            del deadline[p]                  # read back, but not what the cache said
+                            attempts[p] = 0
+                            todo.insert(0, (p, "set"))
+                    for p, (kind, t) in [(p, d) for p, d in deadline.items() if d[1] <= now]:
+                        del deadline[p]
+                        # a parameter cached as unsupported gets one read, not a full retry round
+                        limit = 1 if kind == "read" and known.get(p) is None else self.retries
+                        if attempts[p] < limit:
+                            todo.insert(0, (p, kind))
+                        else:
+                            # a differing echo means the autopilot kept or clamped its value
+                            result[p] = self.values.get(p)
+                            PARAM_RESULTS.inc(result="rejected" if p in self.values else "no_ack")
+                    while todo and len(deadline) < self.max_in_flight:
+                        p, kind = todo.pop(0)
+                        attempts[p] = attempts.get(p, 0) + 1
+                        deadline[p] = (kind, now + self.timeout_s)
+                        if kind == "read":
+                            self.request(p)
+                            PARAM_READS.inc(attempt=attempts[p])
+                        else:
+                            self.send(p, float(desired[p]))
+                            PARAM_SETS.inc(attempt=attempts[p])
+                    if deadline:
+                        self.cond.wait(max(0.0, min(t for _, t in deadline.values()) - time.monotonic()))
+            finally:
+                self.wanted = set()
+            seen = dict(self.values)
+        if key:
+            missing = [p for p in attempts if result[p] is None]
+            self.cache.update(key, seen)
+            if len(missing) < len(attempts):
+                self.cache.update(key, {p: None for p in missing})
+            else:
+                self.cache.forget(key, missing)     # no answer at all: the link, not the firmware
+            self.cache.save()
+        SYNC_SECONDS.observe(time.perf_counter() - t0)
+        return result
+
+
+def _request_version(master):
+    from pymavlink import mavutil
+    master.mav.command_long_send(master.target_system, master.target_component,
+                                 mavutil.mavlink.MAV_CMD_REQUEST_AUTOPILOT_CAPABILITIES, 0, 1, 0, 0, 0, 0, 0, 0)
+
+
+def _uid2(m):
+    return getattr(m, 'uid2', None)   # MAVLink 2 extension field
+
+
+def for_dronekit(vehicle, cache: ParamCache = None) -> ParamSync:
+    """ParamSync over a dronekit Vehicle's MAVLink connection."""
+    master = vehicle._master
+    sync = ParamSync(master.param_set_send, master.param_fetch_one, lambda: _request_version(master), cache)
+    vehicle.add_message_listener('PARAM_VALUE', lambda _v, _name, m: sync.on_param_value(m.param_id, m.param_value))
+    vehicle.add_message_listener('AUTOPILOT_VERSION', lambda _v, _name, m: sync.on_autopilot_version(m.uid, _uid2(m)))
+    return sync
+
+
+def for_mavlink(master, cache: ParamCache = None) -> ParamSync:
+    """ParamSync over a bare pymavlink connection; a daemon thread reads its replies."""
+    sync = ParamSync(master.param_set_send, master.param_fetch_one, lambda: _request_version(master), cache)
+
+    def read():
+        while True:
+            m = master.recv_match(type=['PARAM_VALUE', 'AUTOPILOT_VERSION'], blocking=True, timeout=1.0)
+            if m is None:
+                continue
+            if m.get_type() == 'PARAM_VALUE':
+                sync.on_param_value(m.param_id, m.param_value)
+            else:
+                sync.on_autopilot_version(m.uid, _uid2(m))
+
+    threading.Thread(target=read, daemon=True).start()
+    return sync
+
+
+# If run directly, sync the survey parameters against a stand-in autopilot over
+# UDP (pymavlink on both ends, with a radio-like delay and loss) and compare with
+# setting them one blocking round trip at a time, then reading each back
+if __name__ == '__main__':
+    import heapq
+    import random
+    import tempfile
+    from pymavlink import mavutil
+
+    PORT = 14590
+    ONE_WAY_S = 0.06      # SiK radio at 57600 baud, one direction
+    LOSS = 0.05           # share of messages dropped, each way
+    PARAMS = {'AIRSPEED_MIN': 1700, 'AIRSPEED_CRUISE': 1800, 'AIRSPEED_MAX': 2000, 'SCALING_SPEED': 1800,
+              'WPNAV_SPEED': 1800, 'ROLL_LIMIT_DEG': 50, 'PTCH_LIM_MAX_DEG': 25, 'PTCH_LIM_MIN_DEG': -10,
+              'TECS_SPEEDWEIGHT': 2.0, 'TECS_CLMB_MAX': 5.0, 'TECS_SINK_MAX': 5.0, 'TECS_TIME_CONST': 5.0,
+              'WP_RADIUS': 60, 'WP_LOITER_RAD': 80, 'Q_WP_SPEED': 500, 'Q_WP_SPEED_UP': 250,
+              'Q_WP_SPEED_DN': 150, 'Q_ANGLE_MAX': 3000, 'RTL_ALTITUDE': 60, 'Q_RTL_ALT': 30}
+    rng = random.Random(0)
+    eeprom = {}           # uid -> parameters, kept across restarts of that vehicle
+
+    def autopilot(uid: int, stop: threading.Event):
+        # answers PARAM_SET / PARAM_REQUEST_READ with PARAM_VALUE and the capabilities
+        # request with AUTOPILOT_VERSION, after ONE_WAY_S each way
+        link = mavutil.mavlink_connection(f'udpin:127.0.0.1:{PORT}', source_system=1)
+        # every parameter but one the firmware lacks, all 0 on a new vehicle
+        params = eeprom.setdefault(uid, {name: 0.0 for name in PARAMS if name != 'Q_ANGLE_MAX'})
+        outbox = []
+        while not stop.is_set():
+            m = link.recv_match(type=['PARAM_SET', 'PARAM_REQUEST_READ', 'COMMAND_LONG'], blocking=True,
+                                timeout=0.005)
+            now = time.monotonic()
+            if m is not None and rng.random() >= LOSS:
+                if m.get_type() == 'COMMAND_LONG':
+                    heapq.heappush(outbox, (now + 2 * ONE_WAY_S, '', None))
+                elif m.param_id in params:
+                    if m.get_type() == 'PARAM_SET':
+                        params[m.param_id] = m.param_value
+                    heapq.heappush(outbox, (now + 2 * ONE_WAY_S, m.param_id, params[m.param_id]))
+            while outbox and outbox[0][0] <= now:
+                _, name, value = heapq.heappop(outbox)
+                if rng.random() < LOSS:
+                    continue
+                if not name:
+                    link.mav.autopilot_version_send(0, 0, 0, 0, 0, b'\0' * 8, b'\0' * 8, b'\0' * 8, 0, 0, uid)
+                else:
+                    link.mav.param_value_send(name.encode(), value, mavutil.mavlink.MAV_PARAM_TYPE_REAL32,
+                                              len(params), list(params).index(name))
+        link.close()
+
+    def connection():
+        master = mavutil.mavlink_connection(f'udpout:127.0.0.1:{PORT}', source_system=255)
+        master.target_system, master.target_component = 1, 1
+        return master
+
+    def blocking(master):
+        # what connect_and_configure did: each set waits for its echo (dronekit retries
+        # after 1 s), then verify_params reads every value back the same way
+        def round_trip(send, name):
+            for _ in range(RETRIES):
+                send()
+                deadline = time.monotonic() + ACK_TIMEOUT_S
+                while time.monotonic() < deadline:
+                    m = master.recv_match(type='PARAM_VALUE', blocking=True,
+                                          timeout=max(0.0, deadline - time.monotonic()))
+                    if m is not None and m.param_id == name:
+                        return m.param_value
+            return None
+        for name, value in PARAMS.items():
+            round_trip(lambda: master.param_set_send(name, float(value)), name)
+        for name in PARAMS:
+            round_trip(lambda: master.param_fetch_one(name), name)
+
+    print(f"{len(PARAMS)} parameters, {ONE_WAY_S * 1000:.0f} ms each way, {LOSS:.0%} loss each way")
+    stop = threading.Event()
+    threading.Thread(target=autopilot, args=(0x1234, stop), daemon=True).start()
+    time.sleep(0.5)
+    t0 = time.perf_counter()
+    blocking(connection())
+    print(f"  {'blocking set + read back:':<38} {time.perf_counter() - t0:6.2f} s")
+    stop.set()
+    time.sleep(0.2)
+
+    cache = ParamCache(os.path.join(tempfile.mkdtemp(), 'params.json'))
+    # a fresh vehicle, a reconnect to it, then another airframe with the same system id
+    for uid, label in ((0xA1, "concurrent sync, new vehicle"), (0xA1, "reconnect, cached (read back)"),
+                       (0xB2, "other airframe, same sysid")):
+        stop = threading.Event()
+        threading.Thread(target=autopilot, args=(uid, stop), daemon=True).start()
+        time.sleep(0.2)
+        sets, reads = sum(PARAM_SETS.values.values()), sum(PARAM_READS.values.values())
+        t0 = time.perf_counter()
+        got = for_mavlink(connection(), cache).sync(PARAMS)
+        ok = sum(_same(got[p], v) for p, v in PARAMS.items())
+        print(f"  {label + ':':<38} {time.perf_counter() - t0:6.2f} s  {ok} confirmed, "
+              f"{sum(PARAM_SETS.values.values()) - sets:.0f} sets, {sum(PARAM_READS.values.values()) - reads:.0f} reads, "
+              f"missing {sorted(p for p, v in got.items() if v is None)}")
+        stop.set()
+        time.sleep(0.2)
@@ -0,0 +1,217 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import socket
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+
+import tracing
+from area_splitter import read_polygon_from_kml
+from framing import encode, iter_frames
+from kml_reader import iter_fields
+from survey_planner import split_into_strips, plan_lawnmower
+from shared_config import (KML_PATH, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT, PARTITIONS,
+                           CONTROLLER_IP, CONTROLLER_PORT)
+
+PLAN_DIR = 'plans'       # content-addressed plan cache: plans/<key>/<partition>.json
+PLAN_TIMEOUT = 30.0      # seconds a drone waits for the controller's plan
+PLANNER_VERSION = 4      # bump whenever survey_planner output changes, so old cache entries are not reused
+
+
+def plan_key(kml_bytes: bytes, altitude_m: float, overlap_pct: float, sidelap_pct: float,
+             partitions: int) -> str:
+    """Cache key of a swarm plan: hash of the KML contents and every planning parameter."""
+    params = [PLANNER_VERSION, hashlib.sha256(kml_bytes).hexdigest(), float(altitude_m),
+              float(overlap_pct), float(sidelap_pct), int(partitions)]
+    return hashlib.sha256(json.dumps(params).encode()).hexdigest()
+
+
+def compute_partition_plan(kml_bytes: bytes, altitude_m: float, overlap_pct: float,
+                           sidelap_pct: float, partitions: int, index: int) -> bytes:
+    """Plan one drone's partition of the field; returns the plan as compact JSON bytes."""
+    with tracing.span("read_kml"):
+        poly = read_polygon_from_kml(io.BytesIO(kml_bytes))
+    with tracing.span("split"):
+        part = split_into_strips(poly, partitions)[index]
+    with tracing.span("plan_lawnmower"):
+        plan = plan_lawnmower(part, altitude_m, overlap_pct, sidelap_pct)
+    triggers = plan['triggers']
+    doc = {
+        'key': plan_key(kml_bytes, altitude_m, overlap_pct, sidelap_pct, partitions),
+        'partition': index,
+        'partitions': partitions,
+        'altitude_m': altitude_m,
+        'waypoints': plan['waypoints'],
+        # waypoint indices where each lane starts and ends
+        'lanes': [[int(s), int(e)] for s, e in zip(triggers.start_wp, triggers.end_wp)],
+        'lane_spacing_m': plan['lane_spacing_m'],
+        'photo_spacing_m': triggers.spacing_m,
+        'images': len(triggers),
+        'distance_m': plan['distance_m'],
+        'sweep_angle_deg': plan['sweep_angle_deg'],
+    }
+    return json.dumps(doc, separators=(',', ':')).encode()
+
+
+def compute_field_plan(name: str, poly, altitude_m: float, overlap_pct: float,
+                       sidelap_pct: float) -> bytes:
+    """Plan one whole field of a multi-field KML; returns the plan as compact JSON bytes."""
+    plan = plan_lawnmower(poly, altitude_m, overlap_pct, sidelap_pct)
+    triggers = plan['triggers']
+    doc = {
+        'field': name,
+        'altitude_m': altitude_m,
+        'waypoints': plan['waypoints'],
+        'lanes': [[int(s), int(e)] for s, e in zip(triggers.start_wp, triggers.end_wp)],
+        'lane_spacing_m': plan['lane_spacing_m'],
+        'photo_spacing_m': triggers.spacing_m,
+        'images': len(triggers),
+        'distance_m': plan['distance_m'],
+        'sweep_angle_deg': plan['sweep_angle_deg'],
+    }
+    return json.dumps(doc, separators=(',', ':')).encode()
+
+
+def plan_fields(kml_source, altitude_m: float = ALTITUDE_M, overlap_pct: float = OVERLAP_PCT,
+                sidelap_pct: float = SIDELAP_PCT, max_workers: int = None):
+    """
+    Plan every field of a KML/KMZ in a process pool; yields (name, plan bytes)
+    as plans finish. Fields are read while earlier ones are being planned, and
+    at most two per worker are in flight, so memory stays bounded for any
+    number of fields.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        pending = {}
+        for name, poly in iter_fields(kml_source):
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield pending.pop(fut), fut.result()
+            pending[pool.submit(compute_field_plan, name, poly, altitude_m, overlap_pct, sidelap_pct)] = name
+        for fut in list(pending):
+            yield pending.pop(fut), fut.result()
+
+
+class PlanService:
+    """
+    Controller-side plan cache. Plans for every partition are computed in a
+    process pool as soon as they are requested and stored on disk under their
+    content key, so drones only have to fetch them.
+    """
+
+    def __init__(self, plan_dir: str = PLAN_DIR, max_workers: int = None):
+        self.plan_dir = plan_dir
+        self.max_workers = max_workers
+        self.pool = None
+        self.pending = {}  # (key, partition) -> Future
+        self.lock = threading.Lock()
+
+    def _path(self, key: str, index: int) -> str:
+        return os.path.join(self.plan_dir, key, f"{index}.json")
+
+    def precompute(self, kml_path: str = KML_PATH, altitude_m: float = ALTITUDE_M,
+                   overlap_pct: float = OVERLAP_PCT, sidelap_pct: float = SIDELAP_PCT,
+                   partitions: int = PARTITIONS) -> str:
+        """Queue every partition that is not cached yet; returns the plan key."""
+        with open(kml_path, 'rb') as f:
+            kml_bytes = f.read()
+        key = plan_key(kml_bytes, altitude_m, overlap_pct, sidelap_pct, partitions)
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+            for index in range(partitions):
+                if (key, index) in self.pending or os.path.exists(self._path(key, index)):
+                    continue
+                fut = self.pool.submit(compute_partition_plan, kml_bytes, altitude_m,
+                                       overlap_pct, sidelap_pct, partitions, index)
+                self.pending[(key, index)] = fut
+                fut.add_done_callback(partial(self._store, key, index))
+        return key
+
+    def _store(self, key: str, index: int, fut):
+        try:
+            blob = fut.result()
+            path = self._path(key, index)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp, path)
+            print(f"Plan {key[:12]}/{index} ready ({len(blob)} bytes)")
+        except Exception as e:
+            print(f"Plan {key[:12]}/{index} failed: {e}")
+        finally:
+            with self.lock:
+                self.pending.pop((key, index), None)
+
+    def _read(self, key: str, index: int):
+        try:
+            with open(self._path(key, index), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get(self, key: str, index: int, timeout: float = PLAN_TIMEOUT):
+        """Plan bytes for (key, partition), waiting for an in-flight computation; None if unknown."""
+        blob = self._read(key, index)
+        if blob is not None:
+            return blob
+        with self.lock:
+            fut = self.pending.get((key, index))
+        if fut is not None:
+            return fut.result(timeout=timeout)
+        return self._read(key, index)
+
+    def handle_request(self, msg: dict) -> dict:
+        """Reply to a drone's {"command": "get_plan", "key": ..., "partition": ...} request."""
+        try:
+            blob = self.get(msg["key"], int(msg["partition"]))
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+        if blob is None:
+            return {"ok": False, "error": "unknown plan"}
+        return {"ok": True, "sha256": hashlib.sha256(blob).hexdigest(), "plan": blob.decode()}
+
+
+def fetch_plan(index: int, kml_path: str = KML_PATH, altitude_m: float = ALTITUDE_M,
+               overlap_pct: float = OVERLAP_PCT, sidelap_pct: float = SIDELAP_PCT,
+               partitions: int = PARTITIONS, host: str = CONTROLLER_IP,
+               port: int = CONTROLLER_PORT, timeout: float = PLAN_TIMEOUT) -> dict:
+    """Fetch a precomputed plan from the controller and verify its hash and key."""
+    with open(kml_path, 'rb') as f:
+        key = plan_key(f.read(), altitude_m, overlap_pct, sidelap_pct, partitions)
+    with socket.create_connection((host, port), timeout=timeout) as s:
+        s.sendall(encode(json.dumps({"command": "get_plan", "key": key, "partition": index}).encode()))
+        s.shutdown(socket.SHUT_WR)
+        reply = json.loads(next(iter_frames(s), b'{}'))
+    if not reply.get("ok"):
+        raise RuntimeError(reply.get("error", "plan request failed"))
+    blob = reply["plan"].encode()
+    if hashlib.sha256(blob).hexdigest() != reply["sha256"]:
+        raise RuntimeError("plan hash mismatch")
+    plan = json.loads(blob)
+    if plan["key"] != key or plan["partition"] != index:
+        raise RuntimeError("controller returned a different plan")
+    return plan
+
+
+def load_plan(index: int, **kwargs) -> dict:
+    """Fetch this drone's plan from the controller, planning locally if that fails."""
+    try:
+        with tracing.span("fetch_plan", partition=index):
+            return fetch_plan(index, **kwargs)
+    except Exception as e:
+        print(f"Plan fetch failed ({e}); planning locally")
+    kml_path = kwargs.get('kml_path', KML_PATH)
+    with open(kml_path, 'rb') as f:
+        kml_bytes = f.read()
+    blob = compute_partition_plan(kml_bytes, kwargs.get('altitude_m', ALTITUDE_M),
+                                  kwargs.get('overlap_pct', OVERLAP_PCT),
+                                  kwargs.get('sidelap_pct', SIDELAP_PCT),
+                                  kwargs.get('partitions', PARTITIONS), index)
+    return json.loads(blob)
@@ -2,7 +2,7 @@ import random
 import time
 import threading
 from shapely.geometry import Polygon, Point
-from xml.etree import ElementTree as ET
+from area_splitter import read_polygon_from_kml
 
 KML_PATH = 'kml_files/30ha.kml'
 
@@ -13,12 +13,8 @@ class RandomTargetGenerator:
         self.lock = threading.Lock()  # For thread safety
 
     def _read_polygon(self) -> Polygon:
-        tree = ET.parse(self.kml_path)
-        coord_text = tree.find('.//{*}coordinates').text.strip()
-        coords = [tuple(map(float, p.split(',')[:2])) for p in coord_text.split()]
-        if not coords:
-            raise RuntimeError("KML contains no coordinates")
-        return Polygon(coords)
+        # holes are no-fly areas, so targets are never placed inside them
+        return read_polygon_from_kml(self.kml_path)
 
     def _random_point_within(self) -> Point:
         minx, miny, maxx, maxy = self.polygon.bounds
@@ -1,88 +1,313 @@
 import socket
 import json
+import logging
 import threading
 import os
+import time
 from typing import Any
+from area_splitter import read_polygon_from_kml
+from async_log import fields, setup as setup_logging
+from framing import encode, iter_frames
+from geo_projection import frame_for_polygon
+from geofence import Geofence, GeofenceMonitor, TICK_S as GEOFENCE_TICK_S
+from lane_rebalancer import LaneRebalancer, MONITOR_INTERVAL
+from metrics import counter, gauge, histogram, start_http_server
+from plan_service import PlanService
+from random_target_generator import RandomTargetGenerator
+from separation_monitor import SeparationMonitor, TICK_S as SEPARATION_TICK_S
+from shared_config import KML_PATH, PARTITIONS, DISPATCH_TARGETS
+from state_sync import StateStore
+from status_table import STATUS_POLL_S, StatusTable, listen_reuseport, new_locks, start_workers
+from survey_planner import split_into_strips
+from target_dispatcher import TargetDispatcher
+from telemetry_db import TelemetryDB
 
 RECEIVER_IP = "0.0.0.0"  # Listen on all interfaces
 RECEIVER_PORT = 6000     # Must match the port used by the drone signal sender
+CONTROL_PORT = 6001      # Local port the ingest workers relay non-status messages to
+RECEIVER_WORKERS = os.cpu_count() or 1  # processes accepting drone connections on RECEIVER_PORT
 PEERS_FILE = "peers.json"  # File to store all known drone IPs and ports
+ALERTS_FILE = "separation_alerts.json"  # Active separation conflicts, read by map_server.py
+METRICS_PORT = 9100      # Prometheus scrape endpoint: http://<controller>:9100/metrics
+MAX_MESSAGE = 1024 * 1024  # largest message accepted from a drone
+SEND_TIMEOUT = 2.0       # connect + send to one drone; an unreachable one must not stall the broadcasts
+# Status fields left out of the shared "drones" section: they change with every message,
+# so sharing them would send every repeat of an unchanged status to every peer
+UNSHARED_FIELDS = ("heartbeat", "received", "state_epoch", "state_version")
 
+# Per-message logging goes through the queued, rate-limited pipeline (async_log.py),
+# set up by start_server()
+log = logging.getLogger("receiver")
+
+# === Metrics ===
+MESSAGES = counter("receiver_messages_total", "Messages received, by kind", ("kind",))
+BYTES_IN = counter("receiver_bytes_received_total", "Bytes received from drones")
+BYTES_OUT = counter("receiver_bytes_sent_total", "Bytes sent to peers")
+SEND_FAILURES = counter("receiver_send_failures_total", "Failed sends to peers", ("peer",))
+HANDLE_SECONDS = histogram("receiver_handle_seconds", "Time to handle one connection", ("kind",))
+DECODE_SECONDS = histogram("receiver_json_decode_seconds", "JSON decode time of incoming messages")
+ENCODE_SECONDS = histogram("receiver_json_encode_seconds", "JSON encode time of outgoing payloads")
+SEND_SECONDS = histogram("receiver_send_seconds", "Connect + send latency to one peer")
+FANOUT_SECONDS = histogram("receiver_fanout_seconds", "Time to push peers and status to every peer")
+STATUS_POLL_SECONDS = histogram("receiver_status_poll_seconds", "Time to take in new records from the status table")
+PEERS = gauge("receiver_peers", "Registered peers")
+DRONES = gauge("receiver_drones", "Drones with a known status")
+
+# Controller services, created by create_services(). Importing this module must not start
+# anything: the ingest and plan-pool worker processes re-import it under spawn.
+# Mission plans are precomputed here as soon as drones register
+plan_service = None
+# Lane progress / dropout handling, set up once the plans are ready
+rebalancer = None
+# Targets are generated once here and assigned to the best drone
+dispatcher = None
+# Missions, plans and every status message, for post-flight queries (swarm.db)
+telemetry = None
+# Every fix is checked against the field, its no-fly holes and the drone's own strip once per tick
+geofence = None
+# Drone pairs flying too close; alerts go to the drones (state sync) and the map (ALERTS_FILE)
+separation = None
 
 # Store latest status for each drone
 peers: list[dict[str, Any]] = []
+peers_lock = threading.Lock()   # registrations append while broadcasts iterate
 drone_status = {}  # {drone_id: status_dict}
-if os.path.exists(PEERS_FILE):
-    with open(PEERS_FILE, "r") as f:
-        try:
-            peers = json.load(f)
-        except Exception:
-            peers = []
 
-def save_drone_status():
-    with open("drone_status.json", "w") as f:
-        json.dump(drone_status, f, indent=2)
+# Versioned copy of peers and statuses; each peer is sent only what changed since its last update
+state = StateStore()
+
+def create_services():
+    global plan_service, dispatcher, telemetry, geofence, separation, peers
+    plan_service = PlanService()
+    dispatcher = TargetDispatcher(read_polygon_from_kml(KML_PATH)) if DISPATCH_TARGETS else None
+    telemetry = TelemetryDB()
+    field = read_polygon_from_kml(KML_PATH)
+    geofence = GeofenceMonitor(Geofence(field, split_into_strips(field, PARTITIONS)))
+    separation = SeparationMonitor(frame_for_polygon(field))
+    if os.path.exists(PEERS_FILE):
+        with open(PEERS_FILE, "r") as f:
+            try:
+                peers = json.load(f)
+            except Exception:
+                peers = []
+    PEERS.set(len(peers))
+    for p in peers:
+        state.put("peers", f"{p['id']}@{p['ip']}", p)
 
 def save_peers():
+    with peers_lock:
+        snapshot = list(peers)
     with open(PEERS_FILE, "w") as f:
-        json.dump(peers, f, indent=2)
+        json.dump(snapshot, f, indent=2)
+
+def send_to_peer(peer: dict, data: bytes, timeout: float = SEND_TIMEOUT):
+    t0 = time.perf_counter()
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.settimeout(timeout)
+        s.connect((peer["ip"], 5000))  # 5000 is the receiver port on the drone
+        s.sendall(data)
+        s.close()
+        SEND_SECONDS.observe(time.perf_counter() - t0)
+        BYTES_OUT.inc(len(data))
+        return True
+    except Exception as e:
+        SEND_FAILURES.inc(peer=peer.get("ip", "unknown"))
+        log.warning("Failed to send", extra=fields(peer=peer.get('ip', 'unknown'), error=e))
+        return False
 
 def broadcast_to_peers():
-    # Send both peers list and all drone statuses to each drone
-    for peer in peers:
-        try:
-            print(f"Sending peers and status to {peer['ip']}...")
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect((peer["ip"], 5000))  # 5000 is the receiver port on the drone
-            # Send a dict with both peer list and all drone statuses
-            payload = {
-                "peers": peers,
-                "drones": drone_status
-            }
-            s.sendall(json.dumps(payload).encode())
-            s.close()
-        except Exception as e:
-            print(f"Failed to send peers/status to {peer['ip']}: {e}")
+    # Send each drone the peers and statuses changed since its last update;
+    # peers at the same version get the same bytes, encoded once. Several threads
+    # broadcast (connections, status table, separation), each over its own snapshot
+    with peers_lock:
+        targets = list(peers)
+    with FANOUT_SECONDS.time():
+        encoded = {}
+        for peer in targets:
+            msg = state.message_for(str(peer["id"]))
+            if msg is None:
+                continue
+            data = encoded.get((msg["base"], msg["version"]))
+            if data is None:
+                with ENCODE_SECONDS.time():
+                    data = encoded[(msg["base"], msg["version"])] = encode(json.dumps({"sync": msg}).encode())
+            log.debug("Sending peers and status", extra=fields(peer=peer['ip'], base=msg["base"], full=msg["full"]))
+            state.sent(str(peer["id"]), msg, send_to_peer(peer, data))
 
 def handle_connection(conn: socket.socket, addr: tuple[str, int]):
-    data = conn.recv(4096)
-    if data:
+    # A connection carries one or more newline-framed messages (see framing.py)
+    try:
+        for data in iter_frames(conn, max_frame=MAX_MESSAGE):
+            t0 = time.perf_counter()
+            kind = _handle_message(conn, data)
+            MESSAGES.inc(kind=kind)
+            HANDLE_SECONDS.observe(time.perf_counter() - t0, kind=kind)
+    except Exception as e:
+        MESSAGES.inc(kind="invalid")
+        log.warning("Connection dropped", extra=fields(peer=addr[0], error=e))
+    finally:
+        conn.close()
+
+def _handle_message(conn: socket.socket, data: bytes) -> str:
+    """Handle one message; returns its kind for the metrics."""
+    kind = "empty"
+    if data.strip():
+        BYTES_IN.inc(len(data))
         try:
-            msg = json.loads(data.decode())
-            print(f"Received signal from drone: {msg}")
+            with DECODE_SECONDS.time():
+                msg = json.loads(data)
+            log.info("Received signal", extra=fields(msg=msg))
+            kind = "other"
+            # Plan request: reply on the same connection, nothing to broadcast
+            if isinstance(msg, dict) and msg.get("command") == "get_plan":
+                conn.sendall(encode(json.dumps(plan_service.handle_request(msg)).encode()))
+                return "get_plan"
+            # Target completion report from a drone's executor
+            if isinstance(msg, dict) and msg.get("command") == "target_done":
+                if dispatcher is not None:
+                    dispatcher.complete(int(msg["drone"]), int(msg["id"]))
+                return "target_done"
             # Registration message
             if isinstance(msg, dict) and "ip" in msg:
-                if not any(p["id"] == msg["id"] and p["ip"] == msg["ip"] for p in peers):
-                    peers.append(msg)
+                kind = "register"
+                with peers_lock:
+                    new = not any(p["id"] == msg["id"] and p["ip"] == msg["ip"] for p in peers)
+                    if new:
+                        peers.append(msg)
+                        PEERS.set(len(peers))
+                if new:
                     save_peers()
-                    print(f"Broadcasting peers list: {peers}")
-                    # Immediately broadcast updated peers list to all drones
-                    for peer in peers:
-                        try:
-                            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                            s.settimeout(2)
-                            s.connect((peer["ip"], 5000))
-                            s.sendall(json.dumps(peers).encode())
-                            s.close()
-                        except Exception as e:
-                            print(f"Failed to send updated peers to {peer['ip']}: {e}")
-            # Status message (must have id, gps, baro, velocity, heartbeat)
+                    state.put("peers", f"{msg['id']}@{msg['ip']}", msg)
+                    plan_service.precompute()
+                    log.info("Peer registered", extra=fields(peers=len(peers)))
+            # Status message (must have id, gps, baro, velocity, heartbeat); normally these
+            # go to the status table in the ingest workers, only ids without a slot get here
             if isinstance(msg, dict) and "gps" in msg and "id" in msg:
-                drone_id = str(msg["id"])
-                drone_status[drone_id] = msg
-                save_drone_status()
+                kind = "status"
+                _handle_status(msg)
             # Always broadcast latest status to all peers after any update
             broadcast_to_peers()
         except Exception as e:
-            print(f"Invalid data received: {e}")
-    conn.close()
+            kind = "invalid"
+            log.warning("Invalid data received", extra=fields(error=e))
+    return kind
+
+def _handle_status(msg: dict):
+    drone_id = str(msg["id"])
+    drone_status[drone_id] = msg
+    DRONES.set(len(drone_status))
+    state.put("drones", drone_id, {k: v for k, v in msg.items() if k not in UNSHARED_FIELDS})
+    telemetry.record(msg)
+    state.ack(drone_id, msg.get("state_epoch"), msg.get("state_version"))
+    if msg["gps"].get("lat") is not None:
+        geofence.update(int(msg["id"]), msg["gps"]["lat"], msg["gps"]["lon"])
+        separation.update(int(msg["id"]), msg["gps"]["lat"], msg["gps"]["lon"], msg.get("baro"),
+                          velocity=msg.get("velocity"))
+        if rebalancer is not None:
+            rebalancer.heartbeat(int(msg["id"]), msg["gps"]["lat"], msg["gps"]["lon"])
+        if dispatcher is not None:
+            dispatcher.update_position(int(msg["id"]), msg["gps"]["lat"], msg["gps"]["lon"])
+
+def follow_status_table(table: StatusTable):
+    """Feed statuses written by the ingest workers to the controller's services."""
+    seen = {}
+    while True:
+        time.sleep(STATUS_POLL_S)
+        t0 = time.perf_counter()
+        updates = table.changed(seen)
+        for msg in updates:
+            msg.pop("received", None)
+            _handle_status(msg)
+            MESSAGES.inc(kind="status")
+        if updates:
+            STATUS_POLL_SECONDS.observe(time.perf_counter() - t0)
+            broadcast_to_peers()
+
+def monitor_lanes(key: str):
+    """Track lane completion and hand a lost drone's lanes to the others."""
+    global rebalancer
+    try:
+        blobs = [plan_service.get(key, i) for i in range(PARTITIONS)]
+        for i, blob in enumerate(blobs):
+            telemetry.save_plan(key, i, blob)
+        plans = [json.loads(blob) for blob in blobs]
+        rebalancer = LaneRebalancer(plans, read_polygon_from_kml(KML_PATH))
+    except Exception as e:
+        print(f"Lane monitor disabled: {e}")
+        return
+    while True:
+        time.sleep(MONITOR_INTERVAL)
+        for ev in rebalancer.check():
+            # survivors now fly the lost drone's lanes: widen their geofence to match
+            for drone, mission in ev['missions'].items():
+                geofence.fence.extend_area(drone, ev['lost'], mission['waypoints'])
+
+def watch_geofence():
+    """Report drones leaving (and returning to) their allowed area."""
+    while True:
+        time.sleep(GEOFENCE_TICK_S)
+        for ev in geofence.tick():
+            if ev["kind"] is None:
+                log.info("Geofence clear", extra=fields(drone=ev["drone"]))
+            else:
+                log.warning("Geofence breach", extra=fields(drone=ev["drone"], kind=ev["kind"],
+                                                             lat=ev["lat"], lon=ev["lon"]))
+
+def watch_separation():
+    """Alert drones and the map about pairs closer than the minimum separation."""
+    while True:
+        time.sleep(SEPARATION_TICK_S)
+        events = separation.tick()
+        if not events:
+            continue
+        for ev in events:
+            key = "-".join(str(d) for d in ev["drones"])
+            if ev["active"] and ev["lost_contact"]:
+                state.put("alerts", key, ev)
+                log.error("Separation conflict, lost contact", extra=fields(
+                    drones=key, lost=",".join(str(d) for d in ev["lost_contact"]), distance_m=ev["distance_m"]))
+            elif ev["active"]:
+                state.put("alerts", key, ev)
+                log.warning("Separation conflict", extra=fields(drones=key, distance_m=ev["distance_m"],
+                                                                vertical_m=ev["vertical_m"]))
+            else:
+                state.remove("alerts", key)
+                log.info("Separation restored", extra=fields(drones=key))
+        with open(ALERTS_FILE, "w") as f:
+            json.dump(separation.alerts(), f, indent=2)
+        broadcast_to_peers()
+
+def feed_targets():
+    """Generate targets over the whole field and hand them to the dispatcher."""
+    generator = RandomTargetGenerator()
+    while True:
+        lat, lon = generator.get_random_target()
+        target_id = dispatcher.submit(lat, lon)
+        if target_id % 20 == 19:
+            print(f"Dispatch: {dispatcher.summary()}")
 
 def start_server():
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server.bind((RECEIVER_IP, RECEIVER_PORT))
-    server.listen()
-    print(f"Receiver listening on {RECEIVER_IP}:{RECEIVER_PORT}...")
+    setup_logging()
+    create_services()
+    # Drones connect to RECEIVER_WORKERS processes sharing RECEIVER_PORT (SO_REUSEPORT);
+    # they write statuses into the shared status table and relay everything else here
+    locks = new_locks()
+    table = StatusTable(create=True, locks=locks)
+    server = listen_reuseport("127.0.0.1", CONTROL_PORT)
+    workers = start_workers(RECEIVER_WORKERS, RECEIVER_IP, RECEIVER_PORT, ("127.0.0.1", CONTROL_PORT),
+                            table.name, locks, MAX_MESSAGE)
+    print(f"Receiver listening on {RECEIVER_IP}:{RECEIVER_PORT} with {len(workers)} worker process(es)...")
+    start_http_server(METRICS_PORT)
+    threading.Thread(target=follow_status_table, args=(table,), daemon=True).start()
+    key = plan_service.precompute()
+    telemetry.start_mission(KML_PATH, key, PARTITIONS)
+    threading.Thread(target=monitor_lanes, args=(key,), daemon=True).start()
+    threading.Thread(target=watch_geofence, daemon=True).start()
+    threading.Thread(target=watch_separation, daemon=True).start()
+    if dispatcher is not None:
+        threading.Thread(target=dispatcher.run, daemon=True).start()
+        threading.Thread(target=feed_targets, daemon=True).start()
     try:
         while True:
             conn, addr = server.accept()
@@ -96,13 +321,16 @@ def start_server():
                 s.settimeout(2)
                 s.connect((peer["ip"], 5000))
                 # Send a special command to delete the peers.json file
-                s.sendall(json.dumps({"command": "delete_peers_file"}).encode())
+                s.sendall(encode(json.dumps({"command": "delete_peers_file"}).encode()))
                 s.close()
                 print(f"Sent delete_peers_file command to {peer['ip']}")
             except Exception as e:
                 print(f"Failed to send delete command to {peer['ip']}: {e}")
     finally:
         server.close()
+        for w in workers:
+            w.terminate()
+        table.close()
 
 if __name__ == "__main__":
     start_server()
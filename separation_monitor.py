@@ -0,0 +1,197 @@
+import math
+import threading
+import time
+import numpy as np
+
+from geo_projection import LocalFrame
+from metrics import counter, gauge, histogram
+
+# === Separation settings ===
+MIN_HORIZONTAL_M = 10.0   # two drones closer than this horizontally...
+MIN_VERTICAL_M = 5.0      # ...and this vertically are in conflict
+STALE_S = 5.0             # fixes older than this are left out; a conflict involving them stays as "lost contact"
+TICK_S = 0.5              # the controller checks all pairs this often
+
+ALERTS = counter("separation_alerts_total", "Drone pairs entering a separation conflict")
+ACTIVE = gauge("separation_active_conflicts", "Drone pairs currently in conflict")
+TICK_SECONDS = histogram("separation_tick_seconds", "Time to check every pair once")
+
+# neighbour cells checked from each cell: itself plus one half of the 26 around it,
+# so every pair of adjacent cells is visited once
+_HALF = [(0, 0, 0)] + [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                       if (dx, dy, dz) > (0, 0, 0)]
+
+
+def close_pairs(x, y, z, min_h: float = MIN_HORIZONTAL_M, min_v: float = MIN_VERTICAL_M) -> list:
+    """
+    Index pairs (i, j, horizontal m, vertical m) closer than min_h and min_v.
+
+    Points are bucketed in a uniform hash of min_h x min_h cells and min_v
+    altitude bands, so a conflicting pair is always in the same or adjacent
+    cells and each point is compared with its few neighbours only: O(N) for
+    a swarm spread over a field instead of O(N^2).
+    """
+    kx = np.floor(np.asarray(x) / min_h).astype(np.int64).tolist()
+    ky = np.floor(np.asarray(y) / min_h).astype(np.int64).tolist()
+    kz = np.floor(np.asarray(z) / min_v).astype(np.int64).tolist()
+    x, y, z = np.asarray(x).tolist(), np.asarray(y).tolist(), np.asarray(z).tolist()
+    cells = {}
+    for i, key in enumerate(zip(kx, ky, kz)):
+        cells.setdefault(key, []).append(i)
+    min_h2 = min_h * min_h
+    pairs = []
+    for (cx, cy, cz), members in cells.items():
+        for dx, dy, dz in _HALF:
+            own = (dx, dy, dz) == (0, 0, 0)
+            others = members if own else cells.get((cx + dx, cy + dy, cz + dz))
+            if not others:
+                continue
+            for n, i in enumerate(members):
+                for j in (members[n + 1:] if own else others):
+                    dv = abs(z[i] - z[j])
+                    if dv >= min_v:
+                        continue
+                    dh2 = (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2
+                    if dh2 < min_h2:
+                        pairs.append((i, j, math.sqrt(dh2), dv) if i < j else (j, i, math.sqrt(dh2), dv))
+    return pairs
+
+
+class SeparationMonitor:
+    """
+    Controller-side deconfliction. update() stores each drone's latest fix;
+    tick() finds every pair in conflict and reports pairs entering or
+    leaving a conflict. A conflict only ends when both drones report again
+    and are apart: if one stops reporting (which may be the collision
+    itself) the alert stays, marked with the drones in "lost_contact".
+    """
+
+    def __init__(self, frame: LocalFrame, min_h: float = MIN_HORIZONTAL_M,
+                 min_v: float = MIN_VERTICAL_M, stale_s: float = STALE_S):
+        self.frame = frame
+        self.min_h = min_h
+        self.min_v = min_v
+        self.stale_s = stale_s
+        self.fixes = {}     # drone -> (lat, lon, alt, time, v_north, v_east, v_down)
+        self.active = {}    # (drone, drone) -> alert
+        self.lock = threading.Lock()
+
+    def update(self, drone: int, lat: float, lon: float, alt: float, now: float = None, velocity=None):
+        """Latest fix of a drone; velocity (NED m/s) moves it forward to each tick."""
+        vn, ve, vd = (float(v or 0.0) for v in (velocity or (0.0, 0.0, 0.0))[:3])
+        with self.lock:
+            self.fixes[drone] = (lat, lon, alt or 0.0, time.time() if now is None else now, vn, ve, vd)
+
+    def tick(self, now: float = None) -> list:
+        """Check all current fixes; returns alerts that started (active) or ended (not active)."""
+        now = time.time() if now is None else now
+        t0 = time.perf_counter()
+        with self.lock:
+            fixes = {d: f for d, f in self.fixes.items() if now - f[3] <= self.stale_s}
+        drones = list(fixes)
+        found = {}
+        predicted = {}      # drone -> [lat, lon, alt] at `now`, what the check saw
+        if len(drones) > 1:
+            lat, lon, alt, t, vn, ve, vd = np.array([fixes[d] for d in drones]).T
+            # drones only report when their dead-reckoned position drifts, so predict to now
+            dt = now - t
+            x, y = self.frame.forward(lat, lon)
+            x, y, z = x + ve * dt, y + vn * dt, alt - vd * dt
+            for i, j, dh, dv in close_pairs(x, y, z, self.min_h, self.min_v):
+                a, b = sorted((drones[i], drones[j]))
+                found[(a, b)] = (dh, dv)
+            if found:
+                plat, plon = self.frame.inverse(x, y)
+                predicted = {d: [float(plat[i]), float(plon[i]), float(z[i])] for i, d in enumerate(drones)}
+        events = []
+        for pair in [p for p in self.active if p not in found]:
+            alert = self.active[pair]
+            lost = [d for d in pair if d not in fixes]
+            if lost:
+                # no fix to clear it with: keep the alert and say contact was lost, once
+                if alert.get("lost_contact") != lost:
+                    alert["lost_contact"] = lost
+                    events.append({**alert, "active": True})
+                continue
+            del self.active[pair]
+            events.append({**alert, "active": False, "until": now})
+        for (a, b), (dh, dv) in found.items():
+            alert = self.active.get((a, b))
+            if alert is not None:
+                if alert.get("lost_contact"):
+                    # back in contact and still too close
+                    alert["lost_contact"] = []
+                    events.append({**alert, "active": True})
+                continue
+            alert = {"drones": [a, b], "distance_m": round(dh, 1), "vertical_m": round(dv, 1), "since": now,
+                     "positions": [predicted[a], predicted[b]], "lost_contact": []}
+            self.active[(a, b)] = alert
+            events.append({**alert, "active": True})
+            ALERTS.inc()
+        ACTIVE.set(len(self.active))
+        TICK_SECONDS.observe(time.perf_counter() - t0)
+        return events
+
+    def alerts(self) -> list:
+        return list(self.active.values())
+
+
+# If run directly, compare the pairwise check with the spatial hash on simulated swarms
+if __name__ == '__main__':
+    from geo_projection import get_frame
+
+    def pairwise(x, y, z, min_h=MIN_HORIZONTAL_M, min_v=MIN_VERTICAL_M):
+        # every drone against every other
+        pairs = []
+        for i in range(len(x)):
+            for j in range(i + 1, len(x)):
+                dv = abs(z[i] - z[j])
+                dh = math.hypot(x[i] - x[j], y[i] - y[j])
+                if dh < min_h and dv < min_v:
+                    pairs.append((i, j, dh, dv))
+        return pairs
+
+    rng = np.random.default_rng(0)
+    print(f"{'drones':>7} {'pairwise':>12} {'spatial hash':>13} {'speed-up':>9} {'conflicts':>10}")
+    for n in (100, 1000, 5000):
+        # one drone per ~0.4 ha at 30-60 m, so a few pairs come close
+        side = math.sqrt(n * 4000)
+        x = rng.uniform(0, side, n).tolist()
+        y = rng.uniform(0, side, n).tolist()
+        z = rng.uniform(30, 60, n).tolist()
+        t0 = time.perf_counter()
+        fast = close_pairs(x, y, z)
+        t_hash = time.perf_counter() - t0
+        if n <= 1000:
+            t0 = time.perf_counter()
+            ref = pairwise(x, y, z)
+            t_pair = time.perf_counter() - t0
+            assert sorted(p[:2] for p in fast) == sorted(p[:2] for p in ref)
+            print(f"{n:>7} {t_pair * 1000:>9.1f} ms {t_hash * 1000:>10.2f} ms {t_pair / t_hash:>8.0f}x {len(fast):>10}")
+        else:
+            print(f"{n:>7} {'-':>12} {t_hash * 1000:>10.2f} ms {'':>9} {len(fast):>10}")
+
+    # a controller tick at 1000 drones: two drones converge, then separate
+    frame = get_frame(-35.363261, 149.165230)
+    mon = SeparationMonitor(frame)
+    lat, lon = frame.inverse(rng.uniform(-5000, 5000, 1000), rng.uniform(-5000, 5000, 1000))
+    for d in range(1000):
+        mon.update(d, lat[d], lon[d], 40 + (d % 4) * 6, now=0)
+    mon.update(0, lat[1], lon[1] + 0.00003, 46, now=0)   # ~3 m east of drone 1, same altitude
+    t0 = time.perf_counter()
+    started = mon.tick(now=0)
+    t_tick = time.perf_counter() - t0
+    mon.update(0, lat[1] + 0.001, lon[1], 46, now=0)
+    ended = mon.tick(now=0)
+    print(f"1000 drones, one tick: {t_tick * 1000:.1f} ms (tick every {TICK_S * 1000:.0f} ms); "
+          f"alerts {[e['drones'] for e in started if e['active']]}, cleared {[e['drones'] for e in ended if not e['active']]}")
+
+    # drone 0 closes on drone 1 again, then stops reporting: the alert must stay
+    mon.update(0, lat[1], lon[1] + 0.00003, 46, now=1)
+    mon.update(1, lat[1], lon[1], 46, now=1)
+    mon.tick(now=1)
+    for d in range(1, 1000):
+        mon.update(d, lat[d], lon[d], 40 + (d % 4) * 6, now=10)
+    lost = mon.tick(now=10)
+    assert [e['lost_contact'] for e in lost] == [[0]] and lost[0]['active'] and mon.alerts()
+    print(f"drone 0 silent while in conflict: alert kept, lost contact with {lost[0]['lost_contact']}")
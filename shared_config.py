@@ -3,5 +3,16 @@ KML_PATH    = 'kml_files/30ha.kml'
 ALTITUDE_M  = 10
 OVERLAP_PCT = 15
 SIDELAP_PCT = 15
+PARTITIONS  = 2    # number of drones the field is split between
 
+# Controller (laptop) running receiver.py
+CONTROLLER_IP   = "100.94.138.35"
+CONTROLLER_PORT = 6000
 
+
+# Mapper command servers (drone1_mapper / drone2_mapper), indexed by partition
+MAPPER_ADDRS = [("100.85.57.104", 12345), ("100.85.57.104", 22221)]
+
+# Target listeners of drone_mission_executor.py, indexed by drone id
+EXECUTOR_ADDRS = [("100.85.57.104", 7000), ("100.85.57.104", 7001)]
+DISPATCH_TARGETS = False   # controller generates targets and assigns them (target_dispatcher.py)
@@ -0,0 +1,199 @@
+import threading
+import time
+import uuid
+
+# === Sync settings ===
+ACK_TIMEOUT_S = 3.0    # a peer that has not confirmed what was sent for this long gets it again
+SECTIONS = ("peers", "drones", "alerts")
+
+
+class StateStore:
+    """
+    Controller side of the shared swarm state.
+
+    Every entry carries the version of the store at its last change. Each
+    peer is sent only the entries changed since the last version it was
+    sent; the peer confirms the version it holds in its status messages.
+    If that confirmation falls behind for ACK_TIMEOUT_S (lost message, peer
+    restart) the peer is sent everything since its confirmed version again,
+    and a peer with no usable version (new, restarted, or from a previous
+    controller run) gets a full snapshot.
+    """
+
+    def __init__(self, sections=SECTIONS):
+        self.epoch = uuid.uuid4().hex[:8]   # distinguishes versions of this run from an earlier one
+        self.version = 0
+        self.entries = {s: {} for s in sections}   # section -> key -> (version, value or None if removed)
+        self.floor = 0        # removals at or below this version are forgotten
+        self.peers = {}       # peer -> {"sent": version, "acked": version, "acked_at": time}
+        self.lock = threading.Lock()
+
+    def put(self, section: str, key: str, value) -> bool:
+        """Set an entry; returns False (and keeps the version) if the value is unchanged."""
+        with self.lock:
+            old = self.entries[section].get(key)
+            if old is not None and old[1] == value:
+                return False
+            self.version += 1
+            self.entries[section][key] = (self.version, value)
+            return True
+
+    def remove(self, section: str, key: str):
+        with self.lock:
+            if self.entries[section].get(key, (0, None))[1] is not None:
+                self.version += 1
+                self.entries[section][key] = (self.version, None)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {s: {k: v for k, (_, v) in entries.items() if v is not None}
+                    for s, entries in self.entries.items()}
+
+    def ack(self, peer: str, epoch: str, version: int, now: float = None):
+        """Version a peer reports holding (from its status messages)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            if epoch != self.epoch or version is None or version > self.version:
+                version = 0   # not ours: full snapshot next time
+            p = self.peers.setdefault(peer, {"sent": 0, "acked": 0, "acked_at": now})
+            if version != p["acked"] or version >= p["sent"]:
+                p["acked_at"] = now
+            p["acked"] = version
+            if version < p["sent"] and (version == 0 or now - p["acked_at"] > ACK_TIMEOUT_S):
+                p["sent"] = version
+            self._prune()
+
+    def _prune(self):
+        # a removal can be forgotten once every peer holds a version past it
+        horizon = min([p["acked"] for p in self.peers.values()] + [self.version])
+        if horizon <= self.floor:
+            return
+        for entries in self.entries.values():
+            for key in [k for k, (v, value) in entries.items() if value is None and v <= horizon]:
+                del entries[key]
+        self.floor = horizon
+
+    def message_for(self, peer: str, now: float = None):
+        """Sync message bringing `peer` up to date, or None if it already is."""
+        now = time.time() if now is None else now
+        with self.lock:
+            p = self.peers.setdefault(peer, {"sent": 0, "acked": 0, "acked_at": now})
+            if p["sent"] > p["acked"] and now - p["acked_at"] > ACK_TIMEOUT_S:
+                p["sent"] = p["acked"]
+            base = p["sent"]
+            if base == self.version and base > 0:
+                return None
+            full = base == 0 or base < self.floor
+            msg = {"epoch": self.epoch, "base": 0 if full else base, "version": self.version, "full": full}
+            for section, entries in self.entries.items():
+                if full:
+                    msg[section] = {k: value for k, (_, value) in entries.items() if value is not None}
+                else:
+                    msg[section] = {k: value for k, (v, value) in entries.items() if v > base}
+            return msg
+
+    def sent(self, peer: str, msg: dict, ok: bool):
+        """Record the outcome of sending message_for(peer)."""
+        with self.lock:
+            p = self.peers[peer]
+            if ok:
+                p["sent"] = max(p["sent"], msg["version"])
+            else:
+                p["sent"] = p["acked"]
+
+
+class StateReplica:
+    """Drone side: applies sync messages and reports the version it holds."""
+
+    def __init__(self, sections=SECTIONS):
+        self.epoch = None
+        self.version = 0
+        self.state = {s: {} for s in sections}
+        self.lock = threading.Lock()
+
+    def apply(self, msg: dict) -> set:
+        """Apply one sync message; returns the sections that changed."""
+        with self.lock:
+            if msg["full"]:
+                changed = {s for s in self.state if self.state[s] != msg.get(s, {})}
+                self.state = {s: dict(msg.get(s, {})) for s in self.state}
+                self.epoch = msg["epoch"]
+                self.version = msg["version"]
+                return changed
+            # a delta only applies on top of what it was computed from; otherwise wait for a resend
+            if msg["epoch"] != self.epoch or msg["base"] > self.version or msg["version"] <= self.version:
+                return set()
+            changed = set()
+            for s in self.state:
+                for key, value in msg.get(s, {}).items():
+                    if value is None:
+                        if self.state[s].pop(key, None) is not None:
+                            changed.add(s)
+                    elif self.state[s].get(key) != value:
+                        self.state[s][key] = value
+                        changed.add(s)
+            self.version = msg["version"]
+            return changed
+
+    def ack_fields(self) -> dict:
+        """Fields to add to this drone's status messages."""
+        with self.lock:
+            return {"state_epoch": self.epoch, "state_version": self.version}
+
+    def values(self, section: str) -> list:
+        with self.lock:
+            return [self.state[section][k] for k in sorted(self.state[section])]
+
+
+# If run directly, compare the controller's outgoing traffic with full snapshots
+# against versioned deltas (every drone reports at 1 Hz, each report is broadcast)
+if __name__ == '__main__':
+    import json
+    import random
+
+    rng = random.Random(0)
+    SECONDS = 10
+
+    def status(i, t):
+        return {"id": i, "gps": {"lat": -35.36 + rng.uniform(-0.01, 0.01), "lon": 149.16 + rng.uniform(-0.01, 0.01)},
+                "baro": round(rng.uniform(580, 600), 2), "velocity": [i, i, i], "heartbeat": t}
+
+    print(f"{'drones':>6} {'full snapshot':>16} {'delta':>14} {'saving':>8}")
+    for n in (10, 50, 200):
+        peers = [{"id": i, "ip": f"10.0.{i // 250}.{i % 250}"} for i in range(n)]
+        drones = {}
+        store = StateStore()
+        replicas = {str(p["id"]): StateReplica() for p in peers}
+        for p in peers:
+            store.put("peers", f"{p['id']}@{p['ip']}", p)
+        full_bytes = delta_bytes = 0
+        for step in range(SECONDS * n):
+            t = step / n
+            i = step % n
+            drones[str(i)] = status(i, t)
+            store.put("drones", str(i), drones[str(i)])
+            full_bytes += len(json.dumps({"peers": peers, "drones": drones}).encode()) * n
+            # one drone loses a message, another restarts and forgets its state
+            lossy = step == SECONDS * n // 3
+            if step == SECONDS * n // 2:
+                replicas["1"] = StateReplica()
+            encoded = {}
+            for pid, replica in replicas.items():
+                msg = store.message_for(pid, now=t)
+                if msg is None:
+                    continue
+                data = encoded.get((msg["base"], msg["version"]))
+                if data is None:
+                    data = encoded[(msg["base"], msg["version"])] = json.dumps({"sync": msg}).encode()
+                delta_bytes += len(data)
+                ok = not (lossy and pid == "0")
+                if ok:
+                    replica.apply(json.loads(data)["sync"])
+                store.sent(pid, msg, ok=True)   # a lost TCP message still looks sent
+            # acks ride on the next status message of that drone
+            ack = replicas[str(i)].ack_fields()
+            store.ack(str(i), ack["state_epoch"], ack["state_version"], now=t)
+        snap = store.snapshot()
+        in_sync = sum(r.state == snap for r in replicas.values())
+        print(f"{n:>6} {full_bytes / SECONDS / 1e6:>11.2f} MB/s {delta_bytes / SECONDS / 1e6:>9.3f} MB/s "
+              f"{full_bytes / delta_bytes:>7.0f}x   replicas in sync: {in_sync}/{n}")
@@ -0,0 +1,365 @@
+import json
+import math
+import multiprocessing
+import os
+import socket
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from framing import MAX_FRAME, encode, iter_frames
+
+# === Status table layout ===
+# One fixed-size slot per drone id in a named shared-memory block, written by the
+# receiver's worker processes and read directly by the controller, map_server.py and
+# drone_gui.py. Each slot starts with a sequence number (seqlock): a writer makes it
+# odd, writes the record and makes it even again; a reader retries if it saw an odd
+# number or the number changed while it copied the record. Writers to the same slot
+# are serialized by a striped lock shared between the workers; readers never lock.
+TABLE_NAME = 'swarm_status'
+MAX_DRONES = 1024
+LOCK_STRIPES = 64
+MAGIC = b'SWST'
+LAYOUT = 1
+HEADER = struct.Struct('<4sII')       # magic, layout, slots
+HEADER_SIZE = 64
+SEQ = struct.Struct('<Q')
+# id, flags, lat, lon, alt, v_north, v_east, v_down, heartbeat, received, dr_error_m, state epoch, state version
+RECORD = struct.Struct('<iI9d8sq')
+SLOT_SIZE = 128
+VALID, HAS_FIX = 1, 2
+READ_SPINS = 16          # retries before a reader yields to a writer that was preempted mid-write
+READ_TIMEOUT_S = 0.5
+
+# === Ingest workers ===
+STATUS_POLL_S = 0.05   # the controller picks up new records this often
+REOPEN_S = 10.0        # readers re-attach this often, to follow a restarted controller
+CONNECT_TIMEOUT = 5.0
+
+
+_track_lock = threading.Lock()
+
+
+def _open_untracked(name: str) -> shared_memory.SharedMemory:
+    # Only the creating process may unlink the block; before Python 3.13 every process
+    # that opens it registers it with the resource tracker, which unlinks it at exit
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        pass
+    with _track_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda n, rtype: None if rtype == 'shared_memory' else register(n, rtype)
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+
+class StatusTable:
+    """
+    Latest status of every drone in shared memory (see the layout notes above).
+    create=True makes a fresh table (the controller); otherwise an existing one
+    is opened by name. Writers must pass the controller's `locks`.
+    """
+
+    def __init__(self, name: str = TABLE_NAME, create: bool = False, slots: int = MAX_DRONES, locks=None):
+        self.name = name
+        self.locks = locks
+        self.owner = create
+        if create:
+            try:
+                stale = _open_untracked(name)     # left over by a controller that crashed
+                stale.close()
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+            self.shm = shared_memory.SharedMemory(name, create=True, size=HEADER_SIZE + slots * SLOT_SIZE)
+            self.shm.buf[:len(self.shm.buf)] = bytes(len(self.shm.buf))
+            HEADER.pack_into(self.shm.buf, 0, MAGIC, LAYOUT, slots)
+        else:
+            self.shm = _open_untracked(name)
+        magic, layout, self.slots = HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or layout != LAYOUT:
+            raise RuntimeError(f"shared memory {name} is not a status table (layout {layout})")
+        self.buf = self.shm.buf
+
+    def _offset(self, drone: int) -> int:
+        return HEADER_SIZE + drone * SLOT_SIZE
+
+    def write(self, msg: dict) -> bool:
+        """Store a status message; False if its id has no slot."""
+        drone = int(msg["id"])
+        if not 0 <= drone < self.slots:
+            return False
+        gps = msg.get("gps") or {}
+        lat, lon = gps.get("lat"), gps.get("lon")
+        fix = lat is not None and lon is not None
+        vel = [float(v or 0.0) for v in (msg.get("velocity") or ())][:3]
+        vel += [0.0] * (3 - len(vel))
+        epoch = (msg.get("state_epoch") or '').encode()[:8]
+        version = msg.get("state_version")
+        record = RECORD.pack(drone, VALID | (HAS_FIX if fix else 0),
+                             float(lat) if fix else math.nan, float(lon) if fix else math.nan,
+                             float(msg.get("baro") or 0.0), *vel,
+                             float(msg.get("heartbeat") or 0.0), time.time(),
+                             float(msg.get("dr_error_m") or 0.0), epoch, -1 if version is None else int(version))
+        off = self._offset(drone)
+        with self.locks[drone % len(self.locks)]:
+            (seq,) = SEQ.unpack_from(self.buf, off)
+            SEQ.pack_into(self.buf, off, seq + 1)
+            self.buf[off + SEQ.size:off + SEQ.size + RECORD.size] = record
+            SEQ.pack_into(self.buf, off, seq + 2)
+        return True
+
+    def _read(self, drone: int):
+        """(seq, record tuple) of a consistent copy of one slot."""
+        off = self._offset(drone)
+        spins = 0
+        deadline = None
+        while True:
+            (seq,) = SEQ.unpack_from(self.buf, off)
+            if not seq & 1:
+                record = RECORD.unpack_from(self.buf, off + SEQ.size)
+                if SEQ.unpack_from(self.buf, off)[0] == seq:
+                    return seq, record
+            spins += 1
+            if spins > READ_SPINS:
+                deadline = deadline or time.monotonic() + READ_TIMEOUT_S
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"status slot {drone} kept changing while being read")
+                time.sleep(0)
+
+    @staticmethod
+    def _status(record) -> dict:
+        drone, flags, lat, lon, alt, vn, ve, vd, heartbeat, received, dr_error, epoch, version = record
+        status = {"id": drone, "gps": {"lat": lat if flags & HAS_FIX else None, "lon": lon if flags & HAS_FIX else None},
+                  "baro": alt, "velocity": [vn, ve, vd], "heartbeat": heartbeat, "received": received,
+                  "state_epoch": epoch.rstrip(b'\0').decode() or None, "state_version": None if version < 0 else version}
+        if dr_error:
+            status["dr_error_m"] = dr_error
+        return status
+
+    def read(self, drone: int):
+        seq, record = self._read(drone)
+        return self._status(record) if record[1] & VALID else None
+
+    def snapshot(self) -> dict:
+        """{drone id (str): status} of every drone that has reported."""
+        out = {}
+        for drone in range(self.slots):
+            if SEQ.unpack_from(self.buf, self._offset(drone))[0] == 0:
+                continue
+            _, record = self._read(drone)
+            if record[1] & VALID:
+                out[str(drone)] = self._status(record)
+        return out
+
+    def changed(self, seen: dict) -> list:
+        """Statuses written since the sequence numbers in `seen` (updated in place)."""
+        out = []
+        for drone in range(self.slots):
+            seq = SEQ.unpack_from(self.buf, self._offset(drone))[0]
+            if seq == 0 or seq == seen.get(drone):
+                continue
+            seq, record = self._read(drone)
+            seen[drone] = seq
+            if record[1] & VALID:
+                out.append(self._status(record))
+        return out
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class TableReader:
+    """
+    Read-only access for the map server and GUI: attaches to the controller's
+    table when it exists and re-attaches every REOPEN_S, so a restarted
+    controller's new table is picked up.
+    """
+
+    def __init__(self, name: str = TABLE_NAME, reopen_s: float = REOPEN_S):
+        self.name = name
+        self.reopen_s = reopen_s
+        self.table = None
+        self.opened = 0.0
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        if self.table is None or now - self.opened > self.reopen_s:
+            if self.table is not None:
+                self.table.close()
+                self.table = None
+            try:
+                self.table = StatusTable(self.name)
+                self.opened = now
+            except FileNotFoundError:
+                return {}          # controller not running
+        return self.table.snapshot()
+
+
+def new_locks(ctx=None) -> list:
+    """Striped writer locks to hand to every worker process."""
+    ctx = ctx or multiprocessing.get_context('spawn')
+    return [ctx.Lock() for _ in range(LOCK_STRIPES)]
+
+
+def listen_reuseport(host: str, port: int) -> socket.socket:
+    """Listening socket that other processes can bind to the same port (SO_REUSEPORT)."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, 'SO_REUSEPORT'):
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server.bind((host, port))
+    server.listen(512)
+    return server
+
+
+def _relay(data: bytes, conn: socket.socket, control_addr: tuple):
+    # registrations, plan requests, reports: handled by the controller process
+    with socket.create_connection(control_addr, timeout=CONNECT_TIMEOUT) as s:
+        s.sendall(encode(data))
+        s.shutdown(socket.SHUT_WR)
+        for reply in iter_frames(s):
+            conn.sendall(encode(reply))
+
+
+def _ingest(conn: socket.socket, table: StatusTable, control_addr: tuple, max_frame: int):
+    try:
+        for data in iter_frames(conn, max_frame=max_frame):
+            if not data.strip():
+                continue
+            try:
+                msg = json.loads(data)
+            except ValueError:
+                msg = None
+            if isinstance(msg, dict) and "gps" in msg and "id" in msg and "command" not in msg:
+                if table.write(msg):
+                    continue
+            _relay(data, conn, control_addr)
+    except Exception as e:
+        print(f"[ingest {os.getpid()}] connection dropped: {e}")
+    finally:
+        conn.close()
+
+
+def ingest_worker(host: str, port: int, control_addr: tuple, table_name: str, locks, max_frame: int = MAX_FRAME):
+    """
+    Worker process of the receiver: accepts drone connections on the shared port,
+    writes status messages straight into the status table and relays everything
+    else to the controller process on control_addr.
+    """
+    table = StatusTable(table_name, locks=locks)
+    server = listen_reuseport(host, port)
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=_ingest, args=(conn, table, control_addr, max_frame), daemon=True).start()
+
+
+def start_workers(count: int, host: str, port: int, control_addr: tuple, table_name: str, locks,
+                  max_frame: int = MAX_FRAME) -> list:
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        count = 1     # without SO_REUSEPORT only one process can listen on the port
+    ctx = multiprocessing.get_context('spawn')
+    procs = [ctx.Process(target=ingest_worker, args=(host, port, control_addr, table_name, locks, max_frame),
+                         name=f"ingest-{i}", daemon=True) for i in range(count)]
+    for p in procs:
+        p.start()
+    return procs
+
+
+def _bench_writer(name, locks, drone, n):
+    # rewrites one slot with lat == lon == alt, for the torn-read check
+    table = StatusTable(name, locks=locks)
+    for i in range(n):
+        table.write({"id": drone, "gps": {"lat": float(i), "lon": float(i)}, "baro": float(i),
+                     "velocity": [i, i, i], "heartbeat": float(i)})
+    table.close()
+
+
+def _bench_client(port, n, drones):
+    # one client: n status messages over ten connections, like drones reconnecting
+    msg = {"gps": {"lat": -35.36, "lon": 149.16}, "baro": 584.0, "velocity": [1.0, 0.0, 0.0],
+           "heartbeat": 0.0, "state_epoch": "0a1b2c3d", "state_version": 7, "dr_error_m": 2.0}
+    for c in range(10):
+        with socket.create_connection(('127.0.0.1', port)) as s:
+            s.sendall(b''.join(encode(json.dumps({**msg, "id": (c * 7 + i) % drones}).encode())
+                               for i in range(n // 10)))
+
+
+# If run directly: torn-read check, table vs drone_status.json reads, and ingest
+# throughput of one worker against one per core
+if __name__ == '__main__':
+    import tempfile
+
+    ctx = multiprocessing.get_context('spawn')
+    locks = new_locks(ctx)
+    name = f"swarm_status_bench_{os.getpid()}"
+    table = StatusTable(name, create=True, locks=locks)
+
+    # seqlock: a writer process rewrites one slot with lat == lon == alt; reads must never mix two writes
+    writer = ctx.Process(target=_bench_writer, args=(name, locks, 3, 200_000))
+    writer.start()
+    reads = 0
+    while writer.is_alive():
+        s = table.read(3)
+        if s is not None:
+            assert s["gps"]["lat"] == s["gps"]["lon"] == s["baro"], s
+            reads += 1
+    writer.join()
+    print(f"Seqlock: {reads} reads during 200000 writes from another process, none torn")
+
+    # what map_server / drone_gui pay per refresh at 1000 drones
+    for d in range(1000):
+        table.write({"id": d, "gps": {"lat": -35.36, "lon": 149.16}, "baro": 584.0, "velocity": [1, 0, 0],
+                     "heartbeat": time.time(), "state_epoch": "0a1b2c3d", "state_version": 7})
+    path = os.path.join(tempfile.mkdtemp(), 'drone_status.json')
+    t0 = time.perf_counter()
+    for _ in range(20):
+        with open(path, 'w') as f:
+            json.dump(table.snapshot(), f, indent=2)
+    t_dump = (time.perf_counter() - t0) / 20
+    t0 = time.perf_counter()
+    for _ in range(20):
+        with open(path) as f:
+            json.load(f)
+    t_load = (time.perf_counter() - t0) / 20
+    t0 = time.perf_counter()
+    for _ in range(20):
+        snap = table.snapshot()
+    t_snap = (time.perf_counter() - t0) / 20
+    assert len(snap) == 1000
+    print(f"1000 drones: write+read drone_status.json {t_dump * 1000:.1f} + {t_load * 1000:.1f} ms per refresh, "
+          f"table snapshot {t_snap * 1000:.1f} ms, no file written per status")
+
+    # ingest: statuses/s landing in the table with 1 worker and with one per core
+    control = listen_reuseport('127.0.0.1', 0)
+    N_MSGS, CLIENTS = 20_000, 4
+    for workers in sorted({1, os.cpu_count() or 1}):
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        procs = start_workers(workers, '127.0.0.1', port, control.getsockname(), name, locks)
+        time.sleep(1.0)
+        seen = {}
+        table.changed(seen)
+        before = sum(SEQ.unpack_from(table.buf, table._offset(d))[0] for d in range(1000)) // 2
+        t0 = time.perf_counter()
+        clients = [ctx.Process(target=_bench_client, args=(port, N_MSGS // CLIENTS, 1000)) for _ in range(CLIENTS)]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+        while sum(SEQ.unpack_from(table.buf, table._offset(d))[0] for d in range(1000)) // 2 - before < N_MSGS:
+            time.sleep(0.01)
+        dt = time.perf_counter() - t0
+        print(f"Ingest with {workers} worker(s): {N_MSGS / dt:,.0f} statuses/s")
+        for p in procs:
+            p.terminate()
+    table.close()
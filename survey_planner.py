@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import shapely
+from shapely import affinity
+from shapely.geometry import Polygon, box
+
+from mapping_params import calculate_mapping_params
+from geo_projection import frame_for_polygon
+from camera_triggers import trigger_points
+from boustrophedon import plan_path
+import tracing
+
+# === Sweep-angle search ===
+TURN_PENALTY_M = 100.0   # path-length cost charged per lane-end turn (fixed-wing turn + settle)
+SWEEP_STEP_DEG = 5.0     # candidate spacing around the minimum-width direction
+SWEEP_SPAN_DEG = 30.0    # candidates cover seed ± SWEEP_SPAN_DEG
+SWEEP_WORKERS = 4        # shapely's vectorized ops release the GIL, so threads run in parallel
+
+
+def split_into_strips(poly: Polygon, count: int) -> list:
+    """
+    Split a field (lon/lat) into `count` equal-width north-south strips,
+    measured in local metres and ordered west to east.
+    """
+    frame = frame_for_polygon(poly)
+    local = frame.polygon_to_local(poly)
+    minx, miny, maxx, maxy = local.bounds
+    edges = np.linspace(minx, maxx, count + 1)
+    return [frame.polygon_to_lonlat(local.intersection(box(x0, miny, x1, maxy)))
+            for x0, x1 in zip(edges[:-1], edges[1:])]
+
+
+def _sweep_lines(geom, spacing: float):
+    """Horizontal lines every `spacing` metres across the geometry's bounding box."""
+    minx, miny, maxx, maxy = geom.bounds
+    count = int(np.floor((maxy - miny + spacing / 2) / spacing)) + 1
+    ys = miny + spacing * np.arange(count)
+    starts = np.column_stack((np.full(count, minx), ys))
+    ends = np.column_stack((np.full(count, maxx), ys))
+    return shapely.linestrings(np.stack((starts, ends), axis=1))
+
+
+def _rotation(angle_deg: float) -> np.ndarray:
+    a = np.radians(angle_deg)
+    return np.array([[np.cos(a), -np.sin(a)], [np.sin(a), np.cos(a)]])
+
+
+def min_width_angle(local) -> float:
+    """
+    Direction (degrees from east, in [0, 180)) of the convex-hull edge with the
+    smallest caliper width. Lanes parallel to it need the fewest passes.
+    """
+    hull = np.asarray(shapely.convex_hull(local).exterior.coords)
+    edges = np.diff(hull, axis=0)
+    edges = edges[np.hypot(edges[:, 0], edges[:, 1]) > 0]
+    angles = np.arctan2(edges[:, 1], edges[:, 0])
+    normals = np.column_stack((-np.sin(angles), np.cos(angles)))
+    proj = hull[:-1] @ normals.T
+    widths = proj.max(axis=0) - proj.min(axis=0)
+    return float(np.degrees(angles[np.argmin(widths)]) % 180.0)
+
+
+def score_sweep(local, angle_deg: float, spacing: float) -> dict:
+    """Lane count, turns and approximate path length of lanes at `angle_deg` over a local-metre field."""
+    rotated = affinity.rotate(local, -angle_deg, origin=(0, 0))
+    parts = shapely.get_parts(shapely.intersection(_sweep_lines(rotated, spacing), rotated))
+    lengths = shapely.length(parts)
+    lanes = int(np.count_nonzero(lengths > 0))
+    turns = max(lanes - 1, 0)
+    length_m = float(lengths.sum()) + turns * spacing
+    return {
+        'angle_deg': angle_deg,
+        'lanes': lanes,
+        'turns': turns,
+        'length_m': length_m,
+        'score': length_m + TURN_PENALTY_M * turns,
+    }
+
+
+def optimize_sweep_angle(local, spacing: float) -> dict:
+    """
+    Score every sweep angle around the minimum-width direction and return the
+    best score_sweep() result. All candidates are evaluated and ties go to the
+    smaller angle, so a field always gets the same plan (plan_service caches
+    plans by content).
+    """
+    seed = min_width_angle(local)
+    offsets = np.arange(SWEEP_STEP_DEG, SWEEP_SPAN_DEG + 1e-9, SWEEP_STEP_DEG)
+    candidates = [seed] + [seed + sign * o for o in offsets for sign in (1, -1)] + [0.0, 90.0]
+    seen, angles = set(), []
+    for a in candidates:
+        a = round(a % 180.0, 6)
+        if a not in seen:
+            seen.add(a)
+            angles.append(a)
+
+    with ThreadPoolExecutor(max_workers=SWEEP_WORKERS) as pool:
+        results = list(pool.map(lambda a: score_sweep(local, a, spacing), angles))
+    best = min(results, key=lambda r: (round(r['score'], 6), r['angle_deg']))
+    best['evaluated'] = len(results)
+    return best
+
+
+def plan_lawnmower(poly: Polygon, altitude_m: float, overlap_pct: float, sidelap_pct: float,
+                   angle_deg: float = None) -> dict:
+    """
+    Plan a lawnmower survey over a field (lon/lat geometry).
+
+    Lanes run at `angle_deg` (degrees counter-clockwise from east); by default
+    the angle is chosen by optimize_sweep_angle(). Concave fields and fields
+    with holes are split into boustrophedon cells (see boustrophedon.py).
+
+    Returns a dict with:
+      waypoints       -- [(lat, lon, alt), ...] starting at the centroid
+      lines           -- sweep lines as LineStrings in lon/lat
+      triggers        -- camera_triggers.TriggerPlan along every lane
+      distance_m      -- total path length
+      sweep_angle_deg -- lane direction used
+      lane_spacing_m  -- distance between neighbouring lanes
+    """
+    # derive mapping
+    mp = calculate_mapping_params(altitude_m, overlap_pct, sidelap_pct)
+    swath_w = mp['ground_width_m']           # full swath width (m)
+    lane_spacing_m = swath_w * (1 - sidelap_pct/100.0)
+
+    # plan in a local ENU frame (metres); convert back to lat/lon once at the end
+    frame = frame_for_polygon(poly)
+    local = frame.polygon_to_local(poly)
+
+    # choose the sweep direction, then work in a frame where lanes are horizontal
+    if angle_deg is None:
+        with tracing.span("sweep_angle"):
+            angle_deg = optimize_sweep_angle(local, lane_spacing_m)['angle_deg']
+    rotated = affinity.rotate(local, -angle_deg, origin=(0, 0))
+    lines = _sweep_lines(rotated, lane_spacing_m)
+
+    # build waypoints: start at centroid, then sweep boustrophedon cells in transit-minimising
+    # order, routing transits around holes (no-fly areas) and concave notches
+    with tracing.span("cell_decomposition"):
+        pts, lane_wps = plan_path(rotated, lines, (rotated.centroid.x, rotated.centroid.y))
+    start_wp = [s for s, _ in lane_wps]
+    end_wp = [e for _, e in lane_wps]
+    rot = _rotation(angle_deg)
+    en = np.array(pts) @ rot.T
+
+    # camera triggers along every lane at the along-track photo spacing
+    with tracing.span("camera_triggers"):
+        triggers = trigger_points(en[start_wp], en[end_wp], mp['photo_spacing_m'],
+                                  frame, start_wp, end_wp)
+
+    # total distance
+    dist = float(np.hypot(*np.diff(en, axis=0).T).sum())
+
+    # export: one batch conversion of every waypoint and lane back to lon/lat
+    lats, lons = frame.inverse(en[:, 0], en[:, 1])
+    waypoints = [(lat, lon, altitude_m) for lat, lon in zip(lats.tolist(), lons.tolist())]
+    lines = list(frame.polygon_to_lonlat(shapely.transform(lines, lambda xy: xy @ rot.T)))
+    return {
+        'waypoints': waypoints,
+        'lines': lines,
+        'triggers': triggers,
+        'distance_m': dist,
+        'sweep_angle_deg': angle_deg,
+        'lane_spacing_m': lane_spacing_m,
+    }
+
+
+# If run directly, compare the searched sweep angle with the old bounding-box choice
+if __name__ == '__main__':
+    import time
+    from area_splitter import read_polygon_from_kml
+    from shared_config import KML_PATH, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT
+
+    field = read_polygon_from_kml(KML_PATH)
+    frame = frame_for_polygon(field)
+    fields = {
+        'kml field': field,
+        'rotated strip': frame.polygon_to_lonlat(affinity.rotate(box(-600, -60, 600, 60), 33, origin=(0, 0))),
+        'parallelogram': frame.polygon_to_lonlat(Polygon([(-500, -150), (300, -150), (500, 150), (-300, 150)])),
+    }
+    mp = calculate_mapping_params(ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT)
+    spacing = mp['ground_width_m'] * (1 - SIDELAP_PCT / 100.0)
+    for name, geom in fields.items():
+        local = frame.polygon_to_local(geom)
+        minx, miny, maxx, maxy = local.bounds
+        legacy = score_sweep(local, 0.0 if maxx - minx >= maxy - miny else 90.0, spacing)
+        t0 = time.perf_counter()
+        best = optimize_sweep_angle(local, spacing)
+        elapsed = time.perf_counter() - t0
+        print(f"{name:>14}: bbox {legacy['angle_deg']:5.1f}° {legacy['turns']:4d} turns {legacy['length_m']:8.0f} m"
+              f" | best {best['angle_deg']:5.1f}° {best['turns']:4d} turns {best['length_m']:8.0f} m"
+              f" ({best['evaluated']} angles in {elapsed * 1000:.0f} ms)")
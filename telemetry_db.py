@@ -0,0 +1,323 @@
+import json
+import math
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from mapping_params import EARTH_RADIUS_M, distances_from, polyline_length
+from metrics import counter, histogram
+
+# === Store settings ===
+DB_PATH = 'swarm.db'
+BATCH_SIZE = 1000         # rows written per transaction at most
+FLUSH_INTERVAL = 0.25     # seconds a row may wait for its batch
+QUEUE_SIZE = 200_000      # rows buffered for the writer; beyond this they are dropped
+
+ROWS_WRITTEN = counter("telemetry_rows_written_total", "Telemetry rows stored")
+ROWS_DROPPED = counter("telemetry_rows_dropped_total", "Telemetry rows dropped because the writer fell behind")
+WRITE_ERRORS = counter("telemetry_write_errors_total", "Writer transactions that failed, by kind", ("kind",))
+FLUSH_SECONDS = histogram("telemetry_flush_seconds", "Time to write one telemetry batch")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS missions (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    kml_path TEXT,
+    plan_key TEXT,
+    partitions INTEGER
+);
+CREATE TABLE IF NOT EXISTS plans (
+    plan_key TEXT NOT NULL,
+    partition INTEGER NOT NULL,
+    created REAL NOT NULL,
+    waypoints INTEGER,
+    plan TEXT NOT NULL,
+    PRIMARY KEY (plan_key, partition)
+);
+CREATE TABLE IF NOT EXISTS telemetry (
+    id INTEGER PRIMARY KEY,
+    drone_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    lat REAL,
+    lon REAL,
+    alt REAL,
+    vx REAL,
+    vy REAL,
+    vz REAL
+);
+CREATE INDEX IF NOT EXISTS telemetry_drone_ts ON telemetry (drone_id, ts);
+"""
+# R*Tree over fixes for bounding-box queries (shares ids with telemetry)
+RTREE_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS telemetry_box USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+# without the R*Tree module, a plain index still narrows on latitude
+FALLBACK_SCHEMA = "CREATE INDEX IF NOT EXISTS telemetry_lat_lon ON telemetry (lat, lon)"
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")       # readers never block the writer
+    conn.execute("PRAGMA synchronous=NORMAL")     # durable at checkpoints; safe with WAL
+    return conn
+
+
+class _Job:
+    """A mission/plan write run on the writer thread between telemetry batches."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.future = Future()
+
+
+class TelemetryDB:
+    """
+    Mission, plan and telemetry store of the controller.
+
+    record() only queues the drone's status message; one writer thread
+    inserts the queue in batches of up to BATCH_SIZE rows per transaction.
+    Missions and plans go through the same thread, so only its connection
+    ever writes. Queries use their own connection and run concurrently
+    with the writer.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self.conn = connect(path)
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.execute(RTREE_SCHEMA)
+            self.rtree = True
+        except sqlite3.OperationalError:   # SQLite built without R*Tree
+            self.conn.execute(FALLBACK_SCHEMA)
+            self.rtree = False
+        self.conn.commit()
+        self.next_id = (self.conn.execute("SELECT MAX(id) FROM telemetry").fetchone()[0] or 0) + 1
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.read_lock = threading.Lock()
+        self.reader = connect(path)
+        self._flushed = threading.Condition()
+        self._written = 0
+        self._queued = 0
+        self.writer = threading.Thread(target=self._write_loop, name="telemetry-writer", daemon=True)
+        self.writer.start()
+
+    # === Writing ===
+    def record(self, msg: dict):
+        """Queue one status message ({"id", "gps", "baro", "velocity", "heartbeat"})."""
+        gps = msg.get("gps") or {}
+        vel = msg.get("velocity") or (None, None, None)
+        row = (int(msg["id"]), float(msg.get("heartbeat") or time.time()), gps.get("lat"), gps.get("lon"),
+               msg.get("baro"), *(list(vel) + [None, None, None])[:3])
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            ROWS_DROPPED.inc()
+            return
+        with self._flushed:
+            self._queued += 1
+
+    def _write_loop(self):
+        job = None        # a mission/plan write that ended the previous batch
+        while True:
+            item = job if job is not None else self.queue.get()
+            job = None
+            if isinstance(item, _Job):
+                self._run(item)
+                continue
+            batch = [item]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if isinstance(item, _Job):
+                    job = item
+                    break
+                batch.append(item)
+            self._insert(batch)
+
+    def _insert(self, batch: list):
+        t0 = time.perf_counter()
+        ids = range(self.next_id, self.next_id + len(batch))
+        self.next_id += len(batch)
+        try:
+            with self.conn:
+                self.conn.executemany("INSERT INTO telemetry VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                      [(i, *row) for i, row in zip(ids, batch)])
+                if self.rtree:
+                    self.conn.executemany("INSERT INTO telemetry_box VALUES (?, ?, ?, ?, ?)",
+                                          [(i, row[2], row[2], row[3], row[3]) for i, row in zip(ids, batch)
+                                           if row[2] is not None and row[3] is not None])
+            FLUSH_SECONDS.observe(time.perf_counter() - t0)
+            ROWS_WRITTEN.inc(len(batch))
+        except sqlite3.Error as e:
+            # lose this batch, not the writer
+            WRITE_ERRORS.inc(kind="telemetry")
+            ROWS_DROPPED.inc(len(batch))
+            print(f"[TelemetryDB] {len(batch)} telemetry rows not stored: {e}")
+        with self._flushed:
+            self._written += len(batch)
+            self._flushed.notify_all()
+
+    def _run(self, job: _Job):
+        try:
+            with self.conn:
+                result = job.fn(self.conn)
+        except Exception as e:
+            WRITE_ERRORS.inc(kind="job")
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+
+    def _submit(self, fn):
+        """Run fn(conn) in its own transaction on the writer thread and return its result."""
+        job = _Job(fn)
+        self.queue.put(job)       # waits for room rather than dropping a mission or plan
+        return job.future.result()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until everything recorded so far is written."""
+        with self._flushed:
+            target = self._queued
+            return self._flushed.wait_for(lambda: self._written >= target, timeout)
+
+    def start_mission(self, kml_path: str, plan_key: str, partitions: int) -> int:
+        started = time.time()
+        return self._submit(lambda conn: conn.execute(
+            "INSERT INTO missions (started, kml_path, plan_key, partitions) VALUES (?, ?, ?, ?)",
+            (started, kml_path, plan_key, partitions)).lastrowid)
+
+    def save_plan(self, plan_key: str, partition: int, plan: bytes):
+        doc = json.loads(plan)
+        row = (plan_key, partition, time.time(), len(doc.get("waypoints", [])),
+               plan.decode() if isinstance(plan, bytes) else plan)
+        self._submit(lambda conn: conn.execute("INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?, ?)", row))
+
+    # === Queries ===
+    def track(self, drone_id: int, t0: float, t1: float) -> list:
+        """Fixes of one drone between t0 and t1: [(ts, lat, lon, alt), ...] in time order."""
+        with self.read_lock:
+            return self.reader.execute(
+                "SELECT ts, lat, lon, alt FROM telemetry WHERE drone_id = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                (drone_id, t0, t1)).fetchall()
+
+    def in_box(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+               t0: float = None, t1: float = None) -> list:
+        """Fixes inside a lat/lon box (optionally in a time window): [(drone_id, ts, lat, lon), ...]."""
+        t0 = float('-inf') if t0 is None else t0
+        t1 = float('inf') if t1 is None else t1
+        if self.rtree:
+            # the R*Tree keeps 32-bit bounds (rounded outwards): use it to find candidates, then compare exactly
+            sql = ("SELECT t.drone_id, t.ts, t.lat, t.lon FROM telemetry_box b JOIN telemetry t ON t.id = b.id "
+                   "WHERE b.max_lat >= ?1 AND b.min_lat <= ?2 AND b.max_lon >= ?3 AND b.min_lon <= ?4 "
+                   "AND t.lat BETWEEN ?1 AND ?2 AND t.lon BETWEEN ?3 AND ?4 AND t.ts BETWEEN ?5 AND ?6 ORDER BY t.ts")
+        else:
+            sql = ("SELECT drone_id, ts, lat, lon FROM telemetry "
+                   "WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ? AND ts BETWEEN ? AND ? ORDER BY ts")
+        with self.read_lock:
+            return self.reader.execute(sql, (min_lat, max_lat, min_lon, max_lon, t0, t1)).fetchall()
+
+    def distance_flown(self, drone_id: int, t0: float, t1: float) -> float:
+        """Ground distance (m) along one drone's fixes between t0 and t1."""
+        fixes = [f for f in self.track(drone_id, t0, t1) if f[1] is not None]
+        return polyline_length([f[1] for f in fixes], [f[2] for f in fixes])
+
+    def near(self, lat: float, lon: float, radius_m: float, t0: float = None, t1: float = None) -> list:
+        """Fixes within radius_m of a point: [(drone_id, ts, lat, lon, distance_m), ...] in time order."""
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        rows = self.in_box(lat - dlat, lon - dlon, lat + dlat, lon + dlon, t0, t1)
+        if not rows:
+            return []
+        dist = distances_from(lat, lon, [r[2] for r in rows], [r[3] for r in rows])
+        return [(*r, float(d)) for r, d in zip(rows, dist) if d <= radius_m]
+
+    def missions(self) -> list:
+        with self.read_lock:
+            return self.reader.execute("SELECT id, started, kml_path, plan_key, partitions FROM missions "
+                                       "ORDER BY id").fetchall()
+
+
+# If run directly, measure ingest at swarm message rates and the indexed queries
+if __name__ == '__main__':
+    import os
+    import random
+    import tempfile
+
+    rng = random.Random(0)
+    tmp = tempfile.mkdtemp()
+
+    def statuses(n_drones, seconds, hz):
+        t = 1_700_000_000.0
+        pos = [(-35.36 + rng.uniform(-0.01, 0.01), 149.16 + rng.uniform(-0.01, 0.01)) for _ in range(n_drones)]
+        out = []
+        for step in range(int(seconds * hz)):
+            for d in range(n_drones):
+                lat, lon = pos[d]
+                pos[d] = (lat + rng.uniform(-2e-5, 2e-5), lon + rng.uniform(-2e-5, 2e-5))
+                out.append({"id": d, "gps": {"lat": pos[d][0], "lon": pos[d][1]}, "baro": 584.0,
+                            "velocity": [1.0, 0.5, 0.0], "heartbeat": t + step / hz})
+        return out
+
+    # the naive way: one INSERT and one commit per message with SQLite's default journal
+    msgs = statuses(50, 4, 10)
+    conn = sqlite3.connect(os.path.join(tmp, 'naive.db'))
+    conn.executescript(SCHEMA)
+    t0 = time.perf_counter()
+    for m in msgs:
+        conn.execute("INSERT INTO telemetry (drone_id, ts, lat, lon, alt) VALUES (?, ?, ?, ?, ?)",
+                     (m["id"], m["heartbeat"], m["gps"]["lat"], m["gps"]["lon"], m["baro"]))
+        conn.commit()
+    naive = len(msgs) / (time.perf_counter() - t0)
+    print(f"Commit per message:          {naive:10.0f} rows/s")
+
+    # sustained ingest: ~30k messages per swarm size, recorded as fast as possible
+    for n_drones, hz in ((10, 10), (100, 10), (1000, 10)):
+        msgs = statuses(n_drones, max(3, 30_000 // (n_drones * hz)), hz)
+        db = TelemetryDB(os.path.join(tmp, f'swarm{n_drones}.db'))
+        t0 = time.perf_counter()
+        for m in msgs:
+            db.record(m)
+        t_record = time.perf_counter() - t0
+        db.flush(timeout=60)
+        rate = len(msgs) / (time.perf_counter() - t0)
+        print(f"Batched, {n_drones:4d} drones @ {hz} Hz: {rate:10.0f} rows/s "
+              f"({n_drones * hz} msgs/s needed, {t_record / len(msgs) * 1e6:.1f} us per record())")
+
+    # queries on the largest store: one drone's track over a 3 minute window, and a box
+    t_start = 1_700_000_000.0
+    for minute in range(3):
+        for m in statuses(1000, 6, 10):
+            m["heartbeat"] += 60 * minute
+            db.record(m)
+    db.flush(timeout=60)
+    rows = db.reader.execute("SELECT COUNT(*) FROM telemetry").fetchone()[0]
+    t0 = time.perf_counter()
+    track = db.track(3, t_start + 2, t_start + 125)
+    t_track = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    box = db.in_box(-35.3605, 149.1595, -35.3595, 149.1605)
+    t_box = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    scan = db.reader.execute("SELECT ts FROM telemetry NOT INDEXED WHERE drone_id = 3 AND ts BETWEEN ? AND ?",
+                             (t_start + 2, t_start + 125)).fetchall()
+    t_scan = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    scan_box = db.reader.execute("SELECT ts FROM telemetry NOT INDEXED WHERE lat BETWEEN ? AND ? "
+                                 "AND lon BETWEEN ? AND ?", (-35.3605, -35.3595, 149.1595, 149.1605)).fetchall()
+    t_scan_box = (time.perf_counter() - t0) * 1000
+    assert len(scan) == len(track) and len(scan_box) == len(box)
+    print(f"{rows} rows: track of one drone {len(track)} fixes in {t_track:.2f} ms (full scan {t_scan:.1f} ms), "
+          f"box {len(box)} fixes in {t_box:.2f} ms (full scan {t_scan_box:.1f} ms, R*Tree: {db.rtree})")
+    # the same two queries in metres: distance flown along the track, fixes within 50 m of a point
+    from mapping_params import haversine_distance
+    t0 = time.perf_counter()
+    flown = db.distance_flown(3, t_start + 2, t_start + 125)
+    t_flown = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    near = db.near(-35.36, 149.16, 50.0)
+    t_near = (time.perf_counter() - t0) * 1000
+    assert math.isclose(flown, sum(haversine_distance(*a[1:3], *b[1:3]) for a, b in zip(track, track[1:])))
+    print(f"distance flown {flown:.0f} m in {t_flown:.2f} ms, {len(near)} fixes within 50 m in {t_near:.2f} ms")
@@ -9,16 +9,14 @@ import time
 import logging
 from dronekit import connect, VehicleMode, Command
 from pymavlink import mavutil
-from shapely.geometry import Polygon, LineString, MultiLineString
-from xml.etree import ElementTree as ET
+from shapely.geometry import Polygon
 import matplotlib.pyplot as plt
 
-from mapping_params import (
-    calculate_mapping_params,
-    meters_to_deg_lat,
-    meters_to_deg_lon,
-    haversine_distance
-)
+from area_splitter import read_polygon_from_kml
+from survey_planner import plan_lawnmower
+from camera_triggers import trigger_commands
+import param_sync
+import tracing
 
 # --- CONFIGURATION ---
 CONNECTION_STRING = 'udp:127.0.0.1:14551'
@@ -26,6 +24,7 @@ KML_PATH         = 'kml_files/30ha.kml'
 ALTITUDE_M       = 50      # meters
 OVERLAP_PCT      = 15
 SIDELAP_PCT      = 15
+CAMERA_TRIGGERS  = False   # add DO_SET_CAM_TRIGG_DIST items around each lane
 # ----------------------
 
 # ——— Performance parameters ———
@@ -41,10 +40,12 @@ logger = logging.getLogger("Survey")
 class QuadplaneSurvey:
     def __init__(self):
         self.vehicle = None
+        self.triggers = None
 
     def connect_and_configure(self):
         logger.info(f"Connecting to vehicle on {CONNECTION_STRING}")
-        self.vehicle = connect(CONNECTION_STRING, wait_ready=True, baud=115200)
+        # the full parameter download runs in the background; param_sync only needs the link
+        self.vehicle = connect(CONNECTION_STRING, wait_ready=['gps_0', 'armed', 'mode', 'attitude'], baud=115200)
         self.vehicle.wait_ready('last_heartbeat', timeout=15)
         logger.info("Vehicle heartbeat OK")
 
@@ -63,37 +64,40 @@ class QuadplaneSurvey:
             'TECS_SPEEDWEIGHT': 2.0,  # >1 → stronger speed hold
         }
 
-        for p, v in params.items():
-            if p in self.vehicle.parameters:
-                try:
-                    self.vehicle.parameters[p] = v
-                    logger.info(f"Set {p} = {v}")
-                except:
-                    logger.warning(f"Could not set {p}")
-            else:
-                logger.warning(f"{p} not supported – skipping")
+        # All sets in flight at once; values the vehicle reads back as already set are skipped
+        with tracing.span("param_sync", params=len(params)):
+            confirmed = param_sync.for_dronekit(self.vehicle).sync(params)
 
         # Verify critical ones
-        self.verify_params(params, critical={'AIRSPEED_CRUISE','WPNAV_SPEED','TECS_SPEEDWEIGHT'})
+        self.verify_params(params, confirmed, critical={'AIRSPEED_CRUISE','WPNAV_SPEED','TECS_SPEEDWEIGHT'})
 
 
 
-    def verify_params(self, desired: dict, critical: set):
+    def verify_params(self, desired: dict, confirmed: dict, critical: set):
         """
-        For each param in `desired`, if it exists on the vehicle,
-        check that its value matches. If a critical param is missing
-        or mismatched, raise. Otherwise warn.
+        For each param in `desired`, check the value the vehicle echoed on
+        this connection (PARAM_VALUE). A param that never answered is either
+        not supported by this firmware or had its echoes lost; both are
+        skipped with a warning. If a critical param echoes a different value,
+        raise. Otherwise warn.
         """
-        present = set(self.vehicle.parameters.keys())
         failed = False
+        present = None   # names in the vehicle's parameter table, once needed
 
         for p, want in desired.items():
-            if p not in present:
-                logger.warning(f"Param {p} not supported by this firmware—skipping verification")
+            got = confirmed.get(p)
+            if got is None:
+                if present is None:
+                    # the full download started at connect tells a missing param from lost echoes
+                    ready = self.vehicle.wait_ready('parameters', timeout=30, raise_exception=False)
+                    present = set(self.vehicle.parameters.keys()) if ready else set(desired)
+                if p not in present:
+                    logger.warning(f"Param {p} not supported by this firmware—skipping verification")
+                else:
+                    logger.warning(f"Param {p} not confirmed (no PARAM_VALUE received)—skipping verification")
                 continue
 
-            got = float(self.vehicle.parameters[p])
-            if abs(got - float(want)) > 1e-3:
+            if abs(float(got) - float(want)) > 1e-3:
                 msg = f"Param {p} = {got} (!= {want})"
                 if p in critical:
                     logger.error(msg)
@@ -107,78 +111,30 @@ class QuadplaneSurvey:
             raise RuntimeError("One or more *critical* parameters failed to apply")
 
     def read_polygon(self) -> Polygon:
-        tree = ET.parse(KML_PATH)
-        coord_text = tree.find('.//{*}coordinates').text.strip()
-        coords = [tuple(map(float, p.split(',')[:2])) for p in coord_text.split()]
-        if not coords:
-            raise RuntimeError("KML contains no coordinates")
-        return Polygon(coords)
+        return read_polygon_from_kml(KML_PATH)
 
     def generate_lawnmower(self, poly: Polygon):
-        # derive mapping
-        mp = calculate_mapping_params(ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT)
-        swath_w = mp['ground_width_m']           # full swath width (m)
-        lane_spacing_m = swath_w * (1 - SIDELAP_PCT/100.0)
-
-        minx, miny, maxx, maxy = poly.bounds
-        midlat = (miny + maxy) / 2
-
-        # choose orientation by real‐world dimensions
-        width_m  = haversine_distance(miny, minx, miny, maxx)
-        height_m = haversine_distance(miny, minx, maxy, minx)
-        horizontal = width_m >= height_m
-
-        # compute degree spacing
-        if horizontal:
-            dlat = meters_to_deg_lat(lane_spacing_m)
-        else:
-            dlon = meters_to_deg_lon(lane_spacing_m, midlat)
-
-        # build parallel lines
-        lines = []
-        if horizontal:
-            y = miny
-            while y <= maxy + dlat/2:
-                lines.append(LineString([(minx, y), (maxx, y)]))
-                y += dlat
-        else:
-            x = minx
-            while x <= maxx + dlon/2:
-                lines.append(LineString([(x, miny), (x, maxy)]))
-                x += dlon
-
-        # build waypoints: start at centroid
-        pts = [(poly.centroid.y, poly.centroid.x, ALTITUDE_M)]
-        flip = False
-        for ln in lines:
-            inter = poly.intersection(ln)
-            segments = []
-            if isinstance(inter, LineString):
-                segments = [inter]
-            elif isinstance(inter, MultiLineString):
-                segments = list(inter.geoms)
-            for seg in segments:
-                coords = list(seg.coords)
-                coords.sort(key=lambda c: c[0], reverse=flip)
-                for lon, lat in coords:
-                    pts.append((lat, lon, ALTITUDE_M))
-                flip = not flip
-
-        # total distance check
-        dist = 0.0
-        for i in range(1, len(pts)):
-            dist += haversine_distance(*pts[i-1][:2], *pts[i][:2])
-        logger.info(f"Waypoints: {len(pts)}  Total distance ≈ {dist:.1f}m")
+        plan = plan_lawnmower(poly, ALTITUDE_M, OVERLAP_PCT, SIDELAP_PCT)
+        self.triggers = plan['triggers']
+        est = self.triggers.summary()
+        logger.info(f"Camera triggers: {est['images']} images on {est['lanes']} lanes  "
+                    f"≈ {est['storage_gb']:.1f} GB, {est['gigapixels']:.1f} Gpx to process")
+        logger.info(f"Sweep angle {plan['sweep_angle_deg']:.1f}°  Waypoints: {len(plan['waypoints'])}  "
+                    f"Total distance ≈ {plan['distance_m']:.1f}m")
 
         # save lawnmower png
-        self._save_pattern(poly, lines)
-        return pts, lines
+        with tracing.span("render_png"):
+            self._save_pattern(poly, plan['lines'])
+        return plan['waypoints'], plan['lines']
 
     def _save_pattern(self, poly, lines):
         os.makedirs('outputs', exist_ok=True)
         fig, ax = plt.subplots(figsize=(6,6))
         x,y = poly.exterior.xy
         ax.plot(x,y,'k-',linewidth=2)
+        for hole in poly.interiors:
+            hx, hy = hole.xy
+            ax.plot(hx, hy, 'r-', linewidth=2)
         for ln in lines:
             xs, ys = ln.xy
             ax.plot(xs, ys, 'b-', linewidth=1)
@@ -188,7 +144,7 @@ class QuadplaneSurvey:
         plt.close(fig)
         logger.info("Saved outputs/lawnmower_pattern.png")
 
-    def upload_and_execute(self, wps):
+    def upload_and_execute(self, wps, triggers=None):
         from pymavlink import mavutil
 
         cmds = self.vehicle.commands
@@ -202,10 +158,18 @@ class QuadplaneSurvey:
         cmds.add(Command(0,0,0, mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT,
                         mavutil.mavlink.MAV_CMD_NAV_VTOL_TAKEOFF, 0,0,0,0,0,0,
                         lat0, lon0, alt0))
-        for lat, lon, alt in wps[1:]:
+        # Optional camera trigger commands, keyed by the waypoint they follow
+        do_cmds = {}
+        if triggers is not None:
+            for wp_index, command, params in trigger_commands(triggers):
+                do_cmds.setdefault(wp_index, []).append((command, params))
+        for i, (lat, lon, alt) in enumerate(wps[1:], start=1):
             cmds.add(Command(0,0,0, mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT,
                             mavutil.mavlink.MAV_CMD_NAV_WAYPOINT, 0,0,0,0,0,0,
                             lat, lon, alt))
+            for command, (p1, p2, p3) in do_cmds.get(i, ()):
+                cmds.add(Command(0,0,0, mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT,
+                                command, 0,0, p1,p2,p3,0, 0,0,0))
         cmds.add(Command(0,0,0, mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT,
                         mavutil.mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH, 0,0,0,0,0,0,
                         0,0,0))
@@ -282,10 +246,14 @@ class QuadplaneSurvey:
 
     def run(self):
         try:
-            self.connect_and_configure()
-            poly = self.read_polygon()
-            wps, lines = self.generate_lawnmower(poly)
-            self.upload_and_execute(wps)
+            with tracing.span("connect_and_configure"):
+                self.connect_and_configure()
+            with tracing.span("read_kml"):
+                poly = self.read_polygon()
+            with tracing.span("generate_lawnmower"):
+                wps, lines = self.generate_lawnmower(poly)
+            with tracing.span("upload_and_execute", waypoints=len(wps)):
+                self.upload_and_execute(wps, self.triggers if CAMERA_TRIGGERS else None)
         except Exception as e:
             logger.error(f"Mission aborted: {e}")
             if self.vehicle:
@@ -0,0 +1,250 @@
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import counter, histogram
+
+# === Tile cache settings ===
+MBTILES_PATH = 'tiles.mbtiles'   # offline raster tiles (MBTiles 1.3: SQLite, TMS rows)
+MEMORY_TILES = 1024              # most recently served tiles kept in memory
+MAX_AGE_S = 7 * 24 * 3600        # browsers may reuse a tile this long without asking again
+PREFETCH_ZOOM = (14, 19)         # zoom range seeded around a field
+PREFETCH_MARGIN = 0.2            # share of the field's size added around it
+FETCH_WORKERS = 8                # parallel requests when seeding from a tile server
+FETCH_TIMEOUT = 10.0
+WRITE_BATCH = 500                # tiles inserted per transaction while seeding
+
+TILE_HITS = counter("tile_requests_total", "Tile requests, by outcome", ("result",))
+TILE_READ_SECONDS = histogram("tile_read_seconds", "Time to read one tile from MBTiles")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tiles (
+    zoom_level INTEGER NOT NULL,
+    tile_column INTEGER NOT NULL,
+    tile_row INTEGER NOT NULL,
+    tile_data BLOB NOT NULL,
+    PRIMARY KEY (zoom_level, tile_column, tile_row)
+);
+"""
+
+
+def tile_for(lat: float, lon: float, z: int) -> tuple:
+    """Web Mercator (XYZ) tile containing a point."""
+    n = 1 << z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_for_bounds(bounds: tuple, zooms: tuple = PREFETCH_ZOOM):
+    """Yield every (z, x, y) covering (west, south, east, north) for zooms[0]..zooms[1]."""
+    west, south, east, north = bounds
+    for z in range(zooms[0], zooms[1] + 1):
+        x0, y0 = tile_for(north, west, z)
+        x1, y1 = tile_for(south, east, z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+
+class TileCache:
+    """
+    The MBTiles store. Tiles are addressed in XYZ like the web map; the store
+    keeps MBTiles' flipped TMS rows. Recently served tiles are kept in memory
+    together with their ETag.
+
+    map_server.py opens it read_only: the file is never created or modified
+    by the server, and it is opened on the first request that finds it, so a
+    store seeded while the server runs is picked up. Writers (prefetch) keep
+    the plain rollback journal, so the file stays a single portable .mbtiles.
+    """
+
+    def __init__(self, path: str = MBTILES_PATH, memory_tiles: int = MEMORY_TILES, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.conn = None
+        if not read_only:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=DELETE")
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+        self.memory_tiles = memory_tiles
+        self.recent = OrderedDict()   # (z, x, y) -> (data, etag)
+        self.lock = threading.Lock()
+
+    def _row(self, z: int, x: int, y: int):
+        if self.conn is None:
+            if not os.path.exists(self.path):
+                return None
+            self.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            return self.conn.execute("SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? "
+                                     "AND tile_row=?", (z, x, (1 << z) - 1 - y)).fetchone()
+        except sqlite3.OperationalError:
+            # not an MBTiles file (yet): look again on the next request
+            if self.read_only:
+                self.conn.close()
+                self.conn = None
+                return None
+            raise
+
+    def get(self, z: int, x: int, y: int):
+        """(tile bytes, etag) or None if the tile is not in the store."""
+        key = (z, x, y)
+        with self.lock:
+            hit = self.recent.get(key)
+            if hit is not None:
+                self.recent.move_to_end(key)
+                return hit
+            with TILE_READ_SECONDS.time():
+                row = self._row(z, x, y)
+            if row is None:
+                return None
+            data = bytes(row[0])
+            hit = self.recent[key] = (data, hashlib.sha1(data).hexdigest()[:16])
+            if len(self.recent) > self.memory_tiles:
+                self.recent.popitem(last=False)
+            return hit
+
+    def put_many(self, tiles):
+        """Store (z, x, y, data) tuples in one transaction."""
+        rows = [(z, x, (1 << z) - 1 - y, data) for z, x, y, data in tiles]
+        with self.lock:
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", rows)
+            for z, x, y, _ in tiles:
+                self.recent.pop((z, x, y), None)
+
+    def set_metadata(self, **values):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)",
+                                  [(k, str(v)) for k, v in values.items()])
+
+    def has(self, z: int, x: int, y: int) -> bool:
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+                                     (z, x, (1 << z) - 1 - y)).fetchone() is not None
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+
+
+def _reader(source: str):
+    """Tile loader for a URL template (http://host/{z}/{x}/{y}.png) or a z/x/y directory template."""
+    if source.startswith(('http://', 'https://')):
+        def load(z, x, y):
+            req = urllib.request.Request(source.format(z=z, x=x, y=y), headers={"User-Agent": "swarm-tile-prefetch"})
+            with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT) as r:
+                return r.read()
+    else:
+        def load(z, x, y):
+            with open(source.format(z=z, x=x, y=y), 'rb') as f:
+                return f.read()
+    return load
+
+
+def field_bounds(kml_path: str, margin: float = PREFETCH_MARGIN) -> tuple:
+    """(west, south, east, north) of a KML's first field, widened by margin on every side."""
+    from area_splitter import read_polygon_from_kml
+    west, south, east, north = read_polygon_from_kml(kml_path).bounds
+    dx, dy = (east - west) * margin, (north - south) * margin
+    return west - dx, south - dy, east + dx, north + dy
+
+
+def prefetch(kml_path: str, source: str, zooms: tuple = PREFETCH_ZOOM, path: str = MBTILES_PATH,
+             margin: float = PREFETCH_MARGIN) -> dict:
+    """Seed the store with every tile around a field that it does not hold yet."""
+    bounds = field_bounds(kml_path, margin)
+    cache = TileCache(path)
+    wanted = [t for t in tiles_for_bounds(bounds, zooms) if not cache.has(*t)]
+    load = _reader(source)
+    stored = failed = 0
+    batch = []
+
+    def fetch(t):
+        try:
+            return t, load(*t)
+        except Exception:
+            return t, None
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        for (z, x, y), data in pool.map(fetch, wanted):
+            if data is None:
+                failed += 1
+                continue
+            batch.append((z, x, y, data))
+            if len(batch) >= WRITE_BATCH:
+                cache.put_many(batch)
+                stored += len(batch)
+                batch = []
+    if batch:
+        cache.put_many(batch)
+        stored += len(batch)
+    cache.set_metadata(name=os.path.basename(kml_path), format='png', minzoom=zooms[0], maxzoom=zooms[1],
+                       bounds=','.join(f"{v:.6f}" for v in bounds))
+    return {"stored": stored, "failed": failed, "total": cache.count(), "seconds": round(time.perf_counter() - t0, 1)}
+
+
+# If run directly: seed the store for a field, or compare tile latency
+if __name__ == '__main__':
+    import argparse
+    import tempfile
+    from shared_config import KML_PATH
+
+    parser = argparse.ArgumentParser(description="Offline map tiles for map_server.py")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("prefetch", help="seed the MBTiles store around a field")
+    p.add_argument("--kml", default=KML_PATH)
+    p.add_argument("--source", required=True,
+                   help="local tile server URL or directory template, e.g. http://10.0.0.5:8081/{z}/{x}/{y}.png")
+    p.add_argument("--zoom", default=f"{PREFETCH_ZOOM[0]}-{PREFETCH_ZOOM[1]}", help="zoom range, e.g. 14-19")
+    p.add_argument("--db", default=MBTILES_PATH)
+    sub.add_parser("bench", help="tile latency through map_server: MBTiles, memory and 304 revalidation")
+    opts = parser.parse_args()
+
+    if opts.cmd == "prefetch":
+        lo, hi = (int(v) for v in opts.zoom.split('-'))
+        print(f"Prefetching zoom {lo}-{hi} for {opts.kml} from {opts.source}...")
+        print(prefetch(opts.kml, opts.source, (lo, hi), opts.db))
+    else:
+        import map_server
+
+        tmp = tempfile.mkdtemp()
+        # a directory source standing in for a local tile export: 15 KB of noise per tile
+        for z, x, y in tiles_for_bounds(field_bounds(KML_PATH), PREFETCH_ZOOM):
+            os.makedirs(os.path.join(tmp, 'src', str(z), str(x)), exist_ok=True)
+            with open(os.path.join(tmp, 'src', str(z), str(x), f"{y}.png"), 'wb') as f:
+                f.write(os.urandom(15_000))
+        db = os.path.join(tmp, 'bench.mbtiles')
+        print(prefetch(KML_PATH, os.path.join(tmp, 'src', '{z}', '{x}', '{y}.png'), PREFETCH_ZOOM, db))
+        map_server.tile_cache = TileCache(db, read_only=True)
+        client = map_server.app.test_client()
+        tiles = list(tiles_for_bounds(field_bounds(KML_PATH), PREFETCH_ZOOM))
+
+        def timed(headers=None):
+            t0 = time.perf_counter()
+            status = [client.get(f"/tiles/{z}/{x}/{y}.png", headers=headers).status_code for z, x, y in tiles]
+            return (time.perf_counter() - t0) / len(tiles) * 1000, status
+
+        cold, s1 = timed()
+        map_server.tile_cache.recent.clear()
+        for z, x, y in tiles:
+            map_server.tile_cache.get(z, x, y)
+        warm, s2 = timed()
+        etag = client.get("/tiles/%d/%d/%d.png" % tiles[0]).headers["ETag"]
+        t0 = time.perf_counter()
+        for _ in range(len(tiles)):
+            assert client.get("/tiles/%d/%d/%d.png" % tiles[0], headers={"If-None-Match": etag}).status_code == 304
+        revalidate = (time.perf_counter() - t0) / len(tiles) * 1000
+        assert set(s1) == set(s2) == {200}
+        print(f"{len(tiles)} tiles per request: MBTiles {cold:.2f} ms, memory {warm:.2f} ms, 304 {revalidate:.2f} ms")
@@ -0,0 +1,179 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# === Settings (opt-in through the environment) ===
+# SWARM_TRACE=1 (or a directory) records spans and writes traces/<process>-<start>-<pid>.json,
+# which loads in chrome://tracing or https://ui.perfetto.dev.
+# SWARM_PROFILE=<ms> additionally samples every traced thread's stack every <ms>
+# milliseconds and writes the folded stacks (flamegraph.pl / speedscope) next to the trace.
+TRACE_ENV = 'SWARM_TRACE'
+PROFILE_ENV = 'SWARM_PROFILE'
+TRACE_DIR = 'traces'
+MAX_EVENTS = 200_000     # recording stops past this many events
+
+
+class Tracer:
+    """Collects Chrome trace-event spans of one process."""
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.events = []
+        self.active = {}          # thread id -> stack of open span names (for the sampler)
+        self.samples = Counter()  # folded stack -> count
+        self.lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._named = set()
+        self._sampler = None
+
+    def enable(self, out_dir: str = TRACE_DIR, name: str = None):
+        name = name or os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+        os.makedirs(out_dir, exist_ok=True)
+        self.path = os.path.join(out_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json")
+        self.enabled = True
+        atexit.register(self.save)
+
+    def _ts(self) -> float:
+        return (time.perf_counter() - self._t0) * 1e6
+
+    def _thread_meta(self, tid: int):
+        if tid not in self._named:
+            self._named.add(tid)
+            self.events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                                "args": {"name": threading.current_thread().name}})
+
+    @contextmanager
+    def _span(self, name: str, cat: str, args: dict):
+        tid = threading.get_ident()
+        with self.lock:
+            self.active.setdefault(tid, []).append(name)
+        start = self._ts()
+        try:
+            yield
+        finally:
+            end = self._ts()
+            with self.lock:
+                self.active[tid].pop()
+                if len(self.events) < MAX_EVENTS:
+                    self._thread_meta(tid)
+                    self.events.append({"name": name, "cat": cat, "ph": "X", "ts": start,
+                                        "dur": end - start, "pid": os.getpid(), "tid": tid,
+                                        "args": args})
+
+    def span(self, name: str, cat: str = 'stage', **args):
+        """Context manager timing a pipeline stage; free when tracing is off."""
+        if not self.enabled:
+            return nullcontext()
+        return self._span(name, cat, args)
+
+    def instant(self, name: str, **args):
+        """Point-in-time marker (e.g. 'vehicle in AUTO')."""
+        if not self.enabled:
+            return
+        tid = threading.get_ident()
+        with self.lock:
+            if len(self.events) < MAX_EVENTS:
+                self._thread_meta(tid)
+                self.events.append({"name": name, "ph": "i", "s": "t", "ts": self._ts(),
+                                    "pid": os.getpid(), "tid": tid, "args": args})
+
+    def start_sampler(self, interval_ms: float):
+        """Sample the stacks of threads inside a span, keyed by the span path."""
+        if self._sampler is not None:
+            return
+
+        def sample():
+            while True:
+                time.sleep(interval_ms / 1000)
+                frames = sys._current_frames()
+                with self.lock:
+                    active = {tid: list(stack) for tid, stack in self.active.items() if stack}
+                folded = []
+                for tid, stack in active.items():
+                    frame = frames.get(tid)
+                    calls = []
+                    while frame is not None:
+                        code = frame.f_code
+                        calls.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    folded.append(';'.join(stack + calls[::-1]))
+                with self.lock:
+                    self.samples.update(folded)
+
+        self._sampler = threading.Thread(target=sample, name='trace-sampler', daemon=True)
+        self._sampler.start()
+
+    def save(self, path: str = None):
+        """Write the trace (and folded stack samples, if any); returns the trace path."""
+        path = path or self.path
+        if not self.enabled or path is None:
+            return None
+        with self.lock:
+            doc = {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+            samples = dict(self.samples)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(doc, f)
+        os.replace(tmp, path)
+        if samples:
+            with open(os.path.splitext(path)[0] + '.folded', 'w') as f:
+                for stack, count in sorted(samples.items()):
+                    f.write(f"{stack} {count}\n")
+        return path
+
+
+tracer = Tracer()
+span = tracer.span
+instant = tracer.instant
+save = tracer.save
+
+if os.environ.get(TRACE_ENV):
+    tracer.enable(TRACE_DIR if os.environ[TRACE_ENV] in ('1', 'true') else os.environ[TRACE_ENV])
+    if os.environ.get(PROFILE_ENV):
+        tracer.start_sampler(float(os.environ[PROFILE_ENV]))
+
+
+def traced(name: str = None, cat: str = 'stage'):
+    """Decorator form of span()."""
+    def wrap(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(label, cat):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def stage_summary(paths) -> dict:
+    """Per-span durations (ms) across trace files: {name: [dur, ...]} in file order."""
+    out = {}
+    for path in paths:
+        with open(path) as f:
+            for ev in json.load(f)["traceEvents"]:
+                if ev.get("ph") == "X":
+                    out.setdefault(ev["name"], []).append(ev["dur"] / 1000)
+    return out
+
+
+# If run directly, compare stage timings across saved traces:
+#   python tracing.py traces/drone1_mapper-*.json
+if __name__ == '__main__':
+    import statistics
+    paths = sys.argv[1:]
+    if not paths:
+        print("usage: python tracing.py TRACE.json [TRACE.json ...]")
+        sys.exit(1)
+    print(f"{'stage':<28} {'n':>4} {'mean ms':>10} {'median':>10} {'max':>10}   per run")
+    for name, durs in sorted(stage_summary(paths).items(), key=lambda kv: -sum(kv[1])):
+        runs = ' '.join(f"{d:.0f}" for d in durs[-6:])
+        print(f"{name:<28} {len(durs):>4} {statistics.mean(durs):>10.1f} "
+              f"{statistics.median(durs):>10.1f} {max(durs):>10.1f}   {runs}")
@@ -0,0 +1,219 @@
+import math
+import threading
+import numpy as np
+
+# === Web map constants ===
+EARTH_CIRCUMFERENCE_M = 40075016.686   # equatorial circumference (m)
+TILE_SIZE_PX = 256                     # Leaflet / OSM tile size
+MIN_ZOOM = 0
+MAX_ZOOM = 22
+
+# === Simplification settings ===
+TOLERANCE_PX = 1.0           # max deviation of the simplified line, in screen pixels
+MAX_POINTS_PER_TRACK = 500   # payload budget per drone; coarser levels are used above this
+CHUNK_SIZE = 256             # raw points simplified together before a chunk is frozen
+
+
+def meters_per_pixel(zoom: int, lat_deg: float) -> float:
+    """Ground resolution of a web-mercator map at the given zoom level and latitude."""
+    return EARTH_CIRCUMFERENCE_M * math.cos(math.radians(lat_deg)) / (TILE_SIZE_PX * 2 ** zoom)
+
+
+def douglas_peucker(xy: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Douglas–Peucker simplification of an (N, 2) array of planar points.
+    Returns the sorted indices of the points to keep (first and last always kept).
+    """
+    n = len(xy)
+    if n < 3:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        a, b = xy[i], xy[j]
+        seg = xy[i + 1:j] - a
+        d = b - a
+        length_sq = float(d @ d)
+        if length_sq == 0.0:
+            dist = np.hypot(seg[:, 0], seg[:, 1])
+        else:
+            # distance to the segment (not the infinite line) so loops are kept
+            t = np.clip((seg @ d) / length_sq, 0.0, 1.0)
+            off = seg - t[:, None] * d
+            dist = np.hypot(off[:, 0], off[:, 1])
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            m = i + 1 + k
+            keep[m] = True
+            stack.append((i, m))
+            stack.append((m, j))
+    return np.flatnonzero(keep)
+
+
+class DroneTrack:
+    """
+    Raw 1 Hz track of a single drone plus cached simplified versions per zoom level.
+
+    Each zoom level keeps a frozen prefix of kept indices that is extended chunk by
+    chunk as points arrive, so only the open tail (< CHUNK_SIZE points) is
+    re-simplified on a request. Readers pass the point count they saw under the
+    store lock and simplify without it: appends only write past that count, and
+    a resize leaves the old arrays intact.
+    """
+
+    def __init__(self, origin_lat: float, origin_lon: float):
+        self.origin_lat = origin_lat
+        self.origin_lon = origin_lon
+        self._m_per_deg_lat = 111320.0
+        self._m_per_deg_lon = 111320.0 * math.cos(math.radians(origin_lat))
+        self._latlon = np.empty((64, 2))
+        self._xy = np.empty((64, 2))
+        self.count = 0
+        self.last_time = None
+        # zoom -> [frozen kept indices (list of arrays), anchor index, lock]
+        self._levels = {}
+        self._levels_lock = threading.Lock()
+
+    def append(self, lat: float, lon: float, t: float = None) -> bool:
+        """Append a position; positions older than the last one are ignored."""
+        if t is not None and self.last_time is not None and t <= self.last_time:
+            return False
+        if self.count == len(self._latlon):
+            self._latlon = np.resize(self._latlon, (2 * self.count, 2))
+            self._xy = np.resize(self._xy, (2 * self.count, 2))
+        self._latlon[self.count] = (lat, lon)
+        self._xy[self.count] = ((lon - self.origin_lon) * self._m_per_deg_lon,
+                                (lat - self.origin_lat) * self._m_per_deg_lat)
+        self.count += 1
+        if t is not None:
+            self.last_time = t
+        return True
+
+    def simplified_indices(self, zoom: int, count: int = None) -> np.ndarray:
+        """Indices of the first `count` raw points kept at `zoom`, extending the cached level as needed."""
+        count = self.count if count is None else count
+        xy = self._xy
+        tolerance = TOLERANCE_PX * meters_per_pixel(zoom, self.origin_lat)
+        with self._levels_lock:
+            level = self._levels.setdefault(zoom, [[np.zeros(1, dtype=np.intp)], 0, threading.Lock()])
+        with level[2]:
+            frozen, anchor, _ = level
+            # freeze every complete chunk since the last request
+            while count - 1 - anchor >= CHUNK_SIZE:
+                end = anchor + CHUNK_SIZE
+                kept = douglas_peucker(xy[anchor:end + 1], tolerance) + anchor
+                frozen.append(kept[1:])
+                anchor = end
+            level[1] = anchor
+            frozen = list(frozen)
+        if anchor >= count:
+            # a reader with an older count than the frozen prefix
+            idx = np.concatenate(frozen)
+            return np.append(idx[idx < count - 1], count - 1)
+        tail = douglas_peucker(xy[anchor:count], tolerance)[1:] + anchor
+        return np.concatenate(frozen + [tail])
+
+    def polylines(self, zoom: int, bbox=None, count: int = None) -> list:
+        """
+        Simplified track at `zoom` as a list of [[lat, lon], ...] runs.
+        With a bbox (west, south, east, north) only the visible runs are returned,
+        including the first point outside the view on either side.
+        """
+        idx = self.simplified_indices(zoom, count)
+        pts = self._latlon[idx]
+        if bbox is not None and len(pts):
+            west, south, east, north = bbox
+            inside = ((pts[:, 1] >= west) & (pts[:, 1] <= east) &
+                      (pts[:, 0] >= south) & (pts[:, 0] <= north))
+            mask = inside.copy()
+            mask[1:] |= inside[:-1]
+            mask[:-1] |= inside[1:]
+        else:
+            mask = np.ones(len(pts), dtype=bool)
+        runs = []
+        if mask.any():
+            breaks = np.flatnonzero(np.diff(mask.astype(np.int8)))
+            bounds = np.concatenate(([0], breaks + 1, [len(mask)]))
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                if mask[start]:
+                    runs.append(pts[start:stop].tolist())
+        return runs
+
+
+class TrackStore:
+    """Thread-safe collection of DroneTrack objects keyed by drone id."""
+
+    def __init__(self, max_points: int = MAX_POINTS_PER_TRACK):
+        self.max_points = max_points
+        self.tracks = {}
+        self.lock = threading.Lock()
+
+    def add(self, drone_id, lat: float, lon: float, t: float = None) -> bool:
+        drone_id = str(drone_id)
+        with self.lock:
+            track = self.tracks.get(drone_id)
+            if track is None:
+                track = self.tracks[drone_id] = DroneTrack(lat, lon)
+            return track.append(lat, lon, t)
+
+    def query(self, zoom: int, bbox=None) -> dict:
+        """
+        Simplified tracks for every drone. If a track exceeds the point budget at
+        the requested zoom, coarser levels are tried until it fits. Only the
+        point counts are read under the lock, so a cold query does not hold up add().
+        """
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, int(zoom)))
+        with self.lock:
+            tracks = [(drone_id, track, track.count) for drone_id, track in self.tracks.items()]
+        result = {}
+        for drone_id, track, count in tracks:
+            for z in range(zoom, MIN_ZOOM - 1, -1):
+                runs = track.polylines(z, bbox, count)
+                if sum(len(r) for r in runs) <= self.max_points:
+                    break
+            result[drone_id] = runs
+        return result
+
+
+# If run directly, simplify a synthetic multi-hour track at a few zoom levels
+if __name__ == '__main__':
+    import time
+
+    store = TrackStore()
+    rng = np.random.default_rng(0)
+    lat, lon = 12.34, 56.78
+    n = 6 * 3600  # six hours at 1 Hz
+    steps = rng.normal(0, 2e-5, size=(n, 2)).cumsum(axis=0)
+    t0 = time.perf_counter()
+    for i, (dlat, dlon) in enumerate(steps):
+        store.add(0, lat + dlat, lon + dlon, float(i))
+    print(f"Ingested {n} points in {time.perf_counter() - t0:.2f}s")
+
+    for zoom in (12, 15, 18):
+        t0 = time.perf_counter()
+        tracks = store.query(zoom)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        store.query(zoom)
+        warm = time.perf_counter() - t0
+        pts = sum(len(r) for r in tracks['0'])
+        print(f"zoom {zoom:2d}: {pts:5d} points  cold {cold * 1000:.1f} ms  cached {warm * 1000:.1f} ms")
+
+    # a cold query on a fresh store while the recorder keeps adding points
+    fresh = TrackStore()
+    for i, (dlat, dlon) in enumerate(steps):
+        fresh.add(0, lat + dlat, lon + dlon, float(i))
+    query = threading.Thread(target=fresh.query, args=(18,))
+    query.start()
+    worst, i = 0.0, n
+    while query.is_alive():
+        t0 = time.perf_counter()
+        fresh.add(0, lat, lon, float(i))
+        worst = max(worst, time.perf_counter() - t0)
+        i += 1
+        time.sleep(0.001)
+    print(f"add() during a cold zoom 18 query: {i - n} points, slowest {worst * 1000:.2f} ms")